@@ -1,2 +1,2 @@
 #!/bin/sh
-/usr/local/bin/gunicorn src.factory:app -w 4 -b 0.0.0.0:5001 --chdir=/app -k gevent
+/usr/local/bin/gunicorn src.factory:app -c /app/gunicorn_config.py --chdir=/app
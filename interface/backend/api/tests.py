@@ -1,12 +1,22 @@
+import json
+import os
+import tempfile
+
 from backend.api.serializers import NoduleSerializer
 from backend.cases.factories import (
     CaseFactory,
     CandidateFactory,
     NoduleFactory
 )
+from backend.cases.models import (
+    Candidate,
+    Nodule
+)
+from backend.images.factories import ImageSeriesFactory
 from django.test import (
     RequestFactory,
-    TestCase
+    TestCase,
+    override_settings
 )
 from django.urls import reverse
 from rest_framework import status
@@ -42,6 +52,35 @@ class ViewTest(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_image_series_filter(self):
+        series = ImageSeriesFactory(patient_id='LIDC-IDRI-0001')
+        ImageSeriesFactory(patient_id='LIDC-IDRI-0002')
+        response = self.client.get(reverse('imageseries-list'), {'patient_id': 'LIDC-IDRI-0001'})
+        self.assertEqual([item['series_instance_uid'] for item in response.json()], [series.series_instance_uid])
+
+    def test_images_available_subtree(self):
+        url = reverse('images-available')
+        with tempfile.TemporaryDirectory() as root, override_settings(DATASOURCE_DIR=root):
+            os.makedirs(os.path.join(root, 'patient', 'study', 'series'))
+
+            response = self.client.get(url, {'path': 'patient', 'depth': 1})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            payload = response.json()
+            self.assertEqual(payload['directories'], {'name': 'patient', 'children': [
+                {'name': 'study', 'children': None}]})
+            self.assertEqual(payload['path'], 'patient')
+            self.assertGreaterEqual(payload['cache_age'], 0)
+
+            response = self.client.get(url)
+            self.assertEqual(response.json()['directories']['name'], 'root')
+
+            response = self.client.get(url, {'path': '../etc'})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.get(url, {'depth': 0})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.get(url, {'path': 'missing'})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_candidates_mark(self):
         candidate = CandidateFactory()
         url = reverse('candidate-mark', kwargs={'candidate_id': candidate.id})
@@ -57,3 +96,82 @@ class ViewTest(TestCase):
         response_dict = response.json()
         self.assertEqual(response_dict["response"], "Candidate {} was dismissed".format(candidate.id))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class QueryCountTest(TestCase):
+    """
+    The number of queries of the API must not grow with the number of rows or nested objects.
+    """
+
+    def assertConstantQueries(self, num, populate, url):
+        # populate(n) adds n more rows, so the second request sees ten times as many. The counts include the
+        # savepoint and release around each request of ATOMIC_REQUESTS
+        for n in (2, 18):
+            populate(n)
+            with self.assertNumQueries(num):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_case_report(self):
+        case = CaseFactory()
+
+        def populate(n):
+            NoduleFactory.create_batch(size=n, case=case)
+            CandidateFactory.create_batch(size=n, case=case)
+
+        url = reverse('case-report', kwargs={'case_id': case.id}) + '.json'
+        self.assertConstantQueries(5, populate, url)
+
+    def test_list_viewsets(self):
+        self.assertConstantQueries(3, lambda n: CaseFactory.create_batch(size=n), reverse('case-list'))
+        self.assertConstantQueries(3, lambda n: CandidateFactory.create_batch(size=n), reverse('candidate-list'))
+        self.assertConstantQueries(3, lambda n: NoduleFactory.create_batch(size=n), reverse('nodule-list'))
+        self.assertConstantQueries(3, lambda n: ImageSeriesFactory.create_batch(size=n), reverse('imageseries-list'))
+
+
+class BulkCreateTest(TestCase):
+    def test_bulk_candidates(self):
+        case = CaseFactory()
+        url = reverse('case-bulk-candidates', kwargs={'pk': case.id})
+        items = [{'centroid': {'x': i, 'y': 2 * i, 'z': 3}, 'probability_concerning': i / 10} for i in range(5)]
+
+        response = self.client.post(url, json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ids = response.json()['ids']
+        candidates = Candidate.objects.filter(case=case).select_related('centroid').order_by('id')
+        self.assertEqual([candidate.id for candidate in candidates], ids)
+        self.assertEqual([(c.centroid.x, c.centroid.y, c.probability_concerning) for c in candidates],
+                         [(i, 2 * i, i / 10) for i in range(5)])
+        self.assertTrue(all(candidate.centroid.series_id == case.series_id for candidate in candidates))
+
+        # a single invalid item rejects the whole list
+        items[1]['probability_concerning'] = 1.5
+        items[3]['centroid'] = {'x': -1, 'y': 0, 'z': 0}
+        response = self.client.post(url, json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sorted(response.json()['errors']), ['1', '3'])
+        self.assertEqual(Candidate.objects.filter(case=case).count(), 5)
+
+        response = self.client.post(url, json.dumps({}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_nodules(self):
+        case = CaseFactory()
+        candidate = CandidateFactory(case=case)
+        url = reverse('case-bulk-nodules', kwargs={'pk': case.id})
+        items = [{'centroid': {'x': 1, 'y': 2, 'z': 3}, 'candidate': candidate.id},
+                 {'centroid': {'x': 4, 'y': 5, 'z': 6}}]
+
+        response = self.client.post(url, json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        nodules = Nodule.objects.filter(id__in=response.json()['ids']).order_by('id')
+        self.assertEqual([nodule.candidate_id for nodule in nodules], [candidate.id, None])
+
+        # the candidate already has a nodule
+        response = self.client.post(url, json.dumps(items[:1]), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('candidate', response.json()['errors']['0'])
+
+        response = self.client.post(reverse('case-bulk-nodules', kwargs={'pk': 0}), json.dumps(items),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,21 +1,29 @@
 import json
-import os
+import time
 
 from backend.api import serializers
+from backend.cases.bulk import (
+    BulkValidationError,
+    create_candidates,
+    create_nodules
+)
 from backend.cases.models import (
     Case,
     Candidate,
     Nodule,
     CaseSerializer
 )
+from backend.images.datasource import get_index
 from backend.images.models import ImageSeries
 from django.conf import settings
-from django.core.files.storage import FileSystemStorage
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from rest_framework import renderers
+from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import api_view
+from rest_framework.decorators import detail_route
 from rest_framework.decorators import renderer_classes
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
@@ -23,17 +31,40 @@ from rest_framework.views import APIView
 
 
 class CaseViewSet(viewsets.ModelViewSet):
-    queryset = Case.objects.all()
+    queryset = Case.objects.select_related('series')
     serializer_class = serializers.CaseSerializer
 
+    @detail_route(methods=['post'], url_path='candidates/bulk', url_name='bulk-candidates')
+    def bulk_candidates(self, request, pk=None):
+        """
+        Add a list of candidates of the form {'centroid': {'x': int, 'y': int, 'z': int},
+        'probability_concerning': float} to the case in a single transaction, and return their ids.
+        """
+        return self._bulk_create(create_candidates, request.data)
+
+    @detail_route(methods=['post'], url_path='nodules/bulk', url_name='bulk-nodules')
+    def bulk_nodules(self, request, pk=None):
+        """
+        Add a list of nodules of the form {'centroid': {'x': int, 'y': int, 'z': int}, 'candidate': int} to the case
+        in a single transaction, and return their ids. The candidate is optional.
+        """
+        return self._bulk_create(create_nodules, request.data)
+
+    def _bulk_create(self, create, items):
+        try:
+            ids = create(self.get_object(), items)
+        except BulkValidationError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'ids': ids}, status=status.HTTP_201_CREATED)
+
 
 class CandidateViewSet(viewsets.ModelViewSet):
-    queryset = Candidate.objects.all()
+    queryset = Candidate.objects.select_related('centroid')
     serializer_class = serializers.CandidateSerializer
 
 
 class NoduleViewSet(viewsets.ModelViewSet):
-    queryset = Nodule.objects.all()
+    queryset = Nodule.objects.select_related('centroid')
     serializer_class = serializers.NoduleSerializer
 
 
@@ -41,54 +72,74 @@ class ImageSeriesViewSet(viewsets.ModelViewSet):
     queryset = ImageSeries.objects.all()
     serializer_class = serializers.ImageSeriesSerializer
 
+    def get_queryset(self):
+        """
+        Filter the series on the `patient_id` and `series_instance_uid` query parameters.
+        """
+        queryset = super().get_queryset()
+        for field in ('patient_id', 'series_instance_uid'):
+            value = self.request.query_params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value})
+        return queryset
+
 
 class ImageAvailableApiView(APIView):
     """
     View list of images from dataset directory
     """
 
-    def __init__(self, *args, **kwargs):
-        super(ImageAvailableApiView, self).__init__(**kwargs)
-        self.fss = FileSystemStorage(settings.DATASOURCE_DIR)
-
-    def walk(self, location, dir_name='root'):
-        """
-        Recursively walkthrough directories and files
-        """
-        list_dirs = self.fss.listdir(location)
-        tree = {
-            'name': dir_name,
-            'children': [],
-        }
-        tree['children'] = sorted(list_dirs[1])
-        for dirname in sorted(list_dirs[0]):
-            tree['children'].append(self.walk(os.path.join(location, dirname), dirname))
-        return tree
-
     def get(self, request):
         """
         Return a sorted(by name) list of files and folders
         in dataset in the form
-        {'directories': [
-            {
-                'name': directory_name1,
-                'children': [
-                    file_name1,
-                    file_name2,
-                    {
-                        'name': 'nested_dir_1',
-                        'children': [
-                            'file_name_1',
-                            'file_name_2',
-                            ....
-                        ]
-                    }
-                    ... ]
-            }, ... ]
+        {'directories': {
+            'name': 'root',
+            'children': [
+                file_name1,
+                file_name2,
+                {
+                    'name': 'nested_dir_1',
+                    'children': [
+                        'file_name_1',
+                        'file_name_2',
+                        ....
+                    ]
+                }
+                ... ]
+            },
+         'path': '',
+         'depth': None,
+         'cache_age': 1.5
         }
+
+        The query parameter `path` selects a subdirectory of the dataset, and `depth` limits the number of levels
+        of directories listed. The directories deeper than `depth` have None as their children.
+        `cache_age` is the age in seconds of the oldest cached directory listing in the response.
         """
-        tree = self.walk(settings.DATASOURCE_DIR)
-        return Response({'directories': tree})
+        path = request.query_params.get('path', '')
+        depth = request.query_params.get('depth')
+        try:
+            depth = int(depth) if depth is not None else None
+            if depth is not None and depth < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'depth must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        index = get_index(settings.DATASOURCE_DIR, settings.DATASOURCE_REVALIDATE_AFTER)
+        try:
+            tree, checked = index.tree(path, depth)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except FileNotFoundError as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'directories': tree,
+            'path': index.resolve(path),
+            'depth': depth,
+            'cache_age': max(0., time.time() - checked),
+        })
 
 
 @api_view(['GET'])
@@ -113,6 +164,10 @@ class JsonHtmlRenderer(renderers.BaseRenderer):
 # Render .json and .html requests
 @renderer_classes((JSONRenderer, JsonHtmlRenderer))
 def case_report(request, case_id, format=None):
-    case = get_object_or_404(Case, pk=case_id)
+    # Fetch the nested candidates and nodules with their centroids and series in one query each
+    case = get_object_or_404(Case.objects.select_related('series').prefetch_related(
+        Prefetch('candidates', queryset=Candidate.objects.select_related('centroid__series')),
+        Prefetch('nodules', queryset=Nodule.objects.select_related('centroid__series')),
+    ), pk=case_id)
 
     return Response(CaseSerializer(case).data)
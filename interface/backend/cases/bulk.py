@@ -0,0 +1,167 @@
+from collections import Counter
+
+from backend.cases.models import (
+    Candidate,
+    Nodule
+)
+from backend.images.models import ImageLocation
+from django.db import (
+    connection,
+    transaction
+)
+
+# The range of the PositiveSmallIntegerFields of an ImageLocation
+MAX_COORDINATE = 32767
+
+
+class BulkValidationError(ValueError):
+    """
+    Raised with the errors of each invalid item, keyed by its index in the list.
+    """
+
+    def __init__(self, errors):
+        super().__init__('{} invalid items'.format(len(errors)))
+        self.errors = errors
+
+
+def _validate_centroid(centroid):
+    if not isinstance(centroid, dict):
+        return 'Expected an object with the keys x, y and z.'
+    for axis in ('x', 'y', 'z'):
+        value = centroid.get(axis)
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_COORDINATE:
+            return "'{}' must be an integer between 0 and {}.".format(axis, MAX_COORDINATE)
+
+
+def _validate(items, name, validate_item):
+    if not isinstance(items, list):
+        raise BulkValidationError({'non_field_errors': 'Expected a list of {}.'.format(name)})
+
+    errors = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            item_errors = {'non_field_errors': 'Expected an object.'}
+        else:
+            item_errors = validate_item(item)
+            centroid_error = _validate_centroid(item.get('centroid'))
+            if centroid_error:
+                item_errors['centroid'] = centroid_error
+        if item_errors:
+            errors[i] = item_errors
+    if errors:
+        raise BulkValidationError(errors)
+
+
+def validate_candidates(items):
+    """
+    Check the candidates of a bulk request in a single pass, without querying the database.
+
+    Args:
+        items (list[dict]): candidates of the form {'centroid': {'x': int, 'y': int, 'z': int},
+            'probability_concerning': float}
+
+    Raises:
+        BulkValidationError: if any of the candidates is invalid
+    """
+    def validate_item(item):
+        probability = item.get('probability_concerning')
+        if isinstance(probability, bool) or not isinstance(probability, (int, float)) or not 0 <= probability <= 1:
+            return {'probability_concerning': 'Must be a number between 0 and 1.'}
+        return {}
+
+    _validate(items, 'candidates', validate_item)
+
+
+def validate_nodules(case, items):
+    """
+    Check the nodules of a bulk request in a single pass, looking up all of the referenced candidates in one query.
+
+    Args:
+        case (Case): the case the nodules are added to
+        items (list[dict]): nodules of the form {'centroid': {'x': int, 'y': int, 'z': int}, 'candidate': int},
+            where the id of a candidate of the case without a nodule is optional
+
+    Raises:
+        BulkValidationError: if any of the nodules is invalid
+    """
+    referenced = Counter(item.get('candidate') for item in items if isinstance(item, dict)) \
+        if isinstance(items, list) else Counter()
+    available = set(Candidate.objects.filter(case=case, nodule__isnull=True,
+                                             id__in=[id_ for id_ in referenced if isinstance(id_, int)])
+                    .values_list('id', flat=True))
+
+    def validate_item(item):
+        candidate = item.get('candidate')
+        if candidate is None:
+            return {}
+        if candidate not in available:
+            return {'candidate': 'There is no candidate {} without a nodule in case {}.'.format(candidate, case.id)}
+        if referenced[candidate] > 1:
+            return {'candidate': 'The candidate {} is referenced by several nodules.'.format(candidate)}
+        return {}
+
+    _validate(items, 'nodules', validate_item)
+
+
+def _bulk_create(model, objs):
+    """
+    Insert the instances and set their primary keys.
+
+    Only backends that return the ids from a bulk insert, like PostgreSQL, insert them in a single query. The others
+    insert them one by one, since the ids are needed to reference them.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs)
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
+
+
+def _create_centroids(case, items):
+    return _bulk_create(ImageLocation, [ImageLocation(series_id=case.series_id, **item['centroid']) for item in items])
+
+
+def create_candidates(case, items):
+    """
+    Validate the candidates and insert them, with their centroids, in a single transaction.
+
+    Args:
+        case (Case): the case the candidates are added to
+        items (list[dict]): see `validate_candidates`
+
+    Returns:
+        list[int]: the ids of the created candidates, in the order of `items`
+
+    Raises:
+        BulkValidationError: if any of the candidates is invalid, in which case none is created
+    """
+    validate_candidates(items)
+    with transaction.atomic():
+        centroids = _create_centroids(case, items)
+        candidates = _bulk_create(Candidate, [
+            Candidate(case=case, centroid=centroid, probability_concerning=item['probability_concerning'])
+            for centroid, item in zip(centroids, items)])
+    return [candidate.id for candidate in candidates]
+
+
+def create_nodules(case, items):
+    """
+    Validate the nodules and insert them, with their centroids, in a single transaction.
+
+    Args:
+        case (Case): the case the nodules are added to
+        items (list[dict]): see `validate_nodules`
+
+    Returns:
+        list[int]: the ids of the created nodules, in the order of `items`
+
+    Raises:
+        BulkValidationError: if any of the nodules is invalid, in which case none is created
+    """
+    validate_nodules(case, items)
+    with transaction.atomic():
+        centroids = _create_centroids(case, items)
+        nodules = _bulk_create(Nodule, [
+            Nodule(case=case, centroid=centroid, candidate_id=item.get('candidate'))
+            for centroid, item in zip(centroids, items)])
+    return [nodule.id for nodule in nodules]
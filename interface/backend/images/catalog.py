@@ -0,0 +1,150 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dicom
+from django.db import transaction
+
+from backend.images.models import ImageSeries
+
+
+def find_series(root):
+    """
+    Find the directories holding DICOM images under the datasource directory.
+
+    Args:
+        root (str): absolute path to the datasource directory
+
+    Returns:
+        dict[str, list[str]]: the sorted dcm-file names of each series directory
+    """
+    series = {}
+    for directory, _, files in os.walk(root):
+        dcm_files = sorted(name for name in files if name.endswith('.dcm'))
+        if dcm_files:
+            series[directory] = dcm_files
+    return series
+
+
+def fingerprint(uri, files):
+    """
+    Return a digest of the names, sizes and modification times of the dcm-files of a series, which changes whenever
+    an image is added, removed or rewritten without reading any of them.
+
+    Args:
+        uri (str): absolute path to the series directory
+        files (list[str]): the dcm-file names in the directory
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha1()
+    for name in files:
+        stat = os.stat(os.path.join(uri, name))
+        digest.update('{}\0{}\0{}\n'.format(name, stat.st_size, stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def read_series(uri, files):
+    """
+    Read the catalog fields of a series from the header of its first image, skipping the pixel data.
+
+    Args:
+        uri (str): absolute path to the series directory
+        files (list[str]): the dcm-file names in the directory
+
+    Returns:
+        dict: the ImageSeries fields taken from the headers
+    """
+    plan = dicom.read_file(os.path.join(uri, files[0]), stop_before_pixels=True)
+    pixel_spacing = plan.get('PixelSpacing')
+    slice_thickness = plan.get('SliceThickness')
+    return {
+        'patient_id': plan.PatientID,
+        'series_instance_uid': plan.SeriesInstanceUID,
+        'slice_count': len(files),
+        'rows': plan.get('Rows'),
+        'columns': plan.get('Columns'),
+        'pixel_spacing': float(pixel_spacing[0]) if pixel_spacing else None,
+        'slice_thickness': float(slice_thickness) if slice_thickness not in (None, '') else None,
+    }
+
+
+def scan_series(uri, files, known=None, full=False):
+    """
+    Fingerprint a series unless its directory is unchanged, and read its headers if its fingerprint changed.
+
+    Args:
+        uri (str): absolute path to the series directory
+        files (list[str]): the dcm-file names in the directory
+        known (ImageSeries): the catalogued series, None if it is new
+        full (bool): fingerprint the series even if its directory is unchanged
+
+    Returns:
+        (str, str, float, dict): the uri, fingerprint and directory modification time of the series, and the
+        ImageSeries fields read from its headers, None if it is unchanged or False if they could not be read
+    """
+    mtime = os.stat(uri).st_mtime
+    if not full and known is not None and known.directory_mtime == mtime:
+        return uri, known.fingerprint, mtime, None
+
+    digest = fingerprint(uri, files)
+    # A fingerprint taken within a second of the last modification may have missed a change with the same mtime
+    if time.time() - mtime < 1:
+        mtime = None
+    if known is not None and known.fingerprint == digest:
+        return uri, digest, mtime, None
+    try:
+        return uri, digest, mtime, read_series(uri, files)
+    except Exception:
+        return uri, digest, mtime, False
+
+
+def index_series(root, workers=8, full=False):
+    """
+    Catalog the series under the datasource directory as ImageSeries rows.
+
+    A series whose directory kept the modification time it had when the series was last fingerprinted is
+    unchanged, which takes a single stat. The modification time of a directory changes whenever an image is added
+    to, removed from or renamed in it. The dcm-files of the other series are fingerprinted from their metadata.
+    Only the headers of the new and changed series are read and only their rows are written, the new ones with a
+    single bulk_create. The series are fingerprinted and read on `workers` threads, since both mostly wait on the
+    filesystem.
+
+    Args:
+        root (str): absolute path to the datasource directory
+        workers (int): the number of threads scanning the series
+        full (bool): fingerprint every series, which also finds the images rewritten in place
+
+    Returns:
+        dict: the number of series 'created', 'updated', 'unchanged' and 'failed'
+    """
+    series = find_series(root)
+    existing = {image_series.uri: image_series for image_series in ImageSeries.objects.filter(uri__startswith=root)}
+
+    def scan(uri):
+        return scan_series(uri, series[uri], existing.get(uri), full)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        scanned = list(executor.map(scan, sorted(series)))
+
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+    created = []
+    with transaction.atomic():
+        for uri, digest, mtime, fields in scanned:
+            if fields is None:
+                if existing[uri].directory_mtime != mtime:
+                    ImageSeries.objects.filter(pk=existing[uri].pk).update(directory_mtime=mtime)
+                counts['unchanged'] += 1
+            elif fields is False:
+                counts['failed'] += 1
+            elif uri in existing:
+                ImageSeries.objects.filter(pk=existing[uri].pk).update(
+                    fingerprint=digest, directory_mtime=mtime, **fields)
+                counts['updated'] += 1
+            else:
+                created.append(ImageSeries(uri=uri, fingerprint=digest, directory_mtime=mtime, **fields))
+        ImageSeries.objects.bulk_create(created, batch_size=500)
+    counts['created'] = len(created)
+    return counts
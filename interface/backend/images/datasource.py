@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+
+class DatasourceIndex(object):
+    """
+    A cache of the directory listings of the datasource tree.
+
+    A cached listing is revalidated against the modification time of its directory, which changes whenever an entry
+    is added to or removed from it. Only the directories whose modification time changed are listed again, and a
+    directory checked less than `revalidate_after` seconds ago is not even checked.
+
+    Args:
+        root (str): absolute path to the datasource directory
+        revalidate_after (float): seconds during which a cached listing is used without checking its directory
+    """
+
+    def __init__(self, root, revalidate_after=10):
+        self.root = root
+        self.revalidate_after = revalidate_after
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, path=''):
+        """
+        Return the normalized path of a directory relative to the root.
+
+        Args:
+            path (str): path relative to the root, '' for the root itself
+
+        Returns:
+            str: the normalized relative path
+
+        Raises:
+            ValueError: if the path leaves the root
+            FileNotFoundError: if there is no such directory
+        """
+        path = os.path.normpath(path.strip('/')) if path.strip('/') else ''
+        if path == '..' or path.startswith('../') or os.path.isabs(path):
+            raise ValueError("The path '{}' is outside of the datasource".format(path))
+        if path == '.':
+            path = ''
+        if not os.path.isdir(os.path.join(self.root, path)):
+            raise FileNotFoundError("There is no directory '{}' in the datasource".format(path))
+        return path
+
+    def listdir(self, path):
+        """
+        List a directory, from the cache if it did not change.
+
+        Args:
+            path (str): normalized path relative to the root
+
+        Returns:
+            (list[str], list[str], float): the sorted names of the subdirectories and files, and the time the
+            listing was last checked against the directory
+        """
+        now = time.time()
+        with self._lock:
+            listing = self._listings.get(path)
+        if listing is not None and now - listing['checked'] < self.revalidate_after:
+            return listing['directories'], listing['files'], listing['checked']
+
+        location = os.path.join(self.root, path)
+        mtime = os.stat(location).st_mtime
+        # A listing taken within a second of the last modification may have missed a change with the same mtime
+        if listing is None or listing['mtime'] != mtime or listing['listed'] - mtime < 1:
+            directories, files = [], []
+            for entry in os.scandir(location):
+                (directories if entry.is_dir() else files).append(entry.name)
+            listing = {'mtime': mtime, 'listed': now, 'directories': sorted(directories), 'files': sorted(files)}
+        listing = dict(listing, checked=now)
+
+        with self._lock:
+            self._listings[path] = listing
+        return listing['directories'], listing['files'], now
+
+    def tree(self, path='', depth=None):
+        """
+        Return the tree of the files and directories under a directory.
+
+        Args:
+            path (str): path relative to the root, '' for the root itself
+            depth (int): the number of levels of directories listed, starting with `path` itself, all of them
+                if None
+
+        Returns:
+            (dict, float): the tree in the form
+            {
+                'name': directory_name,
+                'children': [
+                    file_name1,
+                    {
+                        'name': 'nested_dir_1',
+                        'children': [...]  # None if the directory is deeper than `depth`
+                    }, ...]
+            }
+            and the time the oldest listing of the tree was checked against its directory
+        """
+        path = self.resolve(path)
+        name = os.path.basename(path) if path else 'root'
+        return self._tree(path, name, depth)
+
+    def _tree(self, path, name, depth):
+        if depth is not None and depth <= 0:
+            return {'name': name, 'children': None}, time.time()
+
+        directories, files, checked = self.listdir(path)
+        children = list(files)
+        for directory in directories:
+            subtree, subtree_checked = self._tree(os.path.join(path, directory), directory,
+                                                  depth - 1 if depth is not None else None)
+            children.append(subtree)
+            checked = min(checked, subtree_checked)
+        return {'name': name, 'children': children}, checked
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root, revalidate_after=10):
+    """
+    Return the DatasourceIndex of a datasource directory, shared by the requests of this process.
+
+    Args:
+        root (str): absolute path to the datasource directory
+        revalidate_after (float): seconds during which a cached listing is used without checking its directory
+
+    Returns:
+        DatasourceIndex
+    """
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = DatasourceIndex(root, revalidate_after)
+        index.revalidate_after = revalidate_after
+        return index
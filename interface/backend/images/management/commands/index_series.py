@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.images.catalog import index_series
+
+
+class Command(BaseCommand):
+    help = 'Catalog the DICOM series of the datasource directory as ImageSeries, rescanning only changed series.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=settings.DATASOURCE_DIR,
+                            help='the directory to scan (default: DATASOURCE_DIR)')
+        parser.add_argument('--workers', type=int, default=8, help='the number of threads scanning series')
+        parser.add_argument('--full', action='store_true',
+                            help='fingerprint every series, also finding the images rewritten in place')
+
+    def handle(self, *args, **options):
+        counts = index_series(options['root'], workers=options['workers'], full=options['full'])
+        self.stdout.write('{created} created, {updated} updated, {unchanged} unchanged, {failed} failed'
+                          .format(**counts))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-17 22:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0002_imageseries_patient_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageseries',
+            name='columns',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageseries',
+            name='fingerprint',
+            field=models.CharField(blank=True, help_text='Digest of the names, sizes and modification times of the images', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='imageseries',
+            name='pixel_spacing',
+            field=models.FloatField(blank=True, help_text='Size of a pixel in mm', null=True),
+        ),
+        migrations.AddField(
+            model_name='imageseries',
+            name='rows',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageseries',
+            name='slice_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Number of DICOM images in the series', null=True),
+        ),
+        migrations.AddField(
+            model_name='imageseries',
+            name='slice_thickness',
+            field=models.FloatField(blank=True, help_text='Thickness of a slice in mm', null=True),
+        ),
+        migrations.AlterField(
+            model_name='imageseries',
+            name='patient_id',
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='imageseries',
+            name='series_instance_uid',
+            field=models.CharField(db_index=True, max_length=256),
+        ),
+        migrations.AlterField(
+            model_name='imageseries',
+            name='uri',
+            field=models.CharField(db_index=True, max_length=512),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0003_imageseries_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageseries',
+            name='directory_mtime',
+            field=models.FloatField(blank=True, help_text='Modification time of the directory when it was fingerprinted', null=True),
+        ),
+    ]
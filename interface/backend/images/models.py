@@ -10,16 +10,33 @@ class ImageSeries(models.Model):
     """
     Model representing a certain image series
     """
-    patient_id = models.CharField(max_length=64)
+    patient_id = models.CharField(max_length=64, db_index=True)
 
-    series_instance_uid = models.CharField(max_length=256)
+    series_instance_uid = models.CharField(max_length=256, db_index=True)
 
-    uri = models.CharField(max_length=512)
+    uri = models.CharField(max_length=512, db_index=True)
+
+    slice_count = models.PositiveIntegerField(null=True, blank=True, help_text='Number of DICOM images in the series')
+
+    rows = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    columns = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    pixel_spacing = models.FloatField(null=True, blank=True, help_text='Size of a pixel in mm')
+
+    slice_thickness = models.FloatField(null=True, blank=True, help_text='Thickness of a slice in mm')
+
+    fingerprint = models.CharField(max_length=40, blank=True,
+                                   help_text='Digest of the names, sizes and modification times of the images')
+
+    directory_mtime = models.FloatField(null=True, blank=True,
+                                        help_text='Modification time of the directory when it was fingerprinted')
 
     def get_or_create(uri):
         """
         Return the ImageSeries instance with the same PatientID and SeriesInstanceUID as the DICOM images in the
-        given directory. If none exists so far, create one.
+        given directory. If none exists so far, create one. A series already in the catalog is returned without
+        reading its images.
         Return a tuple of (ImageSeries, created), where created is a boolean specifying whether the object was created.
 
         Args:
@@ -28,8 +45,12 @@ class ImageSeries(models.Model):
         Returns:
             (ImageSeries, bool): the looked up ImageSeries instance and whether it had to be created
         """
+        series = ImageSeries.objects.filter(uri=uri).first()
+        if series is not None:
+            return series, False
+
         file_ = glob.glob1(uri, '*.dcm')[0]
-        plan = dicom.read_file(safe_join(uri, file_))
+        plan = dicom.read_file(safe_join(uri, file_), stop_before_pixels=True)
         patient_id = plan.PatientID
         series_instance_uid = plan.SeriesInstanceUID
         return ImageSeries.objects.get_or_create(
@@ -1,5 +1,15 @@
+import glob
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
+from backend.images.catalog import index_series
+from backend.images.datasource import DatasourceIndex
 from backend.images.factories import ImageSeriesFactory
 from backend.images.models import ImageSeries
 
@@ -24,3 +34,107 @@ class SmokeTest(TestCase):
         assert image_series.patient_id == 'LIDC-IDRI-0001'
         assert image_series.series_instance_uid == '1.3.6.1.4.1.14519.5.2.1.6279.6001.179049373636438705059720603192'
         assert image_series.uri == uri
+
+
+class DatasourceIndexTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        os.makedirs(os.path.join(self.root.name, 'patient', 'series'))
+        open(os.path.join(self.root.name, 'patient', 'series', '1.dcm'), 'w').close()
+        open(os.path.join(self.root.name, 'readme.txt'), 'w').close()
+
+    def test_tree(self):
+        index = DatasourceIndex(self.root.name)
+        tree, _ = index.tree()
+        self.assertEqual(tree, {
+            'name': 'root',
+            'children': ['readme.txt', {'name': 'patient', 'children': [{'name': 'series', 'children': ['1.dcm']}]}],
+        })
+
+        tree, _ = index.tree('patient/', depth=1)
+        self.assertEqual(tree, {'name': 'patient', 'children': [{'name': 'series', 'children': None}]})
+
+        with self.assertRaises(ValueError):
+            index.tree('patient/../..')
+        with self.assertRaises(FileNotFoundError):
+            index.tree('missing')
+
+    def test_revalidation(self):
+        index = DatasourceIndex(self.root.name, revalidate_after=60)
+        series = os.path.join(self.root.name, 'patient', 'series')
+        for directory in (self.root.name, os.path.dirname(series), series):
+            os.utime(directory, (0, 0))
+        index.tree()
+
+        # within revalidate_after the cached listing is used
+        open(os.path.join(series, '2.dcm'), 'w').close()
+        os.utime(series, (100, 100))
+        self.assertEqual(index.listdir('patient/series')[1], ['1.dcm'])
+
+        # afterwards only the modified directories are listed again
+        index.revalidate_after = 0
+        with mock.patch('backend.images.datasource.os.scandir', wraps=os.scandir) as scandir:
+            tree, checked = index.tree()
+            index.tree()
+        self.assertEqual([call[0][0] for call in scandir.call_args_list], [series])
+        self.assertEqual(tree['children'][1]['children'][0]['children'], ['1.dcm', '2.dcm'])
+
+
+class CatalogTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.series = os.path.join(self.root.name, 'LIDC-IDRI-0001', 'series')
+        os.makedirs(self.series)
+        images = sorted(glob.glob('/images/LIDC-IDRI-0001/*/*/*.dcm'))
+        for image in images[:2]:
+            shutil.copy(image, self.series)
+        self.spare = images[2]
+
+    def age(self, seconds=10):
+        # the modification time of a directory changed within the last second is not trusted
+        mtime = os.stat(self.series).st_mtime - seconds
+        os.utime(self.series, (mtime, mtime))
+
+    def test_index_series(self):
+        self.age()
+        self.assertEqual(index_series(self.root.name, workers=2),
+                         {'created': 1, 'updated': 0, 'unchanged': 0, 'failed': 0})
+        image_series = ImageSeries.objects.get(uri=self.series)
+        self.assertEqual(image_series.patient_id, 'LIDC-IDRI-0001')
+        self.assertEqual(image_series.slice_count, 2)
+        self.assertEqual((image_series.rows, image_series.columns), (512, 512))
+        self.assertAlmostEqual(image_series.pixel_spacing, 0.703125)
+        self.assertAlmostEqual(image_series.slice_thickness, 2.5)
+
+        # an unchanged series is neither fingerprinted nor read again
+        with mock.patch('backend.images.catalog.read_series') as read_series, \
+                mock.patch('backend.images.catalog.fingerprint') as fingerprint:
+            self.assertEqual(index_series(self.root.name)['unchanged'], 1)
+        read_series.assert_not_called()
+        fingerprint.assert_not_called()
+
+        shutil.copy(self.spare, self.series)
+        self.age()
+        self.assertEqual(index_series(self.root.name)['updated'], 1)
+        self.assertEqual(ImageSeries.objects.get(uri=self.series).slice_count, 3)
+
+        # an image rewritten in place keeps the modification time of the directory
+        image = os.path.join(self.series, os.path.basename(self.spare))
+        with open(image, 'ab') as f:
+            f.write(b'\0')
+        self.assertEqual(index_series(self.root.name)['unchanged'], 1)
+        self.assertEqual(index_series(self.root.name, full=True)['updated'], 1)
+
+        # the catalogued series is returned without reading its images
+        with mock.patch('backend.images.models.dicom.read_file') as read_file:
+            image_series, created = ImageSeries.get_or_create(self.series)
+        read_file.assert_not_called()
+        self.assertFalse(created)
+        self.assertEqual(ImageSeries.objects.count(), 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('index_series', root=self.root.name, stdout=out)
+        self.assertIn('1 created', out.getvalue())
@@ -0,0 +1,250 @@
+import gzip
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+NDJSON = 'application/x-ndjson'
+
+
+class PredictionServiceError(Exception):
+    """
+    Raised when the prediction service can not be reached or answers with an error.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class PredictionClient(object):
+    """
+    A client of the prediction service, keeping its connections alive in a pool shared by the threads using it.
+
+    Args:
+        base_url (str): URL of the prediction service, e.g. 'http://prediction:8001/'
+        connect_timeout (float): seconds to wait for a connection
+        read_timeout (float): seconds to wait for a response once connected
+        retries (int): the number of times a failed connection, or a 502, 503 or 504 response, is retried. Requests
+            that time out while the service handles them are not retried.
+        backoff_factor (float): the retries wait backoff_factor * 2 ** (retry - 1) seconds
+        pool_size (int): the number of connections kept alive
+        compress_min_size (int): request bodies of at least this many bytes are sent gzip compressed, None to never
+            compress them. Responses are always accepted gzip compressed.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=300, retries=3, backoff_factor=0.5, pool_size=10,
+                 compress_min_size=1024):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.timeout = (connect_timeout, read_timeout)
+        self.compress_min_size = compress_min_size
+        self.pool_size = pool_size
+
+        # The predictions do not change any state, so POST requests are safe to retry when the service did not
+        # start them. Once a request was sent, a read timeout or a dropped connection is not retried, as the
+        # service may still be running the prediction.
+        retry = Retry(total=retries, read=0, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504),
+                      method_whitelist=frozenset(['GET', 'POST']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip'})
+
+    def _send(self, path, payload, **kwargs):
+        body = json.dumps(payload).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.compress_min_size is not None and len(body) >= self.compress_min_size:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        headers.update(kwargs.pop('headers', {}))
+
+        try:
+            return self.session.post(self.base_url + path, data=body, headers=headers, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise PredictionServiceError('The prediction service is unavailable: {}'.format(e))
+
+    @staticmethod
+    def _check(response, data):
+        if response.status_code >= 400 or 'error' in data:
+            raise PredictionServiceError(data.get('error') or response.reason, response.status_code)
+
+    def post(self, path, payload):
+        """
+        POST a JSON payload to the prediction service.
+
+        Args:
+            path (str): path of the endpoint relative to the base URL
+            payload (object): the JSON serializable body
+
+        Returns:
+            dict: the decoded response
+
+        Raises:
+            PredictionServiceError: if the request failed or the service answered with an error
+        """
+        response = self._send(path, payload)
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        self._check(response, data)
+        return data
+
+    def predict(self, algorithm, **payload):
+        """
+        Return the prediction of an algorithm.
+
+        Args:
+            algorithm (str): one of 'identify', 'classify', 'segment' or 'pipeline'
+            payload: the parameters of the predict function of the algorithm
+
+        Returns:
+            the prediction
+        """
+        return self.post('{}/predict/'.format(algorithm), payload)['prediction']
+
+    def iter_predict(self, algorithm, **payload):
+        """
+        Yield the items of a prediction as the service streams them as NDJSON, e.g. each classified centroid as soon
+        as it is evaluated. The predictions that are not lists are yielded whole.
+
+        Args:
+            algorithm (str): one of 'identify', 'classify' or 'segment'
+            payload: the parameters of the predict function of the algorithm
+
+        Yields:
+            the items of the prediction
+
+        Raises:
+            PredictionServiceError: if the request failed or the service answered with an error, possibly after some
+                items were yielded
+        """
+        response = self._send('{}/predict/'.format(algorithm), payload, stream=True, headers={'Accept': NDJSON})
+        with closing(response):
+            if response.headers.get('Content-Type', '').split(';')[0] != NDJSON:
+                # The errors, and the predictions of a service not streaming them, come as a JSON document
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = {}
+                self._check(response, data)
+                prediction = data['prediction']
+                yield from prediction if isinstance(prediction, list) else [prediction]
+                return
+
+            error = None
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                item = json.loads(line.decode())
+                if isinstance(item, dict) and 'error' in item:
+                    # The error is the last line, the stream is read to its end to keep the connection alive
+                    error = item
+                else:
+                    yield item
+            if error is not None:
+                raise PredictionServiceError(error['error'], error.get('status'))
+
+    def identify(self, dicom_path):
+        return self.predict('identify', dicom_path=dicom_path)
+
+    def classify(self, dicom_path, centroids, model_path=None):
+        """
+        Return the centroids with the probability they are concerning.
+
+        Args:
+            dicom_path (str): path to the DICOM series as seen by the prediction service
+            centroids (list[dict]): the centroids to classify, of the form {'x': int, 'y': int, 'z': int}
+            model_path (str): path to the classify model as seen by the prediction service. The service classifies
+                nothing without one.
+
+        Returns:
+            list[dict]: the centroids with their p_concerning
+        """
+        payload = {'dicom_path': dicom_path, 'centroids': centroids}
+        if model_path is not None:
+            payload['model_path'] = model_path
+        return self.predict('classify', **payload)
+
+    def segment(self, dicom_path, centroids):
+        return self.predict('segment', dicom_path=dicom_path, centroids=centroids)
+
+    def analyze(self, dicom_path, nodule_threshold=None, concerning_threshold=None, classify=None):
+        """
+        Find the candidates of a series, then classify and segment them, in a single call of the pipeline endpoint.
+
+        Args:
+            dicom_path (str): path to the DICOM series as seen by the prediction service
+            nodule_threshold (float): the candidates with a lower p_nodule are not classified, the service's
+                default if None
+            concerning_threshold (float): the candidates with a lower p_concerning are not segmented, the service's
+                default if None
+            classify (dict): further parameters of classify, e.g. {'model_path': ...}, the service's default model
+                if None
+
+        Returns:
+            dict: {'candidates': list[dict], 'classified': list[dict], 'segmentation': dict | None}
+        """
+        payload = {'dicom_path': dicom_path}
+        if nodule_threshold is not None:
+            payload['nodule_threshold'] = nodule_threshold
+        if concerning_threshold is not None:
+            payload['concerning_threshold'] = concerning_threshold
+        if classify is not None:
+            payload['classify'] = classify
+        return self.predict('pipeline', **payload)
+
+    def analyze_many(self, dicom_paths, workers=None, classify=None):
+        """
+        Analyze several series concurrently, each on its own thread sharing the pooled connections.
+
+        Args:
+            dicom_paths (list[str]): paths to the DICOM series as seen by the prediction service
+            workers (int): the number of series analyzed at once, the pool size by default
+            classify (dict): further parameters of classify, see `analyze`
+
+        Returns:
+            list[dict | PredictionServiceError]: the result of `analyze`, or the error it raised, for each series
+        """
+        def analyze(dicom_path):
+            try:
+                return self.analyze(dicom_path, classify=classify)
+            except PredictionServiceError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers or self.pool_size) as executor:
+            return list(executor.map(analyze, dicom_paths))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the PredictionClient configured by the PREDICTION_SERVICE_* settings, shared by the requests of this
+    process.
+
+    Returns:
+        PredictionClient
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PredictionClient(
+                settings.PREDICTION_SERVICE_URL,
+                connect_timeout=settings.PREDICTION_SERVICE_CONNECT_TIMEOUT,
+                read_timeout=settings.PREDICTION_SERVICE_READ_TIMEOUT,
+                retries=settings.PREDICTION_SERVICE_RETRIES,
+                pool_size=settings.PREDICTION_SERVICE_POOL_SIZE,
+            )
+        return _client
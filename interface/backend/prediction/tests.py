@@ -0,0 +1,219 @@
+import gzip
+import json
+import threading
+import time
+from http.server import (
+    BaseHTTPRequestHandler,
+    HTTPServer
+)
+from socketserver import ThreadingMixIn
+
+from backend.prediction.client import (
+    PredictionClient,
+    PredictionServiceError
+)
+from django.test import SimpleTestCase
+
+
+class StubPredictionHandler(BaseHTTPRequestHandler):
+    """
+    Answers the predict endpoints like the prediction service, with canned predictions.
+    """
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately, which Nagle's algorithm would delay on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        payload = json.loads(body.decode())
+
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get('Content-Encoding'), payload))
+            fail = self.server.failures > 0
+            self.server.failures -= fail
+
+        algorithm = self.path.strip('/').split('/')[0]
+        if fail:
+            self.respond(503, {'error': 'Busy', 'status': 503})
+        elif payload.get('dicom_path') == 'slow':
+            time.sleep(0.5)
+            self.respond(200, {'prediction': [], 'status': 200})
+        elif payload.get('dicom_path') == 'missing':
+            self.respond(500, {'error': "Error using algorithm '{}': missing.".format(algorithm), 'status': 500})
+        elif algorithm == 'pipeline':
+            prediction = {
+                'candidates': [{'x': 1, 'y': 2, 'z': 3, 'p_nodule': 0.5}],
+                'classified': [{'x': 1, 'y': 2, 'z': 3, 'p_concerning': 0.9}],
+                'segmentation': {'binary_mask_path': '/tmp/mask.npz', 'volumes': [42]},
+            }
+            self.respond(200, {'prediction': prediction, 'status': 200})
+        elif algorithm == 'identify':
+            self.respond(200, {'prediction': [{'x': 1, 'y': 2, 'z': 3, 'p_nodule': 0.5}], 'status': 200})
+        elif algorithm == 'classify':
+            # Like the service, nothing is classified without a model
+            prediction = [dict(centroid, p_concerning=0.9) for centroid in payload['centroids']] \
+                if payload.get('model_path') else []
+            if self.headers.get('Accept') == 'application/x-ndjson':
+                self.stream(prediction, payload.get('fail_after'))
+            else:
+                self.respond(200, {'prediction': prediction, 'status': 200})
+        else:
+            self.respond(200, {'prediction': {'binary_mask_path': '/tmp/mask.npz', 'volumes': [42]}, 'status': 200})
+
+    def respond(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, items, fail_after=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        lines = [json.dumps(item) + '\n' for item in items[:fail_after]]
+        if fail_after is not None:
+            lines.append(json.dumps({'error': "Error using algorithm 'classify': failed.", 'status': 500}) + '\n')
+        for line in lines + ['']:
+            self.wfile.write('{:x}\r\n{}\r\n'.format(len(line), line).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class StubPredictionService(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubPredictionHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.failures = 0
+        self.requests = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+
+class PredictionClientTest(SimpleTestCase):
+    def setUp(self):
+        self.service = StubPredictionService()
+        thread = threading.Thread(target=self.service.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.service.server_close)
+        self.addCleanup(self.service.shutdown)
+
+        self.client = PredictionClient(self.service.url, retries=2, backoff_factor=0, pool_size=4)
+        self.addCleanup(self.client.close)
+
+    def test_predict(self):
+        centroids = self.client.identify('/images/series')
+        self.assertEqual(centroids, [{'x': 1, 'y': 2, 'z': 3, 'p_nodule': 0.5}])
+        self.assertEqual(self.client.classify('/images/series', centroids), [])
+        self.assertEqual(self.client.classify('/images/series', centroids, 'model.h5')[0]['p_concerning'], 0.9)
+        self.assertEqual(self.client.segment('/images/series', centroids)['volumes'], [42])
+        self.assertEqual([path for path, _, _ in self.service.requests],
+                         ['/identify/predict/', '/classify/predict/', '/classify/predict/', '/segment/predict/'])
+        self.assertEqual(self.service.requests[2][2]['model_path'], 'model.h5')
+        # the calls go over a single kept-alive connection
+        self.assertEqual(self.service.connections, 1)
+
+    def test_analyze(self):
+        result = self.client.analyze('/images/series', nodule_threshold=0.3)
+        self.assertEqual(result['segmentation']['volumes'], [42])
+        self.client.analyze('/images/series', classify={'model_path': 'model.h5'})
+        self.assertEqual(self.service.requests, [
+            ('/pipeline/predict/', None, {'dicom_path': '/images/series', 'nodule_threshold': 0.3}),
+            ('/pipeline/predict/', None, {'dicom_path': '/images/series', 'classify': {'model_path': 'model.h5'}}),
+        ])
+
+    def test_analyze_many(self):
+        results = self.client.analyze_many(['/images/{}'.format(i) for i in range(20)] + ['missing'])
+        self.assertEqual(len(results), 21)
+        self.assertTrue(all(result['segmentation']['volumes'] == [42] for result in results[:20]))
+        self.assertIsInstance(results[20], PredictionServiceError)
+        self.assertEqual(results[20].status, 500)
+        self.assertLessEqual(self.service.connections, 4)
+
+    def test_retries(self):
+        self.service.failures = 2
+        self.assertEqual(len(self.client.identify('/images/series')), 1)
+        self.assertEqual(len(self.service.requests), 3)
+
+        self.service.failures = 3
+        with self.assertRaises(PredictionServiceError) as context:
+            self.client.identify('/images/series')
+        self.assertEqual(context.exception.status, 503)
+
+        # a prediction slower than the read timeout is not sent again while the service still runs it
+        del self.service.requests[:]
+        impatient = PredictionClient(self.service.url, retries=2, backoff_factor=0, read_timeout=0.1)
+        with self.assertRaises(PredictionServiceError):
+            impatient.identify('slow')
+        impatient.close()
+        time.sleep(0.6)
+        self.assertEqual(len(self.service.requests), 1)
+
+        unreachable = PredictionClient('http://127.0.0.1:1/', retries=0, connect_timeout=0.5)
+        with self.assertRaises(PredictionServiceError):
+            unreachable.identify('/images/series')
+
+    def test_iter_predict(self):
+        centroids = [{'x': i, 'y': i, 'z': i} for i in range(5)]
+        items = self.client.iter_predict('classify', dicom_path='/images/series', centroids=centroids,
+                                         model_path='model.h5')
+        self.assertEqual(next(items), dict(centroids[0], p_concerning=0.9))
+        self.assertEqual(len(list(items)), 4)
+
+        items = self.client.iter_predict('classify', dicom_path='/images/series', centroids=centroids,
+                                         model_path='model.h5', fail_after=2)
+        self.assertEqual(len([next(items), next(items)]), 2)
+        with self.assertRaises(PredictionServiceError) as context:
+            next(items)
+        self.assertEqual(context.exception.status, 500)
+
+        # the predictions that are not streamed are yielded from the JSON response
+        self.assertEqual(list(self.client.iter_predict('identify', dicom_path='/images/series')),
+                         [{'x': 1, 'y': 2, 'z': 3, 'p_nodule': 0.5}])
+        with self.assertRaises(PredictionServiceError):
+            list(self.client.iter_predict('identify', dicom_path='missing'))
+        # all of it over the same connection
+        self.assertEqual(self.service.connections, 1)
+
+    def test_compression(self):
+        centroids = [{'x': i, 'y': i, 'z': i} for i in range(100)]
+        self.client.classify('/images/series', centroids)
+        self.client.classify('/images/series', centroids[:1])
+        self.assertEqual([encoding for _, encoding, _ in self.service.requests], ['gzip', None])
+        self.assertEqual(self.service.requests[0][2]['centroids'], centroids)
+
+    def test_throughput(self):
+        def requests_per_second(client, count=200):
+            start = time.perf_counter()
+            for _ in range(count):
+                client.identify('/images/series')
+            return count / (time.perf_counter() - start)
+
+        pooled = requests_per_second(self.client)
+        self.assertEqual(self.service.connections, 1)
+
+        class Unpooled(PredictionClient):
+            def post(self, path, payload):
+                self.session.close()
+                return super().post(path, payload)
+
+        unpooled = requests_per_second(Unpooled(self.service.url))
+        self.assertEqual(self.service.connections, 201)
+        # Connecting over the loopback is cheap, but a kept-alive connection must never be much slower, as it is
+        # when a side waits for delayed acknowledgements
+        self.assertGreater(pooled, unpooled / 2)
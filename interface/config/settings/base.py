@@ -20,6 +20,16 @@ DATASOURCE_DIR = '/images'
 env = environ.Env()
 env.read_env(str(BASE_DIR.path('.env')))
 
+# Seconds during which a cached listing of a datasource directory is used without checking the directory for changes
+DATASOURCE_REVALIDATE_AFTER = env.float('DATASOURCE_REVALIDATE_AFTER', default=10)
+
+# The prediction service, and how long, how many times and over how many kept-alive connections it is called
+PREDICTION_SERVICE_URL = env('PREDICTION_SERVICE_URL', default='http://prediction:8001/')
+PREDICTION_SERVICE_CONNECT_TIMEOUT = env.float('PREDICTION_SERVICE_CONNECT_TIMEOUT', default=3.05)
+PREDICTION_SERVICE_READ_TIMEOUT = env.float('PREDICTION_SERVICE_READ_TIMEOUT', default=300)
+PREDICTION_SERVICE_RETRIES = env.int('PREDICTION_SERVICE_RETRIES', default=3)
+PREDICTION_SERVICE_POOL_SIZE = env.int('PREDICTION_SERVICE_POOL_SIZE', default=10)
+
 DEBUG = env.bool('DEBUG', default=False)
 
 # SECRET CONFIGURATION
@@ -0,0 +1,43 @@
+"""
+    prediction.benchmarks
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Benchmarks for the hot paths of the prediction service. Each module can be
+    run on its own from the prediction folder, e.g.::
+
+        python -m benchmarks.read_dicom
+"""
+import time
+
+
+def measure(func, repeat=5, number=1):
+    """Time `func` and return the best and the mean wall time of a call.
+
+    Args:
+        func (callable): The function to time, called without arguments.
+        repeat (int): The number of timing runs.
+        number (int): The number of calls per timing run.
+
+    Returns:
+        dict: A dictionary of the form::
+            {'best': float,
+             'mean': float,
+             'repeat': int}
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+
+    return {
+        'best': min(timings),
+        'mean': sum(timings) / len(timings),
+        'repeat': repeat,
+    }
+
+
+def report(name, timing):
+    """Print a timing returned by `measure`."""
+    print('{:<60} best {:8.4f}s   mean {:8.4f}s'.format(name, timing['best'], timing['mean']))
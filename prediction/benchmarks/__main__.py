@@ -0,0 +1,135 @@
+"""
+    prediction.benchmarks.__main__
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Runs the benchmark suites on a synthetic series, or on an images folder,
+    stores the timings as JSON and compares them with a baseline::
+
+        python -m benchmarks --output baseline.json
+        python -m benchmarks --baseline baseline.json --tolerance 0.25
+
+    The command exits with status 1 if the best time of a benchmark exceeds
+    its best time in the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from benchmarks import (calculate_volume, classify_batch, classify_predict, crop_dicom, load_dicom, load_volume,
+                        preprocess_patch, read_dicom, resample, synthetic)
+
+# The suites taking the images folder and the command line options
+SUITES = OrderedDict([
+    ('read_dicom', lambda images, options: read_dicom.run(images, workers=(1, 4))),
+    ('load_dicom', lambda images, options: load_dicom.run(images)),
+    ('crop_dicom', lambda images, options: crop_dicom.run(images)),
+    ('load_volume', lambda images, options: load_volume.run(images)),
+    ('preprocess_patch', lambda images, options: preprocess_patch.run(counts=(10, 100))),
+    ('resample', lambda images, options: resample.run(shape=(512, 512, 100), orders=(1, 3),
+                                                      workers=(1, os.cpu_count() or 1))),
+    ('calculate_volume', lambda images, options: calculate_volume.run(spurious=(1000, 20000))),
+    ('classify_predict', lambda images, options: classify_predict.run(images, options.model)),
+    ('classify_batch', lambda images, options: classify_batch.run(images, options.model, studies=options.studies)),
+])
+
+# The suites that need the model of the --model option
+MODEL_SUITES = ('classify_predict', 'classify_batch')
+
+
+def compare(results, baseline, tolerance, min_delta=0.):
+    """Find the benchmarks that got slower than in the baseline.
+
+    Args:
+        results (dict): the timings returned by the suites.
+        baseline (dict): the timings of the baseline.
+        tolerance (float): the allowed relative increase of the best time.
+        min_delta (float): increases of at most `min_delta` seconds are never regressions,
+            so that the noise of the fastest benchmarks is ignored.
+
+    Returns:
+        list[tuple[str, float, float]]: the name, baseline and current best time of each regression.
+    """
+    regressions = []
+    for name, timing in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['best'], timing['best']
+        if after > before * (1 + tolerance) and after - before > min_delta:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark the prediction service.')
+    parser.add_argument('suites', nargs='*', metavar='suite',
+                        help='the suites to run, all by default: {}'.format(', '.join(SUITES)))
+    parser.add_argument('--images', help='an images folder, a synthetic series is written by default')
+    parser.add_argument('--slices', type=int, default=64, help='the number of slices of the synthetic series')
+    parser.add_argument('--model', default=classify_predict.MODEL_PATH,
+                        help='the model of classify_predict and classify_batch')
+    parser.add_argument('--studies', type=int, default=100, help='the number of studies of classify_batch')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the allowed relative slowdown against the baseline (default: 0.25)')
+    parser.add_argument('--min-delta', type=float, default=0.005,
+                        help='the slowdown in seconds below which there is no regression (default: 0.005)')
+    options = parser.parse_args(argv)
+
+    unknown = set(options.suites) - set(SUITES)
+    if unknown:
+        parser.error('unknown suites: {}'.format(', '.join(sorted(unknown))))
+
+    suites = options.suites or list(SUITES)
+    if not os.path.exists(options.model):
+        skipped = [suite for suite in suites if suite in MODEL_SUITES]
+        for suite in skipped:
+            print('Skipping {}, there is no model at {}'.format(suite, options.model))
+        suites = [suite for suite in suites if suite not in skipped]
+
+    results = OrderedDict()
+    with tempfile.TemporaryDirectory() as images_path:
+        if options.images:
+            images_path = options.images
+        else:
+            synthetic.write_images(images_path, slices=options.slices)
+
+        for suite in suites:
+            print('# {}'.format(suite))
+            results.update(SUITES[suite](images_path, options))
+
+    document = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'images': options.images or 'synthetic, {} slices'.format(options.slices),
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, options.tolerance, options.min_delta)
+        for name, before, after in regressions:
+            print('REGRESSION {}: {:.4f}s -> {:.4f}s'.format(name, before, after))
+        if regressions:
+            return 1
+        print('No regression against {} (tolerance {:.0%})'.format(options.baseline, options.tolerance))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
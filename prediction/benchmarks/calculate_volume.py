@@ -0,0 +1,68 @@
+"""
+    prediction.benchmarks.calculate_volume
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares labeling the whole mask with labeling around the centroids, on a
+    synthetic mask holding a few nodules and thousands of spurious components::
+
+        python -m benchmarks.calculate_volume
+"""
+import os
+import tempfile
+
+import numpy as np
+import scipy.ndimage
+
+from benchmarks import measure, report
+from src.algorithms.segment.src import components
+from src.algorithms.segment.trained_model import calculate_volume
+
+
+def label_whole_mask(segment_path, centroids):
+    """The former calculate_volume: label the whole mask and count every component."""
+    mask = np.load(segment_path)
+    mask, _ = scipy.ndimage.label(mask)
+    labels = [mask[centroid['x'], centroid['y'], centroid['z']] for centroid in centroids]
+    volumes = np.bincount(mask.flatten())
+    return volumes[labels].tolist()
+
+
+def synthetic_mask(shape=(512, 512, 300), nodules=10, spurious=5000, radius=10):
+    random = np.random.RandomState(0)
+    mask = np.zeros(shape, dtype=np.bool_)
+    mask[tuple(random.randint(0, size, spurious) for size in shape)] = True
+
+    centroids = []
+    x, y, z = np.ogrid[-radius:radius + 1, -radius:radius + 1, -radius:radius + 1]
+    ball = x * x + y * y + z * z <= radius * radius
+    for center in np.stack([random.randint(radius, size - radius - 1, nodules) for size in shape], axis=1):
+        box = tuple(slice(c - radius, c + radius + 1) for c in center)
+        mask[box] |= ball
+        centroids.append({'x': int(center[0]), 'y': int(center[1]), 'z': int(center[2])})
+    return mask, centroids
+
+
+def run(spurious=(1000, 5000, 20000)):
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        for count in spurious:
+            mask, centroids = synthetic_mask(spurious=count)
+            segment_path = os.path.join(path, 'mask-{}.npy'.format(count))
+            np.save(segment_path, mask)
+
+            def cold():
+                components._mask_components.cache_clear()
+                return calculate_volume(segment_path, centroids)
+
+            assert cold() == label_whole_mask(segment_path, centroids)
+            for name, func in [('label whole mask', lambda: label_whole_mask(segment_path, centroids)),
+                               ('calculate_volume, cold', cold),
+                               ('calculate_volume, cached', lambda: calculate_volume(segment_path, centroids))]:
+                key = '{}[spurious={}]'.format(name, count)
+                results[key] = measure(func, repeat=3)
+                report(key, results[key])
+    return results
+
+
+if __name__ == '__main__':
+    run()
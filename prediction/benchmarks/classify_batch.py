@@ -0,0 +1,78 @@
+"""
+    prediction.benchmarks.classify_batch
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares classifying a number of studies with one `/classify/predict/`
+    request each against a single `/classify/predict/batch/` request, end to
+    end through the Flask test client::
+
+        python -m benchmarks.classify_batch [path/to/images] [path/to/model.h5] [studies]
+
+    The studies cycle through the series of the images folder. The volume
+    cache is cleared before each timing run, so that both of them decode
+    every series once.
+"""
+import json
+import os
+import sys
+from glob import glob
+
+import numpy as np
+
+from benchmarks import measure, report
+from src.factory import create_app
+from src.preprocess.load_dicom import volume_cache
+
+IMAGES_PATH = '../images'
+MODEL_PATH = '../classify_models/model.h5'
+
+
+def run(images_path=IMAGES_PATH, model_path=MODEL_PATH, studies=100, centroids=4, repeat=3):
+    client = create_app(config_mode='Test').test_client()
+    series = sorted(glob(os.path.join(images_path, '*', '*', '*')))
+    random = np.random.RandomState(0)
+    payloads = []
+    for i in range(int(studies)):
+        payloads.append({
+            'dicom_path': series[i % len(series)],
+            'centroids': [{'x': int(x), 'y': int(y), 'z': int(z)}
+                          for x, y, z in zip(random.randint(0, 512, centroids), random.randint(0, 512, centroids),
+                                             random.randint(0, 10, centroids))],
+            'model_path': model_path,
+        })
+
+    def post(path, payload):
+        response = client.post(path, data=json.dumps(payload), content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(response.get_data(as_text=True))
+        return json.loads(response.get_data(as_text=True))
+
+    def single():
+        volume_cache.clear()
+        for payload in payloads:
+            post('/classify/predict/', payload)
+
+    def batch():
+        volume_cache.clear()
+        for item in post('/classify/predict/batch/', payloads):
+            if item['status'] != 200:
+                raise RuntimeError(item['error'])
+
+    # loads the model
+    post('/classify/predict/', payloads[0])
+
+    name = 'classify {} studies[centroids={}]'.format(len(payloads), centroids)
+    results = {
+        name + ', single': measure(single, repeat=repeat),
+        name + ', batch': measure(batch, repeat=repeat),
+    }
+    for key, timing in results.items():
+        report(key, timing)
+    print('{:<60} {:.1f} studies/s single, {:.1f} studies/s batch, {:.2f}x'.format(
+        name, len(payloads) / results[name + ', single']['best'], len(payloads) / results[name + ', batch']['best'],
+        results[name + ', single']['best'] / results[name + ', batch']['best']))
+    return results
+
+
+if __name__ == '__main__':
+    run(*sys.argv[1:])
@@ -0,0 +1,48 @@
+"""
+    prediction.benchmarks.classify_predict
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Times `/classify/predict/` end to end through the Flask test client, with
+    the series and the model cached after the first request::
+
+        python -m benchmarks.classify_predict [path/to/images] [path/to/model.h5]
+"""
+import json
+import os
+import sys
+from glob import glob
+
+import numpy as np
+
+from benchmarks import measure, report
+from src.factory import create_app
+
+IMAGES_PATH = '../images'
+MODEL_PATH = '../classify_models/model.h5'
+
+
+def run(images_path=IMAGES_PATH, model_path=MODEL_PATH, counts=(1, 32)):
+    client = create_app(config_mode='Test').test_client()
+    random = np.random.RandomState(0)
+    results = {}
+    for dicom_path in sorted(glob(os.path.join(images_path, '*', '*', '*'))):
+        for count in counts:
+            centroids = [{'x': int(x), 'y': int(y), 'z': int(z)}
+                         for x, y, z in zip(random.randint(0, 512, count), random.randint(0, 512, count),
+                                            random.randint(0, 10, count))]
+            payload = json.dumps({'dicom_path': dicom_path, 'centroids': centroids, 'model_path': model_path})
+
+            def predict():
+                response = client.post('/classify/predict/', data=payload, content_type='application/json')
+                if response.status_code != 200:
+                    raise RuntimeError(response.get_data(as_text=True))
+
+            predict()
+            key = 'POST /classify/predict/[{}, centroids={}]'.format(dicom_path.split(os.sep)[-3], count)
+            results[key] = measure(predict)
+            report(key, results[key])
+    return results
+
+
+if __name__ == '__main__':
+    run(*sys.argv[1:])
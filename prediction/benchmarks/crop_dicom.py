@@ -0,0 +1,38 @@
+"""
+    prediction.benchmarks.crop_dicom
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Times cropping a 64x64 region of the middle quarter of the slices of each
+    series, and saving it::
+
+        python -m benchmarks.crop_dicom [path/to/images]
+"""
+import os
+import sys
+import tempfile
+from glob import glob
+
+from benchmarks import measure, report
+from src.preprocess.crop_dicom import crop_dicom
+from src.preprocess.load_dicom import load_geometry
+
+IMAGES_PATH = '../images'
+
+
+def run(images_path=IMAGES_PATH):
+    results = {}
+    for dicom_path in sorted(glob(os.path.join(images_path, '*', '*', '*'))):
+        locations = sorted(load_geometry(dicom_path).slice_locations)
+        quarter = len(locations) // 4
+        begin = [100, 100, locations[-1 - quarter]]
+        end = [164, 164, locations[quarter]]
+
+        with tempfile.TemporaryDirectory() as output:
+            key = 'crop_dicom[{}]'.format(dicom_path.split(os.sep)[-3])
+            results[key] = measure(lambda: crop_dicom(dicom_path, begin, end, output), repeat=3)
+            report(key, results[key])
+    return results
+
+
+if __name__ == '__main__':
+    run(*sys.argv[1:])
@@ -0,0 +1,49 @@
+"""
+    prediction.benchmarks.load_dicom
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Times the loading of each series, decoded from its dcm-files without and
+    with the preprocessing of the classification, and taken from the volume
+    cache::
+
+        python -m benchmarks.load_dicom [path/to/images]
+"""
+import os
+import sys
+from glob import glob
+
+import numpy as np
+
+from benchmarks import measure, report
+from src.preprocess.load_dicom import load_dicom, volume_cache
+from src.preprocess.preprocess_dicom import Params, PreprocessDicom
+
+IMAGES_PATH = '../images'
+
+
+def run(images_path=IMAGES_PATH):
+    preprocesses = [
+        ('raw', None),
+        ('clip+normalize', PreprocessDicom(Params(clip_lower=-1000, clip_upper=400, min_max_normalize=True,
+                                                  dtype=np.float32))),
+        ('clip+resample', PreprocessDicom(Params(clip_lower=-1000, clip_upper=400, voxel_shape=1.,
+                                                 dtype=np.float32, interpolation_order=1))),
+    ]
+    results = {}
+    for dicom_path in sorted(glob(os.path.join(images_path, '*', '*', '*'))):
+        patient = dicom_path.split(os.sep)[-3]
+        for name, preprocess in preprocesses:
+            key = 'load_dicom[{}, {}]'.format(patient, name)
+            results[key] = measure(lambda: load_dicom(dicom_path, preprocess, use_cache=False), repeat=3)
+            report(key, results[key])
+
+        volume_cache.clear()
+        load_dicom(dicom_path)
+        key = 'load_dicom[{}, cached]'.format(patient)
+        results[key] = measure(lambda: load_dicom(dicom_path))
+        report(key, results[key])
+    return results
+
+
+if __name__ == '__main__':
+    run(*sys.argv[1:])
@@ -0,0 +1,47 @@
+"""
+    prediction.benchmarks.load_volume
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares decoding the dcm-files of a series with memory-mapping the volume
+    exported from them, followed by the extraction of a few LR3DCNN patches::
+
+        python -m benchmarks.load_volume [path/to/images]
+"""
+import os
+import sys
+import tempfile
+from glob import glob
+
+from benchmarks import measure, report
+from src.algorithms.classify.src.preprocess_patch import preprocess_LR3DCNN
+from src.preprocess.load_dicom import export_volume, load_dicom
+
+IMAGES_PATH = '../images'
+
+
+def run(images_path=IMAGES_PATH):
+    results = {}
+    with tempfile.TemporaryDirectory() as volumes_path:
+        for dicom_path in sorted(glob(os.path.join(images_path, '*', '*', '*'))):
+            patient = dicom_path.split(os.sep)[-3]
+            volume_path = os.path.join(volumes_path, patient)
+            export_volume(dicom_path, volume_path)
+
+            for source, path, use_cache in [('dcm', dicom_path, False), ('volume', volume_path, True)]:
+                def load():
+                    return load_dicom(path, use_cache=use_cache)
+
+                def load_patches():
+                    dicom_array = load()
+                    centroid = {name: size // 2 for name, size in zip('xyz', dicom_array.shape)}
+                    return preprocess_LR3DCNN(dicom_array, [centroid])
+
+                for name, func in [('load_dicom', load), ('load_dicom + preprocess_LR3DCNN', load_patches)]:
+                    name = '{}[{}, {}]'.format(name, patient, source)
+                    results[name] = measure(func)
+                    report(name, results[name])
+    return results
+
+
+if __name__ == '__main__':
+    run(*sys.argv[1:])
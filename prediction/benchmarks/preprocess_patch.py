@@ -0,0 +1,43 @@
+"""
+    prediction.benchmarks.preprocess_patch
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the vectorized LR3DCNN patch extraction with a loop over the
+    centroids on a synthetic volume::
+
+        python -m benchmarks.preprocess_patch
+"""
+import numpy as np
+
+from benchmarks import measure, report
+from src.algorithms.classify.src.preprocess_patch import LR3DCNN_HALF_SHAPES, preprocess_LR3DCNN
+
+
+def loop_LR3DCNN(dicom_array, centroids):
+    """Slice the patches centroid by centroid and stack them afterwards."""
+    inputs = [[], [], []]
+    for centroid in centroids:
+        for i, (sx, sy, sz) in enumerate(LR3DCNN_HALF_SHAPES):
+            inputs[i].append(dicom_array[centroid['x'] - sx:centroid['x'] + sx,
+                                         centroid['y'] - sy:centroid['y'] + sy,
+                                         centroid['z'] - sz:centroid['z'] + sz])
+    return [np.expand_dims(np.asarray(patches), -1) for patches in inputs]
+
+
+def run(shape=(512, 512, 300), counts=(10, 100, 1000)):
+    random = np.random.RandomState(0)
+    dicom_array = random.randint(-1000, 400, size=shape).astype(np.float32)
+    results = {}
+    for count in counts:
+        # keep the centroids off the border, so that the loop builds full patches
+        coords = np.stack([random.randint(21, size - 21, size=count) for size in shape], axis=1)
+        centroids = [{'x': x, 'y': y, 'z': z} for x, y, z in coords]
+        for name, func in [('loop', loop_LR3DCNN), ('vectorized', preprocess_LR3DCNN)]:
+            key = 'preprocess_LR3DCNN[{}, centroids={}]'.format(name, count)
+            results[key] = measure(lambda: func(dicom_array, centroids), repeat=3)
+            report(key, results[key])
+    return results
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,31 @@
+"""
+    prediction.benchmarks.read_dicom
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares serial and threaded decoding of the dcm-files of a series::
+
+        python -m benchmarks.read_dicom [path/to/images]
+"""
+import os
+import sys
+from glob import glob
+
+from benchmarks import measure, report
+from src.preprocess.load_dicom import read_dicom_files
+
+IMAGES_PATH = '../images'
+
+
+def run(images_path=IMAGES_PATH, workers=(1, 2, 4, 8)):
+    results = {}
+    for dicom_path in sorted(glob(os.path.join(images_path, '*', '*', '*'))):
+        file_pattern = os.path.join(dicom_path, '*.dcm')
+        for n in workers:
+            name = 'read_dicom_files[{}, workers={}]'.format(dicom_path.split(os.sep)[-3], n)
+            results[name] = measure(lambda n=n: read_dicom_files(file_pattern, workers=n))
+            report(name, results[name])
+    return results
+
+
+if __name__ == '__main__':
+    run(*sys.argv[1:])
@@ -0,0 +1,33 @@
+"""
+    prediction.benchmarks.resample
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares scipy.ndimage.zoom with the slab-parallel resampler on a
+    synthetic CT volume, rescaled from 0.7 x 0.7 x 2.5 mm voxels to 1 mm::
+
+        python -m benchmarks.resample
+"""
+import numpy as np
+import scipy.ndimage
+
+from benchmarks import measure, report
+from src.preprocess import resample
+
+
+def run(shape=(512, 512, 400), zoom_factors=(0.7, 0.7, 2.5), orders=(0, 1, 3), workers=(1, 2, 4, 8)):
+    random = np.random.RandomState(0)
+    volume = random.randint(-1000, 400, size=shape).astype(np.float32)
+    results = {}
+    for order in orders:
+        key = 'scipy.ndimage.zoom[order={}]'.format(order)
+        results[key] = measure(lambda: scipy.ndimage.interpolation.zoom(volume, zoom_factors, order=order), repeat=1)
+        report(key, results[key])
+        for count in workers:
+            key = 'resample.zoom[order={}, workers={}]'.format(order, count)
+            results[key] = measure(lambda: resample.zoom(volume, zoom_factors, order=order, workers=count), repeat=1)
+            report(key, results[key])
+    return results
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,85 @@
+"""
+    prediction.benchmarks.synthetic
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Writes synthetic CT series, so that the benchmarks do not depend on the
+    LIDC-IDRI images being available.
+"""
+import os
+
+import numpy as np
+from dicom.dataset import Dataset, FileDataset
+
+PATIENT = 'SYNTHETIC-0001'
+STUDY_UID = '1.2.826.0.1.3680043.2.1125.1'
+SERIES_UID = '1.2.826.0.1.3680043.2.1125.1.1'
+
+
+def write_series(path, slices=64, rows=512, columns=512, pixel_spacing=0.703125, slice_thickness=2.5, seed=0):
+    """Write a series of CT slices filled with random intensities.
+
+    Args:
+        path (str): the folder the dcm-files are written to.
+        slices (int): the number of slices.
+        rows (int): the number of rows of a slice.
+        columns (int): the number of columns of a slice.
+        pixel_spacing (float): the size of a pixel in mm.
+        slice_thickness (float): the distance between the slices in mm.
+        seed (int): the seed of the random intensities.
+
+    Returns:
+        str: `path`
+    """
+    os.makedirs(path, exist_ok=True)
+    random = np.random.RandomState(seed)
+
+    for i in range(slices):
+        location = -slice_thickness * i
+        file_name = os.path.join(path, '{:04d}.dcm'.format(i))
+
+        meta = Dataset()
+        meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+        meta.MediaStorageSOPInstanceUID = '{}.{}'.format(SERIES_UID, i)
+        meta.TransferSyntaxUID = '1.2.840.10008.1.2'
+        meta.ImplementationClassUID = '1.2.826.0.1.3680043.2.1125'
+
+        dataset = FileDataset(file_name, {}, file_meta=meta, preamble=b'\0' * 128)
+        dataset.is_little_endian = True
+        dataset.is_implicit_VR = True
+        dataset.PatientID = PATIENT
+        dataset.StudyInstanceUID = STUDY_UID
+        dataset.SeriesInstanceUID = SERIES_UID
+        dataset.SOPInstanceUID = '{}.{}'.format(SERIES_UID, i)
+        dataset.Modality = 'CT'
+        dataset.SliceLocation = '{:f}'.format(location)
+        dataset.ImagePositionPatient = ['-180.0', '-180.0', '{:f}'.format(location)]
+        dataset.ImageOrientationPatient = ['1', '0', '0', '0', '1', '0']
+        dataset.PixelSpacing = ['{:f}'.format(pixel_spacing)] * 2
+        dataset.SliceThickness = '{:f}'.format(slice_thickness)
+        dataset.Rows = rows
+        dataset.Columns = columns
+        dataset.SamplesPerPixel = 1
+        dataset.PhotometricInterpretation = 'MONOCHROME2'
+        dataset.BitsAllocated = 16
+        dataset.BitsStored = 16
+        dataset.HighBit = 15
+        dataset.PixelRepresentation = 1
+        dataset.RescaleIntercept = '-1024'
+        dataset.RescaleSlope = '1'
+        dataset.PixelData = random.randint(0, 2000, size=(rows, columns)).astype(np.int16).tobytes()
+        dataset.save_as(file_name)
+
+    return path
+
+
+def write_images(images_path, **kwargs):
+    """Write a synthetic series in the patient/study/series layout of the images folder.
+
+    Args:
+        images_path (str): the images folder.
+        kwargs: passed on to `write_series`.
+
+    Returns:
+        str: the folder of the series.
+    """
+    return write_series(os.path.join(images_path, PATIENT, STUDY_UID, SERIES_UID), **kwargs)
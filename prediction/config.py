@@ -4,13 +4,68 @@
 
     Provides the flask config options
 """
-from os import getenv
+import tempfile
+from os import getenv, path
 
 
 class Config(object):
     PROD_SERVER = getenv('PRODUCTION', False)
     DEBUG = False
 
+    # Number of deserialized models each worker keeps in memory
+    MODEL_REGISTRY_SIZE = int(getenv('MODEL_REGISTRY_SIZE', 2))
+
+    # Colon separated model paths loaded when the app is created instead of
+    # on the first request that needs them
+    WARM_UP_MODELS = [model_path for model_path in getenv('WARM_UP_MODELS', '').split(':') if model_path]
+
+    # The classify model of the pipeline endpoint when the request does not
+    # name one
+    CLASSIFY_MODEL_PATH = getenv('CLASSIFY_MODEL_PATH', path.join(path.pardir, 'classify_models', 'model.h5'))
+
+    # Set by gunicorn_config.py, which loads the app in a master process and
+    # forks the workers from it. The WARM_UP_MODELS are then loaded by each
+    # worker once it is forked, as TensorFlow sessions do not survive a fork.
+    PRELOAD_APP = bool(getenv('PRELOAD_APP', ''))
+
+    # Number of threads decoding the dcm-files of a series concurrently
+    DICOM_READ_WORKERS = int(getenv('DICOM_READ_WORKERS', 4))
+
+    # Number of threads resampling a series to another voxel shape, 0 for one per CPU
+    RESAMPLE_WORKERS = int(getenv('RESAMPLE_WORKERS', 0))
+
+    # Memory budget in MB for the decoded series each worker keeps in memory
+    VOLUME_CACHE_SIZE = int(getenv('VOLUME_CACHE_SIZE', 1024))
+
+    # If set, decoded series are also stored in this folder and memory-mapped
+    # by any worker that requests them again
+    VOLUME_CACHE_DIR = getenv('VOLUME_CACHE_DIR')
+
+    # Disk budget in MB for the series in VOLUME_CACHE_DIR, shared by all the
+    # workers. The least recently used ones are removed beyond it
+    VOLUME_CACHE_DISK_SIZE = int(getenv('VOLUME_CACHE_DISK_SIZE', 10240))
+
+    # SQLite database holding the background prediction jobs, shared by the
+    # worker processes of the service
+    JOBS_DATABASE = getenv('JOBS_DATABASE', path.join(tempfile.gettempdir(), 'prediction-jobs.sqlite3'))
+
+    # Number of background jobs each worker runs at the same time, and
+    # accepts before it turns new jobs down
+    JOB_WORKERS = int(getenv('JOB_WORKERS', 2))
+    JOB_QUEUE_SIZE = int(getenv('JOB_QUEUE_SIZE', 100))
+
+    # The pipeline endpoint only classifies the candidates of identify with at
+    # least this p_nodule, and only segments those with at least this
+    # p_concerning
+    PIPELINE_NODULE_THRESHOLD = float(getenv('PIPELINE_NODULE_THRESHOLD', 0.5))
+    PIPELINE_CONCERNING_THRESHOLD = float(getenv('PIPELINE_CONCERNING_THRESHOLD', 0.5))
+
+    # Responses of at least this many bytes are gzip compressed for the
+    # clients accepting it, and gzip compressed request bodies are accepted
+    # up to MAX_REQUEST_SIZE MB once decompressed
+    GZIP_MIN_SIZE = int(getenv('GZIP_MIN_SIZE', 1024))
+    MAX_REQUEST_SIZE = int(getenv('MAX_REQUEST_SIZE', 64))
+
 
 class Production(Config):
     pass
@@ -22,3 +77,4 @@ class Development(Config):
 
 class Test(Config):
     DEBUG = True
+    JOBS_DATABASE = ':memory:'
@@ -0,0 +1,64 @@
+"""
+    prediction.gunicorn_config
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Settings of the production server. The app, Keras and TensorFlow are
+    imported once in the master process, and every worker forked from it
+    shares those pages copy-on-write and only loads its WARM_UP_MODELS::
+
+        gunicorn -c gunicorn_config.py src.factory:app
+
+    A worker answers GET /ready/ with the status 200 once its models are
+    loaded, and with 503 until then.
+
+    Caveat: nothing may create a TensorFlow session in the master, e.g. by
+    loading a model when the app is created, as the workers would block
+    forever on the first prediction. PRELOAD_APP defers the warm up of
+    create_app to the post_fork hook below.
+"""
+import os
+import threading
+import time
+
+# Read by config.py when the app is preloaded
+os.environ['PRELOAD_APP'] = '1'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+preload_app = True
+
+_started = time.time()
+
+
+def _memory(usage):
+    return 'RSS {rss:.0f} MB, {private:.0f} MB private'.format(**usage) if usage['rss'] is not None else 'RSS unknown'
+
+
+def when_ready(server):
+    from src.preload import import_stack, memory_usage
+
+    seconds = import_stack()
+    server.log.info('Imported Keras and TensorFlow in %.1fs, the master is ready after %.1fs (%s)',
+                    seconds, time.time() - _started, _memory(memory_usage()))
+
+
+def post_fork(server, worker):
+    from src.preload import memory_usage
+
+    warm_up = server.app.wsgi().extensions['warm_up']
+
+    def run():
+        start = time.time()
+        warm_up.start()
+        status = warm_up.status()
+        if status['error']:
+            worker.log.error('Worker %s could not warm up: %s', worker.pid, status['error'])
+        else:
+            worker.log.info('Worker %s loaded %d models in %.1fs (%s)', worker.pid, len(status['models']),
+                            time.time() - start, _memory(memory_usage()))
+
+    # The thread is started before the worker is set up, so that it is a real
+    # thread even in a gevent worker, which answers the readiness probes while
+    # the models load.
+    threading.Thread(target=run, name='warm-up', daemon=True).start()
@@ -0,0 +1,3 @@
+from . import trained_model
+
+__all__ = [trained_model]
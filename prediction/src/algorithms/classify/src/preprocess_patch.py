@@ -8,9 +8,99 @@
 
 import numpy as np
 import keras.backend as K
+from numpy.lib.stride_tricks import as_strided
+from src.instrumentation import span
 
 
-def preprocess_patch_LR3DCNN(dicom_array, centroid):
+# Half of the patch size along each axis, for each of the three LR3DCNN inputs
+LR3DCNN_HALF_SHAPES = [(12, 21, 21),
+                       (21, 12, 21),
+                       (21, 21, 12)]
+
+
+def centroids_to_array(centroids):
+    """Convert centroids to an array of voxel indices.
+
+    Args:
+        centroids (list(dict)): A list of centroids of the form::
+            {'x': int,
+             'y': int,
+             'z': int}
+            or a structured array with the fields `x`, `y` and `z`.
+
+    Returns:
+        ndarray: An integer array of shape (len(centroids), 3)
+    """
+    if isinstance(centroids, np.ndarray):
+        return np.stack([centroids['x'], centroids['y'], centroids['z']], axis=1).astype(np.intp).reshape(-1, 3)
+    return np.array([[centroid['x'], centroid['y'], centroid['z']] for centroid in centroids],
+                    dtype=np.intp).reshape(-1, 3)
+
+
+def check_centroids(dicom_array, coords):
+    """Raise a ValueError if one of the centroids lies outside of the volume."""
+    if ((coords < 0) | (coords >= np.asarray(dicom_array.shape))).any():
+        raise ValueError('The centroids should lie inside the volume of shape {}'.format(dicom_array.shape))
+
+
+def crosses_border(dicom_array, coords, half_shape):
+    """Return whether the patch around one of the centroids crosses the border of the volume."""
+    return bool(len(coords)) and not ((coords - half_shape >= 0) & (coords + half_shape <= dicom_array.shape)).all()
+
+
+def extract_patches(dicom_array, coords, half_shape, pad_value=None):
+    """Extract the patches around all the centroids at once.
+
+    A sliding window view over the volume is indexed with the corners of the
+    patches lying inside of it, so that they are gathered into a single batch
+    array. The few patches crossing the border are filled with `pad_value`
+    and the part of the volume they overlap, so that the volume is never
+    copied.
+
+    Args:
+        dicom_array (ndarray): numpy-array containing the 3D-representation
+            of the DICOM-series
+        coords (ndarray): An integer array of shape (N, 3) of the centroids
+        half_shape (sequence[int]): Half of the patch size along each axis
+        pad_value (int | float): The value of the voxels of the patches outside
+            of the volume. Defaults to the minimum of the volume.
+
+    Returns:
+        ndarray: An array of shape (N, 2 * half_shape[0], 2 * half_shape[1], 2 * half_shape[2])
+    """
+    shape = np.asarray(dicom_array.shape)
+    half_shape = np.asarray(half_shape)
+    size = 2 * half_shape
+    lower = coords - half_shape
+    upper = coords + half_shape
+    inside = ((lower >= 0) & (upper <= shape)).all(axis=1)
+
+    if inside.any():
+        windows = as_strided(dicom_array,
+                             shape=tuple(shape - size + 1) + tuple(size),
+                             strides=dicom_array.strides * 2,
+                             writeable=False)
+        corners = lower[inside]
+        if inside.all():
+            return windows[corners[:, 0], corners[:, 1], corners[:, 2]]
+
+    patches = np.empty((len(coords), ) + tuple(size), dtype=dicom_array.dtype)
+    if inside.any():
+        patches[inside] = windows[corners[:, 0], corners[:, 1], corners[:, 2]]
+
+    if pad_value is None:
+        pad_value = dicom_array.min()
+    for i in np.flatnonzero(~inside):
+        start = np.maximum(lower[i], 0)
+        stop = np.minimum(upper[i], shape)
+        offset = start - lower[i]
+        patches[i].fill(pad_value)
+        patches[i][tuple(slice(a, b) for a, b in zip(offset, offset + stop - start))] = \
+            dicom_array[tuple(slice(a, b) for a, b in zip(start, stop))]
+    return patches
+
+
+def preprocess_patch_LR3DCNN(dicom_array, centroid, pad_value=None):
     """Patch preprocessing function for LR3DCNN architecture.
 
     Args:
@@ -20,24 +110,18 @@ def preprocess_patch_LR3DCNN(dicom_array, centroid):
             {'x': int,
              'y': int,
              'z': int}
+        pad_value (int | float): The value of the voxels of patches crossing
+            the border of the volume. Defaults to the minimum of the volume.
 
     Returns:
         list[ndarray, ndarray, ndarray]
 
     """
-    in_shapes = [(12, 21, 21),
-                 (21, 12, 21),
-                 (21, 21, 12)]
-
-    in_patch = [dicom_array[centroid['x'] - in_shape[0]: centroid['x'] + in_shape[0],
-                centroid['y'] - in_shape[1]: centroid['y'] + in_shape[1],
-                centroid['z'] - in_shape[2]: centroid['z'] + in_shape[2]]
-                for i, in_shape in enumerate(in_shapes)]
-
-    return in_patch
+    return [patches[0] for patches in _LR3DCNN_patches(dicom_array, centroids_to_array([centroid]), pad_value)]
 
 
-def preprocess_LR3DCNN(dicom_array, centroids):
+@span('classify.preprocess_patch')
+def preprocess_LR3DCNN(dicom_array, centroids, pad_value=None):
     """Peprocess function for LR3DCNN architecture.
 
     Args:
@@ -47,24 +131,26 @@ def preprocess_LR3DCNN(dicom_array, centroids):
             {'x': int,
              'y': int,
              'z': int}
+        pad_value (int | float): The value of the voxels of patches crossing
+            the border of the volume. Defaults to the minimum of the volume.
 
     Returns:
         list[ndarray, ndarray, ndarray]
 
     """
-    LR3DCNN_input = [[], [], []]
-    for centroid in centroids:
-        patch = preprocess_patch_LR3DCNN(dicom_array, centroid)
-        for i in range(len(LR3DCNN_input)):
-            LR3DCNN_input[i].append(patch[i])
-
     if K.image_data_format() == 'channels_last':
         channel_axis = -1
     else:
         channel_axis = 1
 
-    for i in range(len(LR3DCNN_input)):
-        LR3DCNN_input[i] = np.asarray(LR3DCNN_input[i])
-        LR3DCNN_input[i] = np.expand_dims(LR3DCNN_input[i], channel_axis)
+    return [np.expand_dims(patches, channel_axis)
+            for patches in _LR3DCNN_patches(dicom_array, centroids_to_array(centroids), pad_value)]
+
+
+def _LR3DCNN_patches(dicom_array, coords, pad_value):
+    check_centroids(dicom_array, coords)
+    # The minimum of the volume is only computed once, if any patch needs it
+    if pad_value is None and crosses_border(dicom_array, coords, np.max(LR3DCNN_HALF_SHAPES, axis=0)):
+        pad_value = dicom_array.min()
 
-    return LR3DCNN_input
+    return [extract_patches(dicom_array, coords, half_shape, pad_value) for half_shape in LR3DCNN_HALF_SHAPES]
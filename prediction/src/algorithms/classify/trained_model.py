@@ -7,22 +7,35 @@
     for if nodules are concerning or not.
 """
 
+from collections import OrderedDict
+
 import numpy as np
-import keras.models
+from src.algorithms.model_registry import registry
+from src.instrumentation import span
 from src.preprocess import load_dicom
 
 
+# Number of centroids whose patches are evaluated in one call of the model
+DEFAULT_BATCH_SIZE = 64
+
+
+@span('classify.predict')
 def predict(dicom_path, centroids, model_path=None,
-            preprocess_dicom=None, preprocess_model_input=None):
+            preprocess_dicom=None, preprocess_model_input=None,
+            batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=None):
     """ Predicts if centroids are concerning or not.
 
     Given path to a DICOM image and an iterator of centroids:
-        (1) load the classification model from its serialized state
+        (1) load the classification model from its serialized state, or take
+            it from the model registry if this worker already loaded it
         (2) pre-process the dicom into whatever format the classification
             model expects
         (3) for each centroid (which represents a nodule), yield a probability
             that the nodule is concerning
 
+    The patches are built and evaluated in mini-batches of `batch_size`
+    centroids, so that memory does not grow with the number of centroids.
+
     Args:
         dicom_path (str): A path to the DICOM image
         centroids (list[dict]): A list of centroids of the form::
@@ -33,7 +46,14 @@ def predict(dicom_path, centroids, model_path=None,
         process_dicom (preprocess.preprocess_dicom.PreprocessDicom): A preprocess
             method which aimed at brining the input data to the desired view.
         preprocess_model_input (callable[ndarray, list[dict]]): preprocess for a model
-            input.
+            input. Defaults to the patches of the LR3DCNN architecture.
+        batch_size (int): The number of centroids evaluated at once.
+        max_batch_bytes (int): If set, `batch_size` is lowered so that the
+            patches of a mini-batch take at most `max_batch_bytes` bytes.
+
+    The centroids may also be a structured array with the fields `x`, `y`
+    and `z`, which is then returned with a `p_concerning` field added, instead
+    of a list of dicts.
 
     Returns:
         list[dict]: a list of centroids with the probability they are
@@ -46,13 +66,245 @@ def predict(dicom_path, centroids, model_path=None,
     if not len(centroids) or model_path is None:
         return []
 
-    model = keras.models.load_model(model_path)
+    centroids = with_probability(centroids)
+
+    for _ in iter_predict(dicom_path, centroids, model_path, preprocess_dicom, preprocess_model_input,
+                          batch_size, max_batch_bytes):
+        pass
+
+    return centroids
+
+
+def iter_predict(dicom_path, centroids, model_path=None,
+                 preprocess_dicom=None, preprocess_model_input=None,
+                 batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=None):
+    """ Generator version of `predict`, yielding each centroid as soon as the
+    mini-batch it belongs to has been evaluated.
+
+    Takes the same arguments as `predict`.
+
+    Yields:
+        dict: a centroid with the probability it is concerning of the form::
+            {'x': int,
+             'y': int,
+             'z': int,
+             'p_concerning': float}
+    """
+    if not len(centroids) or model_path is None:
+        return
+
+    centroids = with_probability(centroids)
+    model = registry.get(model_path)
+    preprocess_model_input = _default_model_input(preprocess_model_input)
 
     dicom_array = load_dicom.load_dicom(dicom_path, preprocess_dicom)
-    patches = preprocess_model_input(dicom_array, centroids)
+    batch_size = _batch_size(dicom_array, centroids, preprocess_model_input, batch_size, max_batch_bytes)
+
+    for start in range(0, len(centroids), batch_size):
+        batch = centroids[start:start + batch_size]
+        patches = preprocess_model_input(dicom_array, batch)
+
+        with span('classify.inference'):
+            predictions = model.predict(patches)
+        predictions = predictions.astype(np.float)
+
+        for centroid in _annotate(batch, predictions):
+            yield centroid
+
+
+@span('classify.predict_batch')
+def predict_batch(payloads, batch_size=DEFAULT_BATCH_SIZE):
+    """ Predicts if the centroids of several DICOM images are concerning or not.
+
+    The centroids of all the payloads using the same model are evaluated
+    together in mini-batches of `batch_size` centroids, instead of calling the
+    model once per DICOM image.
+
+    Args:
+        payloads (list[dict]): The keyword arguments of `predict` for each
+            DICOM image.
+        batch_size (int): The number of centroids evaluated at once.
+
+    Returns:
+        list[list[dict] | Exception]: for each payload, the centroids with the
+        probability they are concerning as returned by `predict`, or the
+        exception raised while processing the payload.
+    """
+    return list(iter_predict_batch(payloads, batch_size))
+
+
+def iter_predict_batch(payloads, batch_size=DEFAULT_BATCH_SIZE):
+    """ Generator version of `predict_batch`, yielding the result of each
+    payload, in order, as soon as all of its centroids have been evaluated.
+
+    The patches of a payload are built right after its DICOM image is loaded,
+    and the image is dropped before the next one is loaded. Only the patches
+    waiting for a full mini-batch are kept across payloads.
+
+    Takes the same arguments as `predict_batch`.
+
+    Yields:
+        list[dict] | Exception: the result of `predict` for each payload, or
+        the exception raised while processing it.
+    """
+    results = [None] * len(payloads)
+    remaining = [0] * len(payloads)
+    queues = OrderedDict()
+    done = 0
+
+    for i, payload in enumerate(payloads):
+        try:
+            model_path, centroids, patches = _prepare(**payload)
+        except Exception as e:
+            results[i] = e
+        else:
+            results[i] = centroids
+            if patches is not None:
+                remaining[i] = len(centroids)
+                queues.setdefault(model_path, []).append((i, centroids, patches))
+                _evaluate_queue(model_path, queues[model_path], batch_size, results, remaining)
+
+        while done <= i and not remaining[done]:
+            yield results[done]
+            results[done] = None
+            done += 1
+
+    for model_path, queue in queues.items():
+        _evaluate_queue(model_path, queue, batch_size, results, remaining, final=True)
+
+    for result in results[done:]:
+        yield result
+
+
+def _evaluate_queue(model_path, queue, batch_size, results, remaining, final=False):
+    """Evaluate the queued patches of a model in mini-batches of `batch_size`
+    centroids, spanning several payloads.
+
+    Args:
+        model_path (str): A path to the serialized model
+        queue (list[tuple]): For each payload waiting, its index, and the
+            centroids and patches that are not evaluated yet.
+        batch_size (int): The number of centroids evaluated at once.
+        results (list): The results of the payloads, set to the exception
+            raised while evaluating one of their mini-batches.
+        remaining (list[int]): The number of centroids of each payload that
+            are not evaluated yet.
+        final (bool): Also evaluate a last mini-batch that is not full.
+    """
+    while sum(len(item[1]) for item in queue) >= (1 if final else batch_size):
+        batch = _take(queue, batch_size)
+        try:
+            model = registry.get(model_path)
+            with span('classify.inference'):
+                predictions = model.predict(_concatenate([patches for _, _, patches in batch])).astype(np.float)
+        except Exception as e:
+            failed = set(index for index, _, _ in batch)
+            for index in failed:
+                results[index] = e
+                remaining[index] = 0
+            queue[:] = [item for item in queue if item[0] not in failed]
+            continue
+
+        offset = 0
+        for index, centroids, _ in batch:
+            _annotate(centroids, predictions[offset:offset + len(centroids)])
+            offset += len(centroids)
+            remaining[index] -= len(centroids)
+
+
+def _take(queue, size):
+    """Take the first `size` centroids, and their patches, off a queue."""
+    batch, count = [], 0
+    while queue and count < size:
+        index, centroids, patches = queue[0]
+        taken = min(size - count, len(centroids))
+        batch.append((index, centroids[:taken], _slice(patches, 0, taken)))
+        if taken == len(centroids):
+            queue.pop(0)
+        else:
+            queue[0] = (index, centroids[taken:], _slice(patches, taken, None))
+        count += taken
+    return batch
+
+
+def _prepare(dicom_path, centroids, model_path=None,
+             preprocess_dicom=None, preprocess_model_input=None,
+             batch_size=None, max_batch_bytes=None):
+    """Build the model input of a `predict` payload.
+
+    Returns:
+        tuple: the model path, the centroids, and their patches or None if
+        there is nothing to predict.
+    """
+    if not len(centroids) or model_path is None:
+        return model_path, [], None
+
+    centroids = with_probability(centroids)
+    dicom_array = load_dicom.load_dicom(dicom_path, preprocess_dicom)
+    return model_path, centroids, _default_model_input(preprocess_model_input)(dicom_array, centroids)
+
+
+def _default_model_input(preprocess_model_input):
+    if preprocess_model_input is not None:
+        return preprocess_model_input
+
+    # Imported here, as it loads keras
+    from src.algorithms.classify.src.preprocess_patch import preprocess_LR3DCNN
+    return preprocess_LR3DCNN
+
+
+def _batch_size(dicom_array, centroids, preprocess_model_input, batch_size, max_batch_bytes):
+    """Lower the batch size so that the patches of a mini-batch fit in `max_batch_bytes`."""
+    if max_batch_bytes is None:
+        return batch_size
+
+    patches = preprocess_model_input(dicom_array, centroids[:1])
+    if isinstance(patches, np.ndarray):
+        patches = [patches]
+    centroid_bytes = sum(patch.nbytes for patch in patches)
+
+    return max(1, min(batch_size, max_batch_bytes // centroid_bytes))
+
+
+def _slice(patches, start, stop):
+    """Slice the model input of several centroids along the batch axis."""
+    if isinstance(patches, np.ndarray):
+        return patches[start:stop]
+    return [inputs[start:stop] for inputs in patches]
+
+
+def _concatenate(patches):
+    """Concatenate the model inputs of several DICOM images along the batch axis."""
+    if isinstance(patches[0], np.ndarray):
+        return np.concatenate(patches)
+    return [np.concatenate(inputs) for inputs in zip(*patches)]
+
+
+def with_probability(centroids):
+    """Add the field `p_concerning` to a structured array of centroids.
+
+    Args:
+        centroids (list[dict] | ndarray): the centroids.
+
+    Returns:
+        list[dict] | ndarray: the list of dicts as it is, or a copy of the
+        structured array with the float32 field `p_concerning`.
+    """
+    if not isinstance(centroids, np.ndarray) or 'p_concerning' in centroids.dtype.names:
+        return centroids
+
+    annotated = np.zeros(len(centroids), dtype=centroids.dtype.descr + [('p_concerning', np.float32)])
+    for name in centroids.dtype.names:
+        annotated[name] = centroids[name]
+    return annotated
+
 
-    predictions = model.predict(patches)
-    predictions = predictions.astype(np.float)
+def _annotate(centroids, predictions):
+    # A slice of a structured array is annotated at once, the rows of a
+    # structured array are views that write through like the dicts
+    if isinstance(centroids, np.ndarray):
+        centroids['p_concerning'] = predictions[:, 0]
+        return centroids
 
     for i, centroid in enumerate(centroids):
         centroid['p_concerning'] = predictions[i, 0]
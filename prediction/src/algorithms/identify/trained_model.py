@@ -7,9 +7,11 @@
     for where the centroids of nodules are in the DICOM image.
 """
 
+from src.instrumentation import span
 from src.preprocess.load_dicom import load_dicom
 
 
+@span('identify.predict')
 def predict(dicom_path):
     """ Predicts centroids of nodules in a DICOM image.
 
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+    algorithms.model_registry
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    A process-wide registry of deserialized models, so that each worker loads
+    a given model file once instead of on every request.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.instrumentation import span
+
+
+def load_keras_model(model_path):
+    """Deserialize a Keras model and prepare it for concurrent inference.
+
+    Args:
+        model_path (str): A path to the serialized model
+
+    Returns:
+        keras.models.Model
+    """
+    import keras.models
+
+    model = keras.models.load_model(model_path)
+    # Build the predict function eagerly, otherwise it is lazily created on
+    # the first call, which is not safe when requests share the model.
+    model._make_predict_function()
+    return model
+
+
+class ModelRegistry(object):
+    """An LRU cache of deserialized models.
+
+    Models are keyed by the absolute path of the serialized file together with
+    its modification time and size, so a model that is replaced on disk is
+    transparently reloaded on the next request.
+
+    A model is loaded outside of the registry's lock, so that requests for the
+    models already loaded are not held up by it. Concurrent requests for the
+    same model wait for a single load.
+
+    Args:
+        max_models (int): The number of models kept in memory at once. The
+            least recently used model is evicted when the budget is exceeded.
+        loader (callable[str] -> object): Deserializes a model from a path.
+    """
+
+    def __init__(self, max_models=2, loader=load_keras_model):
+        if not isinstance(max_models, int) or max_models <= 0:
+            raise ValueError('The max_models should be a positive int')
+        self.max_models = max_models
+        self.loader = loader
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        # The lock of each model that is being loaded
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.
+
+    @staticmethod
+    def _key(model_path):
+        path = os.path.abspath(model_path)
+        stat = os.stat(path)
+        return path, stat.st_mtime, stat.st_size
+
+    def get(self, model_path):
+        """Return the model stored at `model_path`, loading it on a miss.
+
+        Args:
+            model_path (str): A path to the serialized model
+
+        Returns:
+            object: The deserialized model
+        """
+        key = self._key(model_path)
+
+        with self._lock:
+            if key in self._models:
+                self.hits += 1
+                self._models.move_to_end(key)
+                return self._models[key]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                # Loaded by another thread in the meantime
+                if key in self._models:
+                    self.hits += 1
+                    self._models.move_to_end(key)
+                    return self._models[key]
+                self.misses += 1
+
+            start = time.time()
+            try:
+                with span('model_registry.load'):
+                    model = self.loader(key[0])
+            except Exception:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+
+            with self._lock:
+                self.load_time += time.time() - start
+                self._loading.pop(key, None)
+                # Drop outdated versions of the same file
+                for stale in [k for k in self._models if k[0] == key[0]]:
+                    del self._models[stale]
+
+                self._models[key] = model
+                while len(self._models) > self.max_models:
+                    self._models.popitem(last=False)
+                    self.evictions += 1
+
+            return model
+
+    def warm_up(self, model_paths):
+        """Load every model in `model_paths` ahead of the first request.
+
+        Args:
+            model_paths (list[str]): Paths to the serialized models
+        """
+        for model_path in model_paths:
+            self.get(model_path)
+
+    def clear(self):
+        """Drop all the loaded models and reset the counters."""
+        with self._lock:
+            self._models.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.load_time = 0.
+
+    def stats(self):
+        """Return the registry counters.
+
+        Returns:
+            dict: A dictionary of the form::
+                {'hits': int,
+                 'misses': int,
+                 'evictions': int,
+                 'load_time': float,
+                 'models': list[str]}
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'load_time': self.load_time,
+                'models': [key[0] for key in self._models],
+            }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+    algorithms.segment.src.components
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Finds the connected components of dense binary masks around requested
+    centroids, without labeling the whole mask.
+"""
+
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import scipy.ndimage
+
+
+# Half of the size of the region labeled around a centroid at first. It is
+# doubled until the region holds the whole connected component.
+ROI_HALF_SIZE = 32
+
+
+class MaskComponents(object):
+    """The connected components of a dense mask, labeled lazily around the requested voxels.
+
+    The mask is memory-mapped, so that only the regions around the requested
+    voxels are read. The components found are remembered for later requests.
+
+    Args:
+        path (str): a path to a .npy-file holding a 3D binary mask.
+    """
+
+    def __init__(self, path):
+        self.mask = np.load(path, mmap_mode='r')
+        self._components = []
+        self._lock = threading.Lock()
+
+    def voxels(self, centroid):
+        """Count the voxels of the connected component a voxel belongs to.
+
+        Args:
+            centroid (dict): a voxel of the form::
+                {'x': int,
+                 'y': int,
+                 'z': int}
+
+        Returns:
+            int: the number of voxels of the component, 0 if the voxel is not in the mask.
+        """
+        point = (centroid['x'], centroid['y'], centroid['z'])
+        if not self.mask[point]:
+            return 0
+
+        with self._lock:
+            for box, component, count in self._components:
+                if _contains(box, point) and component[_local(box, point)]:
+                    return count
+
+            box, component = self._label_around(point)
+            count = int(np.count_nonzero(component))
+            self._components.append((box, component, count))
+            return count
+
+    def _label_around(self, point):
+        half_size = ROI_HALF_SIZE
+        while True:
+            box = tuple(slice(max(0, p - half_size), min(size, p + half_size + 1))
+                        for p, size in zip(point, self.mask.shape))
+            labels, _ = scipy.ndimage.label(self.mask[box])
+            component = labels == labels[_local(box, point)]
+            if not _touches_inner_faces(component, box, self.mask.shape):
+                return box, component
+            half_size *= 2
+
+
+def _contains(box, point):
+    return all(s.start <= p < s.stop for s, p in zip(box, point))
+
+
+def _local(box, point):
+    return tuple(p - s.start for s, p in zip(box, point))
+
+
+def _touches_inner_faces(component, box, shape):
+    """Whether the component may continue outside of the box, through a face that is not a border of the mask."""
+    for axis, (s, size) in enumerate(zip(box, shape)):
+        if s.start > 0 and component.take(0, axis=axis).any():
+            return True
+        if s.stop < size and component.take(-1, axis=axis).any():
+            return True
+    return False
+
+
+def mask_components(path):
+    """Return the MaskComponents of a mask file, shared until the file changes.
+
+    Args:
+        path (str): a path to a .npy-file holding a 3D binary mask.
+
+    Returns:
+        MaskComponents
+    """
+    stat = os.stat(path)
+    return _mask_components(os.path.abspath(path), stat.st_mtime, stat.st_size)
+
+
+@lru_cache(maxsize=16)
+def _mask_components(path, mtime, size):
+    return MaskComponents(path)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+    algorithms.segment.src.mask_store
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    A compact storage of binary segmentation masks. Each connected component
+    (nodule) of a mask is cropped to its bounding box and bit-packed, so that
+    the size of a stored mask scales with its nodules rather than with the scan.
+"""
+
+import numpy as np
+import scipy.ndimage
+
+
+SPARSE_MASK_SUFFIX = '.npz'
+
+
+def is_sparse_mask(path):
+    """Whether `path` names a mask stored by `save_mask`."""
+    return str(path).endswith(SPARSE_MASK_SUFFIX)
+
+
+def save_mask(path, mask):
+    """Store the connected components of a binary mask.
+
+    Args:
+        path (str): the path to the .npz-file to write.
+        mask (ndarray): a 3D binary mask.
+    """
+    mask = np.asarray(mask)
+    labels, count = scipy.ndimage.label(mask)
+    boxes = scipy.ndimage.find_objects(labels)
+
+    offsets = np.zeros((count, mask.ndim), dtype=np.int64)
+    shapes = np.zeros((count, mask.ndim), dtype=np.int64)
+    voxels = np.zeros(count, dtype=np.int64)
+    centers = np.zeros((count, mask.ndim), dtype=np.float64)
+    bits = []
+    for i, box in enumerate(boxes):
+        component = labels[box] == i + 1
+        offsets[i] = [s.start for s in box]
+        shapes[i] = component.shape
+        voxels[i] = np.count_nonzero(component)
+        centers[i] = np.argwhere(component).mean(axis=0) + offsets[i]
+        bits.append(np.packbits(component.ravel()))
+
+    bits_index = np.cumsum([0] + [len(packed) for packed in bits])
+    bits = np.concatenate(bits) if bits else np.zeros(0, dtype=np.uint8)
+    np.savez_compressed(path, shape=np.array(mask.shape), offsets=offsets, shapes=shapes,
+                        voxels=voxels, centers=centers, bits=bits, bits_index=bits_index)
+
+
+def load_mask(path):
+    """Load a mask stored by `save_mask`, without expanding it.
+
+    Args:
+        path (str): the path to the .npz-file.
+
+    Returns:
+        SparseMask
+    """
+    with np.load(path) as data:
+        return SparseMask(**{name: data[name] for name in data.files})
+
+
+class SparseMask(object):
+    """The bit-packed connected components of a binary mask.
+
+    Args:
+        shape (ndarray): the shape of the full mask.
+        offsets (ndarray): the first voxel of the bounding box of each component.
+        shapes (ndarray): the shape of the bounding box of each component.
+        voxels (ndarray): the number of voxels of each component.
+        centers (ndarray): the center of mass of each component.
+        bits (ndarray): the bit-packed bounding boxes of all the components.
+        bits_index (ndarray): where the bits of each component start in `bits`.
+    """
+
+    def __init__(self, shape, offsets, shapes, voxels, centers, bits, bits_index):
+        self.shape = tuple(int(size) for size in shape)
+        self.offsets = offsets
+        self.shapes = shapes
+        self.voxels = voxels
+        self.centers = centers
+        self.bits = bits
+        self.bits_index = bits_index
+
+    def __len__(self):
+        return len(self.voxels)
+
+    def component(self, index):
+        """Expand the bounding box of a component.
+
+        Args:
+            index (int): the index of the component.
+
+        Returns:
+            tuple[tuple[slice], ndarray]: the location of the bounding box in the
+            full mask and the boolean mask of the component inside of it.
+        """
+        shape = tuple(self.shapes[index])
+        packed = self.bits[self.bits_index[index]:self.bits_index[index + 1]]
+        component = np.unpackbits(packed)[:int(np.prod(shape))].reshape(shape).astype(np.bool_)
+        box = tuple(slice(start, start + size) for start, size in zip(self.offsets[index], shape))
+        return box, component
+
+    def to_dense(self):
+        """Expand the full mask.
+
+        Returns:
+            ndarray: a boolean array of shape `shape`.
+        """
+        mask = np.zeros(self.shape, dtype=np.bool_)
+        for index in range(len(self)):
+            box, component = self.component(index)
+            mask[box] |= component
+        return mask
+
+    def find(self, centroid):
+        """Find the component a voxel belongs to, by reading single bits of the packed components.
+
+        Args:
+            centroid (dict): a voxel of the form::
+                {'x': int,
+                 'y': int,
+                 'z': int}
+
+        Returns:
+            int | None: the index of the component, None if the voxel is not in the mask.
+        """
+        point = np.array([centroid['x'], centroid['y'], centroid['z']])
+        inside = np.all((self.offsets <= point) & (point < self.offsets + self.shapes), axis=1)
+        for index in np.flatnonzero(inside):
+            position = np.ravel_multi_index(tuple(point - self.offsets[index]), tuple(self.shapes[index]))
+            byte = self.bits[self.bits_index[index] + position // 8]
+            if (byte >> (7 - position % 8)) & 1:
+                return int(index)
+        return None
+
+    def volumes(self, centroids):
+        """Count the voxels of the component of each centroid.
+
+        Args:
+            centroids (list[dict]): A list of centroids of the form::
+                {'x': int,
+                 'y': int,
+                 'z': int}
+
+        Returns:
+            list[int]: the number of voxels of the component of each centroid, 0 if a
+            centroid is not in the mask.
+        """
+        indices = [self.find(centroid) for centroid in centroids]
+        return [int(self.voxels[index]) if index is not None else 0 for index in indices]
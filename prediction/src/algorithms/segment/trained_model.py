@@ -7,13 +7,15 @@
     descriptive statistics.
 """
 
-from src.preprocess.load_dicom import load_dicom, load_meta
+from src.algorithms.segment.src.components import mask_components
+from src.algorithms.segment.src.mask_store import is_sparse_mask, load_mask
+from src.instrumentation import span
+from src.preprocess.load_dicom import load_dicom, load_geometry
 
-import numpy as np
 import os
-import scipy.ndimage
 
 
+@span('segment.predict')
 def predict(dicom_path, centroids):
     """ Predicts nodule boundaries.
 
@@ -58,7 +60,8 @@ def calculate_volume(segment_path, centroids, dicom_path=None):
         (2) DICOM has voxels' sizes in mm therefore the volume should be in real
         measurements (not pixels).
     Args:
-        segment_path (str): a path to a mask file
+        segment_path (str): a path to a mask file, either a dense .npy-file or a .npz-file
+            written by `mask_store.save_mask`
         centroids (list[dict]): A list of centroids of the form::
             {'x': int,
              'y': int,
@@ -71,20 +74,41 @@ def calculate_volume(segment_path, centroids, dicom_path=None):
             of a connected component for each centroid.
     """
 
-    mask = np.load(segment_path)
-    mask, _ = scipy.ndimage.label(mask)
-    labels = [mask[centroid['x'], centroid['y'], centroid['z']] for centroid in centroids]
-    volumes = np.bincount(mask.flatten())
-    volumes = volumes[labels].tolist()
-
-    if dicom_path:
-        dicom_files = load_meta(dicom_path)
-        slice_locations = [dcm_file.SliceLocation for dcm_file in dicom_files]
-        slice_thickness = np.diff(slice_locations).mean()
-        # Every DICOM study preserve the same PixelSpacing along its sub files
-        voxel_shape = dicom_files[0].PixelSpacing
-        # Taking into account ijk -> xyz transformation
-        voxel_shape = np.prod([voxel_shape[1], voxel_shape[0], slice_thickness])
-        volumes = [volume * voxel_shape for volume in volumes]
-
-    return volumes
+    unit = 'mm3' if dicom_path else 'voxels'
+    return [volume[unit] for volume in measure_volumes(segment_path, centroids, dicom_path)]
+
+
+@span('segment.measure_volumes')
+def measure_volumes(segment_path, centroids, dicom_path=None):
+    """ Measures the connected component of each centroid in voxels and in cubic mm.
+
+    Only the components of the centroids are labeled, in a region around each
+    centroid, and the components are cached per mask file until it changes.
+    Masks stored by `mask_store.save_mask` (.npz-files) are not expanded. The
+    volume of a centroid outside of the mask is 0.
+
+    Args:
+        segment_path (str): a path to a mask file, either a dense .npy-file or a .npz-file
+            written by `mask_store.save_mask`
+        centroids (list[dict]): A list of centroids of the form::
+            {'x': int,
+             'y': int,
+             'z': int}
+        dicom_path (str): contains the path to the folder containing the dcm-files of a series.
+            If None then the volumes in cubic mm are None.
+
+    Returns:
+        list[dict]: the volume of the connected component of each centroid of the form::
+            {'voxels': int,
+             'mm3': float | None}
+    """
+
+    if is_sparse_mask(segment_path):
+        counts = load_mask(segment_path).volumes(centroids)
+    else:
+        components = mask_components(segment_path)
+        counts = [components.voxels(centroid) for centroid in centroids]
+
+    voxel_volume = load_geometry(dicom_path).voxel_volume if dicom_path else None
+    return [{'voxels': count, 'mm3': count * voxel_volume if voxel_volume is not None else None}
+            for count in counts]
@@ -0,0 +1,73 @@
+"""
+    prediction.src.compression
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Accepts gzip compressed request bodies and compresses the responses of
+    the clients accepting gzip.
+"""
+import gzip
+import io
+import zlib
+
+from flask import current_app, request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+
+class GzipRequestMiddleware(object):
+    """WSGI middleware decompressing the bodies sent with the header
+    `Content-Encoding: gzip`, so that the views read them as usual.
+
+    Args:
+        wsgi_app (callable): the WSGI application.
+        max_size (int): the largest decompressed body accepted, in bytes.
+    """
+
+    def __init__(self, wsgi_app, max_size=64 * 1024 ** 2):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        if environ.get('HTTP_CONTENT_ENCODING', '').lower() != 'gzip':
+            return self.wsgi_app(environ, start_response)
+
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(environ['wsgi.input'].read(length), self.max_size + 1)
+        except zlib.error:
+            return BadRequest('The request body is not valid gzip.')(environ, start_response)
+        if len(body) > self.max_size:
+            return RequestEntityTooLarge()(environ, start_response)
+
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+
+def compress_response(response):
+    """Compress the response to the current request with gzip if the client
+    accepts it.
+
+    Streamed responses and bodies smaller than the GZIP_MIN_SIZE setting are
+    left as they are.
+
+    Args:
+        response (flask.Response): the response.
+
+    Returns:
+        flask.Response: `response`
+    """
+    accepted = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    encoded = response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+    if not accepted or encoded:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config.get('GZIP_MIN_SIZE', 1024):
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -8,6 +8,10 @@ import config
 
 from flask import Flask
 
+from .compression import GzipRequestMiddleware, compress_response
+from .jobs import JobQueue
+from .preload import WarmUp
+
 
 def create_app(config_mode='Production', config_file=None):
     """Flask app creator that accepts configuration modes
@@ -40,6 +44,27 @@ def create_app(config_mode='Production', config_file=None):
     else:
         app.config.from_envvar('APP_SETTINGS', silent=True)
 
+    from .algorithms.model_registry import registry
+    from .preprocess import load_dicom, resample
+
+    registry.max_models = app.config.get('MODEL_REGISTRY_SIZE', registry.max_models)
+    app.extensions['warm_up'] = WarmUp(app.config.get('WARM_UP_MODELS', []))
+    if not app.config.get('PRELOAD_APP'):
+        app.extensions['warm_up'].start()
+
+    load_dicom.read_workers = app.config.get('DICOM_READ_WORKERS', load_dicom.read_workers)
+    resample.workers = app.config.get('RESAMPLE_WORKERS') or None
+    load_dicom.volume_cache.max_bytes = app.config.get('VOLUME_CACHE_SIZE', 1024) * 1024 ** 2
+    load_dicom.volume_cache.cache_dir = app.config.get('VOLUME_CACHE_DIR', load_dicom.volume_cache.cache_dir)
+    load_dicom.volume_cache.max_disk_bytes = app.config.get('VOLUME_CACHE_DISK_SIZE', 10240) * 1024 ** 2
+
+    app.wsgi_app = GzipRequestMiddleware(app.wsgi_app, max_size=app.config.get('MAX_REQUEST_SIZE', 64) * 1024 ** 2)
+    app.after_request(compress_response)
+
+    app.extensions['jobs'] = JobQueue(database=app.config.get('JOBS_DATABASE', ':memory:'),
+                                      workers=app.config.get('JOB_WORKERS', 2),
+                                      max_pending=app.config.get('JOB_QUEUE_SIZE', 100))
+
     return app
 
 
@@ -0,0 +1,133 @@
+"""
+    prediction.src.instrumentation
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Provides spans timing the stages of the prediction pipeline. Every span
+    is aggregated into a histogram of this process, exported in the Prometheus
+    text format, and added to the timings collected by the current thread.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., float('inf'))
+
+
+class Histogram(object):
+    """The distribution of the durations of a stage.
+
+    Args:
+        buckets (tuple[float]): The increasing upper bounds of the buckets, the
+            last of which should be infinite.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """list[int]: The number of observations less or equal to each bound."""
+        counts, total = [], 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class Metrics(object):
+    """The histograms of the stages timed in this process."""
+
+    def __init__(self):
+        self._histograms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self._histograms:
+                self._histograms[stage] = Histogram()
+            self._histograms[stage].observe(seconds)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self, samples=()):
+        """Export the histograms, and extra samples, in the Prometheus text format.
+
+        Args:
+            samples (list[tuple]): Extra metrics of the form
+                (name, type, help, value), e.g. the counters of the caches.
+
+        Returns:
+            str
+        """
+        lines = ['# HELP prediction_stage_seconds Time spent in the stages of the prediction pipeline.',
+                 '# TYPE prediction_stage_seconds histogram']
+        with self._lock:
+            for stage, histogram in self._histograms.items():
+                for bound, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                    lines.append('prediction_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(
+                        stage, '+Inf' if bound == float('inf') else repr(bound), count))
+                lines.append('prediction_stage_seconds_sum{{stage="{}"}} {!r}'.format(stage, histogram.sum))
+                lines.append('prediction_stage_seconds_count{{stage="{}"}} {}'.format(stage, histogram.count))
+
+        for name, kind, description, value in samples:
+            lines.extend(['# HELP {} {}'.format(name, description),
+                          '# TYPE {} {}'.format(name, kind),
+                          '{} {!r}'.format(name, value)])
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+_local = threading.local()
+
+
+@contextmanager
+def span(stage):
+    """Time a stage of the pipeline. Works as a context manager and as a decorator.
+
+    Args:
+        stage (str): The name of the stage, e.g. 'load_dicom.read'.
+
+    Examples:
+        >>> with span('classify.inference'):
+        ...     model.predict(patches)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe(stage, seconds)
+        timings = getattr(_local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.) + seconds
+
+
+@contextmanager
+def collect():
+    """Collect the total time of each stage timed in the current thread.
+
+    Yields:
+        OrderedDict: the seconds spent in each stage, filled in as the spans end.
+    """
+    previous = getattr(_local, 'timings', None)
+    _local.timings = OrderedDict()
+    try:
+        yield _local.timings
+    finally:
+        _local.timings = previous
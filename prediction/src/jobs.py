@@ -0,0 +1,206 @@
+"""
+    prediction.src.jobs
+    ~~~~~~~~~~~~~~~~~~~
+
+    Provides a job queue running predictions in the background, so that
+    clients submit a long prediction and poll for its result instead of
+    holding a request open until it is done.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Exception that is raised when too many jobs are pending in this process.
+    """
+
+    def __init__(self, *args):
+        if not args:
+            args = ('Too many prediction jobs are pending. Please try again later.', )
+        Exception.__init__(self, *args)
+
+
+def native_threading():
+    """Return the Lock and the ThreadPoolExecutor of OS threads.
+
+    Under gevent's monkey patching the threads of concurrent.futures are
+    greenlets, so that a CPU bound job would block the other requests of the
+    worker, including the polls of its status, until it is done, and the
+    work split across a pool would run one part after another.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return threading.Lock, ThreadPoolExecutor
+    if not monkey.is_module_patched('threading'):
+        return threading.Lock, ThreadPoolExecutor
+
+    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+    return monkey.get_original('threading', 'Lock'), NativeThreadPoolExecutor
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _to_builtin(value):
+    # numpy scalars and arrays returned by the predictors
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+
+class JobQueue(object):
+    """A bounded pool of worker threads with the job records kept in SQLite.
+
+    The jobs run in the process that submitted them, on OS threads even in a
+    gevent worker. Keeping the records in a SQLite file lets every worker
+    process of the service answer the polling requests. The jobs left queued
+    or running by a process that no longer exists are marked as failed when
+    a process starts using the queue.
+
+    Args:
+        database (str): Path to the SQLite database, or ':memory:' to keep the
+            records in this process only.
+        workers (int): The number of jobs running at the same time.
+        max_pending (int): The number of queued and running jobs this process
+            accepts before `submit` raises a QueueFullError.
+        max_age (float): Finished jobs are deleted after `max_age` seconds.
+    """
+
+    def __init__(self, database=':memory:', workers=2, max_pending=100, max_age=24 * 60 * 60):
+        self.database = database
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.pending = 0
+        self._setup_lock = threading.Lock()
+        self._lock = None
+        self._pid = None
+        self._connection = None
+        self._executor = None
+
+    def _setup(self):
+        # The connection and threads are created lazily and per process, as
+        # neither of them survives a fork of the server's worker processes.
+        # The jobs' threads only call this once it is done.
+        if self._pid == os.getpid():
+            return
+        with self._setup_lock:
+            if self._pid == os.getpid():
+                return
+            lock, executor = native_threading()
+            self.pending = 0
+            self._lock = lock()
+            self._connection = sqlite3.connect(self.database, timeout=30, check_same_thread=False)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                                     'id TEXT PRIMARY KEY, algorithm TEXT, status TEXT, progress REAL, '
+                                     'result TEXT, error TEXT, created REAL, updated REAL, pid INTEGER)')
+            try:
+                # The databases created before the jobs recorded their process
+                self._connection.execute('ALTER TABLE jobs ADD COLUMN pid INTEGER')
+            except sqlite3.OperationalError:
+                pass
+            self._fail_orphans()
+            self._connection.commit()
+            self._executor = executor(max_workers=self.workers)
+            self._pid = os.getpid()
+
+    def _fail_orphans(self):
+        """Mark the jobs of the processes that exited before finishing them as failed."""
+        rows = self._connection.execute("SELECT DISTINCT pid FROM jobs WHERE status IN ('queued', 'running')")
+        # A process reusing the id of an exited one has not submitted any job yet
+        orphaned = [pid for pid, in rows.fetchall()
+                    if pid is None or pid == os.getpid() or not _process_exists(pid)]
+        self._connection.executemany(
+            "UPDATE jobs SET status = 'failed', error = ?, updated = ? "
+            "WHERE pid IS ? AND status IN ('queued', 'running')",
+            [('The worker running the job exited before it was done.', time.time(), pid) for pid in orphaned])
+
+    def _execute(self, query, *args):
+        self._setup()
+        with self._lock:
+            cursor = self._connection.execute(query, args)
+            rows = cursor.fetchall()
+            self._connection.commit()
+            return rows
+
+    def submit(self, algorithm, task):
+        """Queue a job.
+
+        Args:
+            algorithm (str): The name of the algorithm the job runs.
+            task (callable[callable[float]] -> object): The work of the job. It
+                is called with a function reporting its progress as a number
+                between 0 and 1, and returns a JSON serializable result.
+
+        Returns:
+            str: The id of the job.
+        """
+        now = time.time()
+        self._execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", now - self.max_age)
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise QueueFullError
+            self.pending += 1
+
+        job_id = uuid.uuid4().hex
+        self._execute('INSERT INTO jobs (id, algorithm, status, progress, created, updated, pid) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?)', job_id, algorithm, 'queued', 0., now, now, os.getpid())
+        self._executor.submit(self._run, job_id, task)
+        return job_id
+
+    def _run(self, job_id, task):
+        def progress(fraction):
+            self._execute('UPDATE jobs SET progress = ?, updated = ? WHERE id = ?', fraction, time.time(), job_id)
+
+        try:
+            self._execute("UPDATE jobs SET status = 'running', updated = ? WHERE id = ?", time.time(), job_id)
+            result = json.dumps(task(progress), default=_to_builtin)
+            self._execute("UPDATE jobs SET status = 'done', progress = 1, result = ?, updated = ? WHERE id = ?",
+                          result, time.time(), job_id)
+        except Exception as e:
+            self._execute("UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                          '{} ({})'.format(str(e), type(e).__name__), time.time(), job_id)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def get(self, job_id):
+        """Return the record of a job.
+
+        Args:
+            job_id (str): The id returned by `submit`.
+
+        Returns:
+            dict | None: None if there is no such job, otherwise a dictionary
+            of the form::
+                {'id': str,
+                 'algorithm': str,
+                 'status': str,  # one of 'queued', 'running', 'done' or 'failed'
+                 'progress': float,
+                 'result': object,
+                 'error': str | None,
+                 'created': float,
+                 'updated': float}
+        """
+        rows = self._execute('SELECT id, algorithm, status, progress, result, error, created, updated '
+                             'FROM jobs WHERE id = ?', job_id)
+        if not rows:
+            return None
+
+        job = dict(zip(('id', 'algorithm', 'status', 'progress', 'result', 'error', 'created', 'updated'), rows[0]))
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
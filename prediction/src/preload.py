@@ -0,0 +1,115 @@
+"""
+    prediction.src.preload
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Support for servers importing the service once in a master process and
+    forking the workers from it, like gunicorn with `preload_app`, see
+    gunicorn_config.py.
+
+    The heavy modules, Keras and TensorFlow, are imported in the master so
+    that every worker shares them copy-on-write. The models themselves are
+    loaded by each worker after the fork: a TensorFlow session created in the
+    master blocks forever once it is used by a forked worker.
+"""
+import os
+import threading
+import time
+
+from .algorithms.model_registry import registry
+
+
+def import_stack():
+    """Import the Keras and TensorFlow modules the algorithms import lazily.
+
+    Neither of them creates a session or starts a thread when imported, so
+    this is safe to call before forking.
+
+    Returns:
+        float: the seconds it took
+    """
+    start = time.time()
+    import keras.models  # noqa: F401
+    from .algorithms.classify.src import preprocess_patch  # noqa: F401
+    return time.time() - start
+
+
+def memory_usage():
+    """Return the memory of this process, in MB.
+
+    Returns:
+        dict: A dictionary of the form::
+            {'rss': float,
+             'private': float}
+        where `private` is the part of `rss` not shared with other
+        processes, e.g. the pages of a master process the worker has not
+        written to. Both are None where /proc is not available.
+    """
+    usage = {'rss': None, 'private': None}
+    try:
+        with open('/proc/self/smaps') as smaps:
+            lines = [line.split() for line in smaps if line.startswith(('Rss:', 'Private_Clean:', 'Private_Dirty:'))]
+    except IOError:
+        return usage
+    usage['rss'] = sum(int(line[1]) for line in lines if line[0] == 'Rss:') / 1024
+    usage['private'] = sum(int(line[1]) for line in lines if line[0] != 'Rss:') / 1024
+    return usage
+
+
+class WarmUp(object):
+    """Loads the models of a worker ahead of its first request, and tells
+    whether it is done.
+
+    The state is kept per process, like the JobQueue's, so that the workers
+    forked from a master holding a WarmUp that was not started report they
+    are not ready until they have warmed up themselves.
+
+    Args:
+        model_paths (list[str]): Paths to the serialized models.
+        registry (ModelRegistry): The registry the models are loaded into.
+    """
+
+    def __init__(self, model_paths, registry=registry):
+        self.model_paths = list(model_paths)
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ready = threading.Event()
+        self._error = None
+        self._duration = None
+
+    def start(self):
+        """Load the models in this process, unless it already started to."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._ready = threading.Event()
+            self._error = None
+            self._duration = None
+
+        start = time.time()
+        try:
+            self.registry.warm_up(self.model_paths)
+        except Exception as e:
+            self._error = 'Could not load the models: {}'.format(e)
+        self._duration = time.time() - start
+        self._ready.set()
+
+    def status(self):
+        """Return the state of the warm up of this process.
+
+        Returns:
+            dict: A dictionary of the form::
+                {'ready': bool,
+                 'models': list[str],
+                 'duration': float | None,
+                 'error': str | None}
+            where `ready` is only True once all of the models are loaded.
+        """
+        done = self._pid == os.getpid() and self._ready.is_set()
+        return {
+            'ready': done and self._error is None,
+            'models': self.model_paths,
+            'duration': self._duration if done else None,
+            'error': self._error if done else None,
+        }
@@ -1,5 +1,7 @@
 import os
 
+import dicom
+
 from .load_dicom import read_dicom_files
 
 
@@ -26,8 +28,27 @@ def crop_dicom(path_to_dicom, begin, end, output=None):
 
     """
 
-    cropped_series = []
-    files = read_dicom_files(path_to_dicom + '/*.dcm')
+    return list(iter_crop_dicom(path_to_dicom, begin, end, output))
+
+
+def iter_crop_dicom(path_to_dicom, begin, end, output=None):
+    """
+    Generator version of crop_dicom, yielding the cropped slices one by one. The slices are selected by the
+    SliceLocation in their headers, so that only the pixel data of the slices in the requested z-range is read.
+    If an output path is provided, each slice is saved as soon as it has been cropped.
+
+    Args:
+        path_to_dicom: String containing the path containing the DICOM-series
+        begin: List containing three numbers representing the starting point for cropping. See crop_dicom.
+        end: List containing three numbers representing the starting point for cropping. See crop_dicom.
+        output: (optional) String containg the path to where to save the cropped series.
+
+    Yields:
+        pydicom Dataset-objects representing the cropped slices, sorted by their SliceLocation.
+
+    """
+
+    headers = read_dicom_files(os.path.join(path_to_dicom, '*.dcm'), stop_before_pixels=True)
 
     if output and not os.path.exists(output):
         os.makedirs(output)
@@ -36,15 +57,13 @@ def crop_dicom(path_to_dicom, begin, end, output=None):
     upper_z = begin[2] if begin[2] > end[2] else end[2]
     lower_z = begin[2] if begin[2] < end[2] else end[2]
 
-    for file in files:
-        if file.SliceLocation > upper_z or file.SliceLocation < lower_z:
+    for header in headers:
+        if header.SliceLocation > upper_z or header.SliceLocation < lower_z:
             continue
-        new_file = file
+        new_file = dicom.read_file(header.filename)
         new_file.PixelData = new_file.pixel_array[begin[0]:end[0], begin[1]:end[1]].tostring()
         new_file.Rows = new_dim_xy[0]
         new_file.Columns = new_dim_xy[1]
-        cropped_series.append(new_file)
         if output:
             new_file.save_as(output + "/" + str(new_file.SliceLocation) + ".dcm")
-
-    return cropped_series
+        yield new_file
@@ -0,0 +1,58 @@
+"""
+    preprocess.geometry
+    ~~~~~~~~~~~~~~~~~~~
+
+    A compact description of the geometry of a DICOM series, extracted from
+    the headers of its dcm-files.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+
+class SeriesGeometry(namedtuple('SeriesGeometry', ['pixel_spacing', 'slice_locations', 'orientation', 'dims'])):
+    """Geometry of a DICOM series.
+
+    Args:
+        pixel_spacing (tuple[float, float]): The PixelSpacing shared by the dcm-files of the series.
+        slice_locations (tuple[float]): The sorted SliceLocation of every dcm-file.
+        orientation (tuple[float] | None): The ImageOrientationPatient, if present.
+        dims (tuple[int, int, int]): The number of rows, columns and slices.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_datasets(cls, datasets):
+        """Build the geometry of a series from its dcm-files.
+
+        Args:
+            datasets (list[dicom.dataset.Dataset]): the dcm-files of a series sorted by SliceLocation,
+                their pixel data is not needed.
+
+        Returns:
+            preprocess.geometry.SeriesGeometry
+        """
+        # Every DICOM study preserve the same PixelSpacing along its sub files
+        first = datasets[0]
+        orientation = getattr(first, 'ImageOrientationPatient', None)
+        return cls(pixel_spacing=tuple(float(spacing) for spacing in first.PixelSpacing),
+                   slice_locations=tuple(float(dcm_file.SliceLocation) for dcm_file in datasets),
+                   orientation=tuple(float(o) for o in orientation) if orientation is not None else None,
+                   dims=(int(first.Rows), int(first.Columns), len(datasets)))
+
+    @property
+    def slice_thickness(self):
+        """float: The mean distance between consecutive slices."""
+        return float(np.diff(self.slice_locations).mean())
+
+    @property
+    def voxel_shape(self):
+        """tuple[float, float, float]: The voxel size along the axes of the voxel array."""
+        # Taking into account ijk -> xyz transformation
+        return self.pixel_spacing[1], self.pixel_spacing[0], self.slice_thickness
+
+    @property
+    def voxel_volume(self):
+        """float: The volume of a voxel in cubic mm."""
+        return float(np.prod(self.voxel_shape))
@@ -1,16 +1,55 @@
 import os
+from functools import lru_cache, partial
 from glob import glob
 
 import dicom
 import dicom_numpy
 import numpy as np
 
+from . import volume_format
+from ..instrumentation import span
+from ..jobs import native_threading
 from .errors import EmptyDicomSeriesException
+from .geometry import SeriesGeometry
+from .preprocess_dicom import PreprocessDicom
+from .volume_cache import VolumeCache, series_fingerprint
 
+# Decoded series shared by all the algorithms running in this process
+volume_cache = VolumeCache()
 
-def read_dicom_files(file_pattern):
+# Number of threads decoding the dcm-files of a series concurrently
+read_workers = 4
+
+
+def read_dicom_files(file_pattern, workers=None, stop_before_pixels=False):
+    """Read the dcm-files matching a pattern, sorted by their SliceLocation.
+
+    Args:
+        file_pattern (str): glob pattern of the dcm-files, e.g. '/path/to/series/*.dcm'.
+        workers (int): number of threads decoding the files concurrently. Defaults to `read_workers`.
+        stop_before_pixels (bool): If True, only the headers are read and the PixelData is skipped.
+
+    Returns:
+        list[dicom.dataset.Dataset]
+    """
+    if workers is None:
+        workers = read_workers
+
+    file_names = glob(file_pattern)
+
+    read_file = partial(dicom.read_file, stop_before_pixels=stop_before_pixels)
     try:
-        files = [dicom.read_file(fn) for fn in glob(file_pattern)]
+        with span('load_dicom.read_headers' if stop_before_pixels else 'load_dicom.read'):
+            if workers > 1 and len(file_names) > 1:
+                # pydicom imports modules on the first read. The OS threads
+                # of a gevent worker cannot import them concurrently, so the
+                # first file is read before the others.
+                files = [read_file(file_names[0])]
+                _, executor_class = native_threading()
+                with executor_class(max_workers=workers) as executor:
+                    files.extend(executor.map(read_file, file_names[1:]))
+            else:
+                files = [read_file(fn) for fn in file_names]
 
         if len(files) == 0:
             raise EmptyDicomSeriesException
@@ -18,12 +57,15 @@ def read_dicom_files(file_pattern):
         print('Exception reading *.dcm-files: ', e)
         raise e
 
-    return sorted(files, key=lambda x: float(x.SliceLocation))
+    files = sorted(files, key=lambda x: float(x.SliceLocation))
+
+    return files
 
 
-def _extract_voxel_data(datasets):
+def _extract_voxel_data(datasets, with_affine=False):
     try:
-        voxel_ndarray, ijk_to_xyz = dicom_numpy.combine_slices(datasets)
+        with span('load_dicom.combine_slices'):
+            voxel_ndarray, ijk_to_xyz = dicom_numpy.combine_slices(datasets)
     except dicom_numpy.DicomImportException as e:
         print('Exception extracting voxel data: ', e)
         raise e
@@ -31,37 +73,114 @@ def _extract_voxel_data(datasets):
         print('Exception extracting voxel data: ', e)
         raise dicom_numpy.DicomImportException('Invalid dicom.dataset.Dataset among datasets! ', e)
 
+    if with_affine:
+        return voxel_ndarray, ijk_to_xyz
     return voxel_ndarray
 
 
-def load_dicom(path, preprocess=None):
+def load_dicom(path, preprocess=None, use_cache=True):
     """Function that orchestrates the loading of dicom datafiles of a dicom series into a numpy-array.
 
+    Decoded series are kept in `volume_cache`, keyed by a fingerprint of the dcm-files and, if
+    `preprocess` has a `cache_key` method, by the preprocessing parameters. Cached arrays are read-only.
+
+    `path` may also be a volume exported by `export_volume`, whose voxels are memory-mapped
+    instead of decoded. `preprocess` then gets the SeriesGeometry of the volume in place of
+    its dcm-files.
+
     Args:
         path (str): contains the path to the folder containing the dcm-files of a series.
         preprocess (callable[list[DICOM], ndarray] -> ndarray): A python function or method
             aimed at preprocessing dicom.
+        use_cache (bool): If False, the series is decoded without consulting `volume_cache`.
 
     Returns:
         numpy-array containing the 3D-representation of the DICOM-series
     """
 
-    file_pattern = os.path.join(path, '*.dcm')
-    files = read_dicom_files(file_pattern)
-    voxel_data = _extract_voxel_data(files)
+    if preprocess is None and volume_format.is_volume(path):
+        # The page cache of the OS holds exported volumes instead of volume_cache
+        return volume_format.open_volume(path)
+
+    raw_key = series_fingerprint(path) if use_cache else None
+    key = raw_key
+    if raw_key is not None and preprocess is not None:
+        cache_key = getattr(preprocess, 'cache_key', None)
+        key = '{}:{}'.format(raw_key, cache_key()) if cache_key is not None else None
+
+    if key is not None:
+        voxel_data = volume_cache.get(key)
+        if voxel_data is not None:
+            return voxel_data
+
+    files, voxel_data = _read_series(path, raw_key, lookup=raw_key != key)
 
     if preprocess is not None:
-        voxel_data = preprocess(files, voxel_data)
-        print(type(voxel_data))
-        if not isinstance(voxel_data, np.ndarray):
-            raise TypeError('The signature of preprocess must be ' +
-                            'callable[list[DICOM], ndarray] -> ndarray')
+        voxel_data = _preprocess(files, voxel_data, preprocess)
+        if key is not None:
+            voxel_data = volume_cache.put(key, voxel_data)
 
     return voxel_data
 
 
+def _read_series(path, raw_key, lookup):
+    """Return the dcm-files of a series, or the geometry of an exported volume, and its voxels.
+
+    The decoded voxels are cached under `raw_key` if it is set, and looked up first if `lookup` is True.
+    """
+    if volume_format.is_volume(path):
+        return volume_format.load_geometry(path), volume_format.open_volume(path)
+
+    voxel_data = None
+    if raw_key is not None and lookup:
+        voxel_data = volume_cache.get(raw_key)
+
+    # The pixel data only has to be read if the series is not cached yet
+    file_pattern = os.path.join(path, '*.dcm')
+    files = read_dicom_files(file_pattern, stop_before_pixels=voxel_data is not None)
+
+    if voxel_data is None:
+        voxel_data = _extract_voxel_data(files)
+        if raw_key is not None:
+            voxel_data = volume_cache.put(raw_key, voxel_data)
+
+    return files, voxel_data
+
+
+def export_volume(path, volume_path):
+    """Decode a DICOM series once and store it in the on-disk volume format of `volume_format`.
+
+    `load_dicom` and `load_geometry` then accept `volume_path` in place of `path`.
+
+    Args:
+        path (str): contains the path to the folder containing the dcm-files of a series.
+        volume_path (str): the folder the volume is written to.
+
+    Returns:
+        preprocess.geometry.SeriesGeometry: the geometry of the series.
+    """
+    files = read_dicom_files(os.path.join(path, '*.dcm'))
+    voxel_data, ijk_to_xyz = _extract_voxel_data(files, with_affine=True)
+    geometry = SeriesGeometry.from_datasets(files)
+    volume_format.write_volume(volume_path, voxel_data, ijk_to_xyz, geometry, source=series_fingerprint(path))
+    return geometry
+
+
+def _preprocess(files, voxel_data, preprocess):
+    # The preprocessing may work in-place, so it must not touch the cached series.
+    # PreprocessDicom copies read-only arrays itself, straight into its output dtype.
+    with span('load_dicom.preprocess'):
+        if not isinstance(preprocess, PreprocessDicom):
+            voxel_data = np.array(voxel_data)
+        voxel_data = preprocess(files, voxel_data)
+    if not isinstance(voxel_data, np.ndarray):
+        raise TypeError('The signature of preprocess must be '
+                        'callable[list[DICOM], ndarray] -> ndarray')
+    return voxel_data
+
+
 def load_meta(path):
-    """Function that load a DICOM series.
+    """Function that load the headers of a DICOM series, without their pixel data.
 
     Args:
         path (str): contains the path to the folder containing the dcm-files of a series.
@@ -71,4 +190,27 @@ def load_meta(path):
     """
 
     file_pattern = os.path.join(path, '*.dcm')
-    return read_dicom_files(file_pattern)
+    return read_dicom_files(file_pattern, stop_before_pixels=True)
+
+
+def load_geometry(path):
+    """Function that load the geometry of a DICOM series from the headers of its dcm-files.
+
+    The geometry is cached per series, until one of its dcm-files changes. `path` may also be
+    a volume exported by `export_volume`.
+
+    Args:
+        path (str): contains the path to the folder containing the dcm-files of a series.
+
+    Returns:
+        preprocess.geometry.SeriesGeometry
+    """
+
+    return _load_geometry(path, series_fingerprint(path))
+
+
+@lru_cache(maxsize=256)
+def _load_geometry(path, fingerprint):
+    if volume_format.is_volume(path):
+        return volume_format.load_geometry(path)
+    return SeriesGeometry.from_datasets(load_meta(path))
@@ -1,6 +1,24 @@
+import logging
+import tracemalloc
+
 import numpy as np
 import scipy.ndimage
 
+from . import resample
+from .geometry import SeriesGeometry
+from ..instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+
+def _float_dtype(dtype):
+    if dtype is None:
+        return None
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError('The dtype should be a floating point type')
+    return dtype
+
 
 class Params:
     """Params for DICOM data preprocessing.
@@ -17,13 +35,18 @@ class Params:
             If a sequence, `voxel_shape` should contain one value for each axis.
         min_max_normalize (bool): If True, use min_max magnitude normalization.
             So that the voxels' values will lie inside [0, 1].
+        interpolation_order (int): The order of the spline interpolation used to rescale the voxels
+            to `voxel_shape`, in the range 0-5. 0 (nearest) suits label masks, 1 (linear) or 3 (cubic) intensities.
+        dtype (numpy.dtype | str): The floating point type of the preprocessed voxels, e.g. float32.
+            If None is set, the voxels keep their type, unless min_max_normalize turns them into float64.
 
     Returns:
         preprocess.preprocess_dicom.Params
     """
 
     def __init__(self, clip_lower=None, clip_upper=None,
-                 voxel_shape=None, ndim=3, min_max_normalize=False):
+                 voxel_shape=None, ndim=3, min_max_normalize=False, dtype=None,
+                 interpolation_order=3):
         if not isinstance(clip_lower, (int, float)) and (clip_lower is not None):
             raise ValueError('The clip_lower should be int or float')
         if not isinstance(clip_upper, (int, float)) and (clip_upper is not None):
@@ -49,6 +72,12 @@ class Params:
             raise ValueError('The min_max_normalize should be bool or int')
         self.min_max_normalize = min_max_normalize
 
+        self.dtype = _float_dtype(dtype)
+
+        if not isinstance(interpolation_order, int) or not 0 <= interpolation_order <= 5:
+            raise ValueError('The interpolation_order should be an int in the range 0-5')
+        self.interpolation_order = interpolation_order
+
 
 class PreprocessDicom:
     """Preprocess the DICOM data.
@@ -65,47 +94,99 @@ class PreprocessDicom:
             If a sequence, `voxel_shape` should contain one value for each axis.
         min_max_normalize (bool): If True, use min_max magnitude normalization.
             So that the voxels' values will lie inside [0, 1].
+        interpolation_order (int): The order of the spline interpolation used to rescale the voxels
+            to `voxel_shape`, in the range 0-5. 0 (nearest) suits label masks, 1 (linear) or 3 (cubic) intensities.
+        dtype (numpy.dtype | str): The floating point type of the preprocessed voxels, e.g. float32.
+            If None is set, the voxels keep their type, unless min_max_normalize turns them into float64.
+        trace_memory (bool): If True, the peak memory allocated by each call is measured with
+            tracemalloc and kept in `peak_memory`, in bytes.
 
     Returns:
         preprocess.preprocess_dicom.Params
     """
 
-    def __init__(self, params=None):
+    def __init__(self, params=None, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.peak_memory = None
         self.params = None
         if params is not None:
             if not isinstance(params, Params):
                 raise ValueError('The params should be an instance of %s.' % str(Params))
         self.params = params
 
+    def cache_key(self):
+        """Return a string identifying the preprocessing, used to cache its results."""
+        if self.params is None:
+            return repr(None)
+        return repr(sorted((name, tuple(value) if isinstance(value, list) else value)
+                           for name, value in vars(self.params).items()))
+
     def __call__(self, dicom_files, voxel_data):
-        if (self.params is None) or not len(dicom_files):
+        """Preprocess the voxels of a DICOM series.
+
+        The voxels are converted to `dtype` at most once, and clipped and normalized in-place.
+        A read-only `voxel_data`, e.g. a cached series, is copied instead of being modified.
+
+        Args:
+            dicom_files (list[dicom.dataset.Dataset] | preprocess.geometry.SeriesGeometry): the dcm-files
+                of the series, or its geometry.
+            voxel_data (ndarray): the voxels of the series.
+
+        Returns:
+            ndarray
+        """
+        if not self.trace_memory:
+            return self._preprocess(dicom_files, voxel_data)
+
+        # The peak also includes earlier allocations if tracemalloc was already running
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        traced = tracemalloc.get_traced_memory()[0]
+        try:
+            return self._preprocess(dicom_files, voxel_data)
+        finally:
+            self.peak_memory = tracemalloc.get_traced_memory()[1] - traced
+            if not tracing:
+                tracemalloc.stop()
+            logger.debug('PreprocessDicom peak memory: %.1f MB', self.peak_memory / 1024. ** 2)
+
+    def _preprocess(self, dicom_files, voxel_data):
+        params = self.params
+        if (params is None) or not len(dicom_files):
             return voxel_data
 
-        # Instead of np.clip usage in order to avoid np.max | np.min calculation in case of None
-        if self.params.clip_lower is not None:
-            voxel_data[voxel_data < self.params.clip_lower] = self.params.clip_lower
-
-        if self.params.clip_upper is not None:
-            voxel_data[voxel_data > self.params.clip_upper] = self.params.clip_upper
-
-        if self.params.min_max_normalize:
-            data_max = self.params.clip_upper
-            data_min = self.params.clip_lower
-            if data_max is None:
-                data_max = voxel_data.max()
-            if data_min is None:
-                data_min = voxel_data.min()
-
-            voxel_data = (voxel_data - data_min) / float(data_max - data_min)
-
-        if self.params.voxel_shape is not None:
-            slice_locations = [dcm_file.SliceLocation for dcm_file in dicom_files]
-            slice_thikness = np.diff(slice_locations).mean()
-            # Every DICOM file have the same PixelSpacing
-            current_shape = dicom_files[0].PixelSpacing
-            # Taking into account ijk -> xyz transformation
-            current_shape = np.asarray([current_shape[1], current_shape[0], slice_thikness])
-            zoom_fctr = current_shape / np.asarray(self.params.voxel_shape)
-            voxel_data = scipy.ndimage.interpolation.zoom(voxel_data, zoom_fctr)
+        dtype = params.dtype
+        if dtype is None:
+            dtype = np.dtype(np.float64) if params.min_max_normalize else voxel_data.dtype
+        with span('preprocess_dicom.clip_normalize'):
+            voxel_data = voxel_data.astype(dtype, copy=not voxel_data.flags.writeable)
+
+            if params.clip_lower is not None or params.clip_upper is not None:
+                np.clip(voxel_data, params.clip_lower, params.clip_upper, out=voxel_data)
+
+            if params.min_max_normalize:
+                data_max = params.clip_upper
+                data_min = params.clip_lower
+                if data_max is None:
+                    data_max = voxel_data.max()
+                if data_min is None:
+                    data_min = voxel_data.min()
+
+                voxel_data -= data_min
+                voxel_data /= float(data_max - data_min)
+
+        if params.voxel_shape is not None:
+            with span('preprocess_dicom.resample'):
+                geometry = dicom_files
+                if not isinstance(geometry, SeriesGeometry):
+                    geometry = SeriesGeometry.from_datasets(dicom_files)
+                current_shape = np.asarray(geometry.voxel_shape)
+                zoom_fctr = current_shape / np.asarray(params.voxel_shape)
+                # scipy.ndimage does not support float16, it is interpolated in float32
+                if voxel_data.dtype == np.float16:
+                    voxel_data = voxel_data.astype(np.float32)
+                voxel_data = resample.zoom(voxel_data, zoom_fctr, order=params.interpolation_order)
+                voxel_data = voxel_data.astype(dtype, copy=False)
 
         return voxel_data
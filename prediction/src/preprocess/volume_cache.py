@@ -0,0 +1,216 @@
+"""
+    preprocess.volume_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    A cache of decoded DICOM series, so that the identify, classify and segment
+    algorithms running on the same series only decode it once.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from glob import glob
+
+import numpy as np
+
+
+def series_fingerprint(path):
+    """Fingerprint the dcm-files, or exported volume, of a series by their names, sizes and modification times.
+
+    Args:
+        path (str): contains the path to the folder containing the dcm-files of a series.
+
+    Returns:
+        str: a hex digest that changes whenever a file of the series is added, removed or modified.
+    """
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8'))
+    # *.npy covers the volumes exported by load_dicom.export_volume
+    for file_name in sorted(glob(os.path.join(path, '*.dcm')) + glob(os.path.join(path, '*.npy'))):
+        stat = os.stat(file_name)
+        digest.update('{}:{}:{}'.format(os.path.basename(file_name), stat.st_size, stat.st_mtime).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class VolumeCache(object):
+    """A memory-budgeted LRU cache of voxel arrays with an optional on-disk tier.
+
+    Cached arrays are returned read-only, since they are shared between callers.
+
+    Args:
+        max_bytes (int): The memory budget of the in-memory tier. The least recently
+            used arrays are evicted when it is exceeded. 0 disables the in-memory tier.
+        cache_dir (str): If set, arrays are also stored as .npy-files in this folder
+            and memory-mapped when they are requested again.
+        max_disk_bytes (int): The budget of the on-disk tier, shared by all the processes
+            using `cache_dir`. The least recently used files are removed when it is exceeded.
+    """
+
+    def __init__(self, max_bytes=1 << 30, cache_dir=None, max_disk_bytes=10 << 30):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npy')
+
+    def _remember(self, key, array):
+        if array.nbytes > self.max_bytes:
+            return
+        self._arrays[key] = array
+        self.nbytes += array.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._arrays.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    @contextmanager
+    def hold(self):
+        """Keep the arrays this thread gets or puts within the block until
+        it exits, even if they exceed the memory budget or get evicted, so
+        that the stages of a request loading the same series decode it once.
+        """
+        if getattr(self._local, 'held', None) is not None:
+            yield
+            return
+
+        self._local.held = {}
+        try:
+            yield
+        finally:
+            self._local.held = None
+
+    def _hold(self, key, array):
+        held = getattr(self._local, 'held', None)
+        if held is not None and array is not None:
+            held[key] = array
+        return array
+
+    def get(self, key):
+        """Return the array stored under `key` or None if there is none.
+
+        Args:
+            key (str): the cache key
+
+        Returns:
+            ndarray | None
+        """
+        held = getattr(self._local, 'held', None)
+        with self._lock:
+            if held is not None and key in held:
+                self.hits += 1
+                return held[key]
+
+            if key in self._arrays:
+                self.hits += 1
+                self._arrays.move_to_end(key)
+                return self._hold(key, self._arrays[key])
+
+            if self.cache_dir and os.path.exists(self._disk_path(key)):
+                try:
+                    array = np.load(self._disk_path(key), mmap_mode='r')
+                    # The modification time orders the files for the eviction of the on-disk tier
+                    os.utime(self._disk_path(key))
+                except FileNotFoundError:
+                    # Evicted by another worker in the meantime
+                    array = None
+                if array is not None:
+                    self.disk_hits += 1
+                    self._remember(key, array)
+                    return self._hold(key, array)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, array):
+        """Store `array` under `key`.
+
+        Args:
+            key (str): the cache key
+            array (ndarray): the array to store
+
+        Returns:
+            ndarray: the stored, read-only array
+        """
+        array.flags.writeable = False
+        self._hold(key, array)
+
+        with self._lock:
+            if key in self._arrays:
+                self.nbytes -= self._arrays.pop(key).nbytes
+            self._remember(key, array)
+
+        if self.cache_dir and array.nbytes <= self.max_disk_bytes:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file first, so that other workers never map a partial file,
+            # and outside of the lock, so that other threads are not held up by the write
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, array)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            with self._lock:
+                os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk()
+
+        return array
+
+    def _evict_disk(self):
+        """Remove the least recently used files of the on-disk tier until it fits its budget."""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        disk_bytes = sum(size for _, size, _ in files)
+        for _, size, file_path in sorted(files):
+            if disk_bytes <= self.max_disk_bytes:
+                break
+            # The workers that mapped a removed file keep reading it until they unmap it
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            disk_bytes -= size
+
+    def clear(self):
+        """Empty the in-memory tier and reset the counters. The on-disk tier is kept."""
+        with self._lock:
+            self._arrays.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return the cache counters.
+
+        Returns:
+            dict: A dictionary of the form::
+                {'hits': int,
+                 'disk_hits': int,
+                 'misses': int,
+                 'nbytes': int,
+                 'entries': int}
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'nbytes': self.nbytes,
+                'entries': len(self._arrays),
+            }
@@ -0,0 +1,117 @@
+"""
+    preprocess.volume_format
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    An on-disk format for decoded DICOM series: the voxels as a volume.npy file,
+    which is memory-mapped when it is loaded, and a geometry.json sidecar with
+    the geometry of the series and the ijk -> xyz affine of its voxels.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .geometry import SeriesGeometry
+
+VOLUME_FILE = 'volume.npy'
+GEOMETRY_FILE = 'geometry.json'
+FORMAT_VERSION = 1
+
+
+def is_volume(path):
+    """Whether `path` is a folder holding an exported volume.
+
+    Args:
+        path (str): a folder.
+
+    Returns:
+        bool
+    """
+    return os.path.isfile(os.path.join(path, VOLUME_FILE)) and os.path.isfile(os.path.join(path, GEOMETRY_FILE))
+
+
+def write_volume(path, voxel_data, ijk_to_xyz, geometry, source=None):
+    """Store a decoded series in `path`.
+
+    The files are written under temporary names first, so that readers never
+    open a partial volume.
+
+    Args:
+        path (str): the folder of the volume, created if it does not exist.
+        voxel_data (ndarray): the voxels of the series.
+        ijk_to_xyz (ndarray): the 4x4 affine of the voxels returned by dicom_numpy.combine_slices.
+        geometry (preprocess.geometry.SeriesGeometry): the geometry of the series.
+        source (str): the fingerprint of the dcm-files the volume was exported from.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    sidecar = {
+        'format': FORMAT_VERSION,
+        'shape': list(voxel_data.shape),
+        'dtype': voxel_data.dtype.str,
+        'ijk_to_xyz': np.asarray(ijk_to_xyz, dtype=float).tolist(),
+        'geometry': geometry._asdict(),
+        'source': source,
+    }
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=path)
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, voxel_data)
+    os.replace(tmp_path, os.path.join(path, VOLUME_FILE))
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=path)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(sidecar, f)
+    os.replace(tmp_path, os.path.join(path, GEOMETRY_FILE))
+
+
+def open_volume(path):
+    """Memory-map the voxels of an exported volume, read-only.
+
+    Only the pages that are accessed are read from the disk.
+
+    Args:
+        path (str): the folder of the volume.
+
+    Returns:
+        numpy.memmap
+    """
+    return np.load(os.path.join(path, VOLUME_FILE), mmap_mode='r')
+
+
+def load_sidecar(path):
+    """Load the geometry.json sidecar of an exported volume.
+
+    Args:
+        path (str): the folder of the volume.
+
+    Returns:
+        dict: A dictionary of the form::
+            {'format': int,
+             'shape': list[int],
+             'dtype': str,
+             'ijk_to_xyz': list[list[float]],
+             'geometry': dict,
+             'source': str | None}
+    """
+    with open(os.path.join(path, GEOMETRY_FILE)) as f:
+        sidecar = json.load(f)
+
+    if sidecar.get('format') != FORMAT_VERSION:
+        raise ValueError('Unsupported volume format {} in {}'.format(sidecar.get('format'), path))
+    return sidecar
+
+
+def load_geometry(path):
+    """Load the geometry of an exported volume.
+
+    Args:
+        path (str): the folder of the volume.
+
+    Returns:
+        preprocess.geometry.SeriesGeometry
+    """
+    geometry = load_sidecar(path)['geometry']
+    return SeriesGeometry(**{name: tuple(value) if isinstance(value, list) else value
+                             for name, value in geometry.items()})
@@ -0,0 +1,25 @@
+import pytest
+
+
+class CountingLoader(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, model_path):
+        self.calls.append(model_path)
+        return object()
+
+
+@pytest.fixture
+def loader():
+    yield CountingLoader()
+
+
+@pytest.fixture
+def model_paths(tmpdir):
+    paths = []
+    for name in ['a.h5', 'b.h5', 'c.h5']:
+        path = tmpdir.join(name)
+        path.write(name)
+        paths.append(str(path))
+    yield paths
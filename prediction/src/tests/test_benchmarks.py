@@ -0,0 +1,21 @@
+from benchmarks import synthetic
+from benchmarks.__main__ import compare
+from ..preprocess import load_dicom
+
+
+def test_synthetic_series(tmpdir):
+    dicom_path = synthetic.write_images(str(tmpdir), slices=4, rows=32, columns=16)
+
+    voxel_data = load_dicom.load_dicom(dicom_path, use_cache=False)
+    assert voxel_data.shape == (16, 32, 4)
+    # rescaled by the RescaleIntercept
+    assert -1024 <= voxel_data.min() and voxel_data.max() < 2000 - 1024
+    assert load_dicom.load_geometry(dicom_path).slice_thickness == 2.5
+
+
+def test_compare():
+    baseline = {'fast': {'best': 0.001}, 'slow': {'best': 1.}, 'same': {'best': 1.}}
+    results = {'fast': {'best': 0.002}, 'slow': {'best': 1.5}, 'same': {'best': 1.1}, 'new': {'best': 9.}}
+
+    assert compare(results, baseline, tolerance=0.25) == [('fast', 0.001, 0.002), ('slow', 1., 1.5)]
+    assert compare(results, baseline, tolerance=0.25, min_delta=0.005) == [('slow', 1., 1.5)]
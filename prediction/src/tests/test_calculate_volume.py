@@ -1,7 +1,10 @@
+import os
+
 import numpy as np
 import pytest
 
 from ..algorithms.segment import trained_model
+from ..algorithms.segment.src.components import mask_components
 
 
 def generate_motes(mask, centroid, volume):
@@ -67,3 +70,50 @@ def test_calculate_volume_over_connected_components_with_dicom_path(get_mask_con
     assert len(real_volumes) == len(voxels_volumes)
     assert all([1.2360 >= mm / vox >= 1.2358
                 for vox, mm in zip(voxels_volumes, real_volumes)])
+
+
+def test_calculate_volume_beyond_labeled_region(tmpdir):
+    mask = np.zeros((200, 100, 20), dtype=np.bool_)
+    # a U-shaped component leaving the region around the centroid and coming back
+    mask[10:190, 10, 5] = True
+    mask[189, 10:90, 5] = True
+    mask[10:190, 89, 5] = True
+    # spurious components
+    mask[::4, 50, ::4] = True
+
+    path = str(tmpdir.join('mask.npy'))
+    np.save(path, mask)
+
+    centroids = [{'x': 20, 'y': 10, 'z': 5}, {'x': 20, 'y': 89, 'z': 5}, {'x': 0, 'y': 50, 'z': 0},
+                 {'x': 1, 'y': 1, 'z': 1}]
+    assert trained_model.calculate_volume(path, centroids) == [180 + 78 + 180, 180 + 78 + 180, 1, 0]
+
+
+def test_measure_volumes(get_mask_connected):
+    path, centroids = get_mask_connected
+    dicom_path = '../images/LIDC-IDRI-0001/1.3.6.1.4.1.14519.5.2.1.6279.6001.298806137288633453246975630178/' \
+                 '1.3.6.1.4.1.14519.5.2.1.6279.6001.179049373636438705059720603192'
+
+    volumes = trained_model.measure_volumes(str(path), centroids, dicom_path)
+    assert [volume['voxels'] for volume in volumes] == [100, 100, 30]
+    assert volumes[0]['mm3'] == trained_model.calculate_volume(str(path), centroids, dicom_path)[0]
+
+    volumes = trained_model.measure_volumes(str(path), centroids)
+    assert volumes[2] == {'voxels': 30, 'mm3': None}
+
+
+def test_mask_components_cache(tmpdir):
+    path = str(tmpdir.join('mask.npy'))
+    mask = np.zeros((10, 10, 10), dtype=np.bool_)
+    mask[2:5, 2:5, 2:5] = True
+    np.save(path, mask)
+
+    components = mask_components(path)
+    assert components is mask_components(path)
+    assert components.voxels({'x': 3, 'y': 3, 'z': 3}) == 27
+
+    mask[5, 2:5, 2:5] = True
+    np.save(path, mask)
+    os.utime(path, (0, 0))
+    assert mask_components(path) is not components
+    assert trained_model.calculate_volume(path, [{'x': 3, 'y': 3, 'z': 3}]) == [36]
@@ -1,8 +1,10 @@
+import numpy as np
 import pytest
 
 from ..preprocess import preprocess_dicom
 from ..algorithms.classify import trained_model
 from ..algorithms.classify.src.preprocess_patch import preprocess_LR3DCNN
+from ..transport import structured, to_builtin
 
 
 @pytest.fixture
@@ -41,3 +43,110 @@ def test_classify_predict_inference(dicom_path, model_path):
     assert isinstance(predicted[0]['p_concerning'], float)
     assert predicted[0]['p_concerning'] >= 0.
     assert predicted[0]['p_concerning'] <= 1.
+
+
+def test_classify_predict_structured(dicom_path, model_path):
+    centroids = [{'x': 50, 'y': 50, 'z': 8}, {'x': 60, 'y': 60, 'z': 10}]
+    array = structured([(axis, np.array([centroid[axis] for centroid in centroids], dtype=np.int16))
+                        for axis in 'xyz'])
+    params = dict(model_path=model_path, preprocess_model_input=preprocess_LR3DCNN)
+
+    predicted = trained_model.predict(dicom_path, array, **params)
+
+    assert predicted.dtype['p_concerning'] == np.float32
+    assert np.array_equal(predicted['x'], [50, 60])
+    expected = trained_model.predict(dicom_path, centroids, **params)
+    assert [centroid['p_concerning'] for centroid in to_builtin(predicted)] == \
+        pytest.approx([centroid['p_concerning'] for centroid in expected], abs=1e-6)
+
+
+def test_classify_predict_batch(dicom_path, model_path):
+    params = preprocess_dicom.Params(clip_lower=-1000,
+                                     clip_upper=400,
+                                     voxel_shape=(.6, .6, .3))
+    preprocess = preprocess_dicom.PreprocessDicom(params)
+    payloads = [dict(dicom_path=dicom_path,
+                     centroids=[{'x': 50, 'y': 50, 'z': 22}],
+                     model_path=model_path,
+                     preprocess_dicom=preprocess,
+                     preprocess_model_input=preprocess_LR3DCNN),
+                dict(dicom_path=dicom_path,
+                     centroids=[],
+                     model_path=model_path),
+                dict(dicom_path='.',
+                     centroids=[{'x': 50, 'y': 50, 'z': 22}],
+                     model_path=model_path,
+                     preprocess_model_input=preprocess_LR3DCNN),
+                dict(dicom_path=dicom_path,
+                     centroids=[{'x': 50, 'y': 50, 'z': 22}, {'x': 60, 'y': 60, 'z': 22}],
+                     model_path=model_path,
+                     preprocess_dicom=preprocess,
+                     preprocess_model_input=preprocess_LR3DCNN)]
+
+    predicted = trained_model.predict_batch(payloads)
+
+    assert len(predicted) == 4
+    assert predicted[1] == []
+    assert isinstance(predicted[2], Exception)
+    assert len(predicted[3]) == 2
+    assert predicted[0][0]['p_concerning'] == pytest.approx(predicted[3][0]['p_concerning'])
+    for centroid in predicted[0] + predicted[3]:
+        assert 0. <= centroid['p_concerning'] <= 1.
+
+
+def test_classify_iter_predict_batch(dicom_path, model_path, monkeypatch):
+    loaded = []
+    load = trained_model.load_dicom.load_dicom
+
+    def load_dicom(*args, **kwargs):
+        loaded.append(args[0])
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(trained_model.load_dicom, 'load_dicom', load_dicom)
+
+    def centroids():
+        return [{'x': 50, 'y': 50, 'z': 8}, {'x': 60, 'y': 60, 'z': 10}, {'x': 70, 'y': 50, 'z': 12}]
+
+    payloads = [dict(dicom_path=dicom_path, centroids=centroids()[:count], model_path=model_path)
+                for count in (1, 3, 2)]
+    results = trained_model.iter_predict_batch(payloads, batch_size=2)
+
+    # the first payload is complete once the second one fills its mini-batch
+    first = next(results)
+    assert len(loaded) == 2
+    rest = list(results)
+    assert len(loaded) == 3
+
+    expected = trained_model.predict(dicom_path, centroids(), model_path)
+    for predicted in [first] + rest:
+        assert [centroid['p_concerning'] for centroid in predicted] == \
+            pytest.approx([centroid['p_concerning'] for centroid in expected[:len(predicted)]], abs=1e-6)
+
+
+def test_classify_predict_mini_batches(dicom_path, model_path):
+    params = preprocess_dicom.Params(clip_lower=-1000,
+                                     clip_upper=400,
+                                     voxel_shape=(.6, .6, .3))
+    preprocess = preprocess_dicom.PreprocessDicom(params)
+
+    def centroids():
+        return [{'x': 50, 'y': 50, 'z': 22}, {'x': 60, 'y': 60, 'z': 22}, {'x': 70, 'y': 50, 'z': 30}]
+
+    expected = trained_model.predict(dicom_path, centroids(), model_path,
+                                     preprocess_dicom=preprocess,
+                                     preprocess_model_input=preprocess_LR3DCNN)
+
+    predicted = trained_model.predict(dicom_path, centroids(), model_path,
+                                      preprocess_dicom=preprocess,
+                                      preprocess_model_input=preprocess_LR3DCNN,
+                                      batch_size=2)
+    assert [c['p_concerning'] for c in predicted] == pytest.approx([c['p_concerning'] for c in expected])
+
+    # The patches of a single centroid take more than 100 bytes
+    streamed = trained_model.iter_predict(dicom_path, centroids(), model_path,
+                                          preprocess_dicom=preprocess,
+                                          preprocess_model_input=preprocess_LR3DCNN,
+                                          max_batch_bytes=100)
+    first = next(streamed)
+    assert first['p_concerning'] == pytest.approx(expected[0]['p_concerning'])
+    assert len(list(streamed)) == 2
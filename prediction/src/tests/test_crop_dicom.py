@@ -33,3 +33,17 @@ def test_crop_dicom(dicom_path):
         np.asarray([x for x in uncropped_series if x.SliceLocation == -102.5][0].pixel_array)[100][100]
     assert np.asarray([x for x in cropped_series if x.SliceLocation == -102.5][0].pixel_array)[19][19] == \
         np.asarray([x for x in uncropped_series if x.SliceLocation == -102.5][0].pixel_array)[119][119]
+
+
+def test_iter_crop_dicom(dicom_path):
+    cropped_slices = cd.iter_crop_dicom(dicom_path, [100, 100, -101], [120, 120, -106], './temp/test2')
+    assert not isinstance(cropped_slices, list)
+    assert not os.path.exists('./temp/test2/-102.500000.dcm')
+
+    first = next(cropped_slices)
+    assert first.SliceLocation == -105
+    assert os.path.exists('./temp/test2/-105.000000.dcm')
+    assert np.asarray(first.pixel_array).shape == (20, 20)
+
+    assert [x.SliceLocation for x in cropped_slices] == [-102.5]
+    assert os.path.exists('./temp/test2/-102.500000.dcm')
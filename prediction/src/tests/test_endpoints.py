@@ -5,13 +5,20 @@
     Provides unit tests for the API endpoints.
 """
 from functools import partial
+import gzip
 import json
+import time
 
+import numpy as np
 import pytest
 
 from flask import url_for
+from src import views
 from src.factory import create_app
 from src.algorithms import classify, identify, segment
+from src.preload import WarmUp
+from src.preprocess import load_dicom
+from src.transport import NPZ, decode_prediction, encode_payload
 
 
 def get_data(response):
@@ -50,6 +57,24 @@ def test_home(client):
     assert 'Welcome' in data['message']
 
 
+def test_ready(client):
+    r = client.get(client.url_for('ready'))
+    assert r.status_code == 200
+    assert get_data(r)['ready']
+
+    # the warm up of a preloaded app has not started yet
+    app = create_app(config_mode='Test')
+    app.extensions['warm_up'] = WarmUp(['missing.h5'])
+    r = app.test_client().get('/ready/')
+    assert r.status_code == 503
+    assert not get_data(r)['ready']
+
+    app.extensions['warm_up'].start()
+    r = app.test_client().get('/ready/')
+    assert r.status_code == 503
+    assert 'missing.h5' in get_data(r)['error']
+
+
 def test_endpoint_documentation(client):
     docstrings = {
         'identify': identify.trained_model.predict.__doc__,
@@ -91,6 +116,184 @@ def test_classify(client, dicom_path):
     assert isinstance(data['prediction'], list)
 
 
+def test_timings_and_metrics(client, dicom_path):
+    url = client.url_for('predict', algorithm='identify')
+    test_data = dict(dicom_path=dicom_path)
+
+    r = client.post(url, data=json.dumps(test_data), content_type='application/json')
+    assert 'timings' not in get_data(r)
+
+    r = client.post(url + '?timings=true', data=json.dumps(test_data), content_type='application/json')
+    data = get_data(r)
+    assert data['timings']['identify.predict'] > 0
+
+    r = client.get(client.url_for('metrics_endpoint'))
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/plain')
+    metrics = r.get_data(as_text=True)
+    assert '# TYPE prediction_stage_seconds histogram' in metrics
+    assert 'prediction_stage_seconds_count{stage="identify.predict"}' in metrics
+    assert 'prediction_stage_seconds_bucket{stage="identify.predict",le="+Inf"}' in metrics
+    assert 'prediction_volume_cache_hits_total' in metrics
+    assert 'prediction_model_registry_misses_total' in metrics
+
+
+def test_gzip(client, dicom_path):
+    url = client.url_for('predict', algorithm='identify')
+    body = gzip.compress(json.dumps(dict(dicom_path=dicom_path)).encode())
+
+    r = client.post(url, data=body, content_type='application/json', headers={'Content-Encoding': 'gzip'})
+    assert r.status_code == 200
+    assert 'Content-Encoding' not in r.headers
+    assert isinstance(get_data(r)['prediction'], list)
+
+    r = client.post(url, data=b'not gzip', content_type='application/json', headers={'Content-Encoding': 'gzip'})
+    assert r.status_code == 400
+
+    # responses of at least GZIP_MIN_SIZE bytes are compressed for the clients accepting gzip
+    client.application.config['GZIP_MIN_SIZE'] = 10
+    r = client.post(url, data=body, content_type='application/json',
+                    headers={'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert isinstance(json.loads(gzip.decompress(r.get_data()).decode())['prediction'], list)
+
+
+def test_pipeline(client, dicom_path, monkeypatch):
+    calls = []
+    decoded = []
+
+    def fake_classify(dicom_path, centroids, model_path=None):
+        calls.append(('classify', centroids, model_path))
+        load_dicom.load_dicom(dicom_path)
+        return [dict(centroid, p_concerning=0.9 - 0.5 * i) for i, centroid in enumerate(centroids * 2)]
+
+    def fake_segment(dicom_path, centroids):
+        calls.append(('segment', centroids))
+        load_dicom.load_dicom(dicom_path)
+        return {'binary_mask_path': 'mask.npz', 'volumes': [1.] * len(centroids)}
+
+    def extract_voxel_data(*args, **kwargs):
+        decoded.append(dicom_path)
+        return extract(*args, **kwargs)
+
+    extract = load_dicom._extract_voxel_data
+    monkeypatch.setattr(load_dicom, '_extract_voxel_data', extract_voxel_data)
+    monkeypatch.setitem(views.PREDICTORS, 'classify', fake_classify)
+    monkeypatch.setitem(views.PREDICTORS, 'segment', fake_segment)
+    # Even with the volume cache disabled, the stages share one decoded series
+    monkeypatch.setattr(load_dicom.volume_cache, 'max_bytes', 0)
+    load_dicom.volume_cache.clear()
+
+    url = client.url_for('predict_pipeline')
+    test_data = dict(dicom_path=dicom_path, classify={'model_path': 'model.h5'})
+    r = client.post(url, data=json.dumps(test_data), content_type='application/json')
+    data = get_data(r)
+
+    assert r.status_code == 200
+    prediction = data['prediction']
+    assert prediction['candidates'] == [{'x': 0, 'y': 0, 'z': 0, 'p_nodule': 0.5}]
+    assert [candidate['p_concerning'] for candidate in prediction['classified']] == [0.9, 0.4]
+    assert prediction['segmentation']['volumes'] == [1.]
+    assert calls == [('classify', [{'x': 0, 'y': 0, 'z': 0}], 'model.h5'), ('segment', [{'x': 0, 'y': 0, 'z': 0}])]
+    assert len(decoded) == 1
+
+    # the classify model defaults to the configured one
+    del calls[:]
+    r = client.post(url, data=json.dumps(dict(dicom_path=dicom_path)), content_type='application/json')
+    assert get_data(r)['prediction']['segmentation']['volumes'] == [1.]
+    assert calls[0][2] == client.application.config['CLASSIFY_MODEL_PATH']
+
+    # the candidates below the thresholds are neither classified nor segmented
+    del calls[:]
+    test_data['nodule_threshold'] = 0.6
+    r = client.post(url, data=json.dumps(test_data), content_type='application/json')
+    data = get_data(r)
+    assert data['prediction']['classified'] == []
+    assert data['prediction']['segmentation'] is None
+    assert calls == [('classify', [], 'model.h5')]
+
+    r = client.post(url, data=json.dumps({'path': dicom_path}), content_type='application/json')
+    assert r.status_code == 500
+    assert "Error using algorithm 'pipeline'" in get_data(r)['error']
+
+
+def test_pipeline_default_classify_model(client, dicom_path, monkeypatch):
+    monkeypatch.setitem(views.PREDICTORS, 'segment', lambda dicom_path, centroids: {'volumes': [1.] * len(centroids)})
+
+    url = client.url_for('predict_pipeline')
+    r = client.post(url, data=json.dumps(dict(dicom_path=dicom_path, nodule_threshold=0)),
+                    content_type='application/json')
+    data = get_data(r)
+
+    assert r.status_code == 200
+    classified = data['prediction']['classified']
+    assert len(classified) == len(data['prediction']['candidates']) > 0
+    assert all(0. <= candidate['p_concerning'] <= 1. for candidate in classified)
+
+
+def test_ndjson(client, dicom_path, monkeypatch):
+    url = client.url_for('predict', algorithm='classify')
+    headers = {'Accept': 'application/x-ndjson'}
+    centroids = [{'x': 50, 'y': 50, 'z': i} for i in range(5, 10)]
+    test_data = dict(dicom_path=dicom_path, centroids=centroids, model_path='../classify_models/model.h5',
+                     batch_size=2)
+
+    r = client.post(url, data=json.dumps(test_data), content_type='application/json', headers=headers)
+    assert r.status_code == 200
+    assert r.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert [line['z'] for line in lines] == list(range(5, 10))
+    assert all(0. <= line['p_concerning'] <= 1. for line in lines)
+
+    # the algorithms without a generator stream their whole prediction
+    url = client.url_for('predict', algorithm='identify')
+    r = client.post(url, data=json.dumps(dict(dicom_path=dicom_path)), content_type='application/json',
+                    headers=headers)
+    assert [json.loads(line) for line in r.get_data(as_text=True).splitlines()] == [
+        {'x': 0, 'y': 0, 'z': 0, 'p_nodule': 0.5}]
+
+    # the errors before the first item get the usual response, the later ones end the stream
+    r = client.post(url, data=json.dumps(dict(path=dicom_path)), content_type='application/json', headers=headers)
+    assert r.status_code == 500
+    assert 'error' in get_data(r)
+
+    def failing(**kwargs):
+        yield {'x': 0, 'y': 0, 'z': 0, 'p_concerning': 0.5}
+        raise ValueError('out of memory')
+
+    monkeypatch.setitem(views.STREAMING_PREDICTORS, 'classify', failing)
+    url = client.url_for('predict', algorithm='classify')
+    r = client.post(url, data=json.dumps(test_data), content_type='application/json', headers=headers)
+    lines = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert lines[0]['p_concerning'] == 0.5
+    assert lines[1] == {'error': "Error using algorithm 'classify': out of memory (ValueError).", 'status': 500}
+
+
+def test_npz(client, dicom_path):
+    url = client.url_for('predict', algorithm='classify')
+    centroids = [{'x': 50, 'y': 50, 'z': i} for i in range(5, 10)]
+    test_data = dict(dicom_path=dicom_path, centroids=centroids, model_path='../classify_models/model.h5')
+
+    r = client.post(url, data=json.dumps(test_data), content_type='application/json')
+    expected = get_data(r)['prediction']
+
+    r = client.post(url, data=encode_payload(test_data), content_type=NPZ, headers={'Accept': NPZ})
+    assert r.status_code == 200
+    assert r.mimetype == NPZ
+    prediction = decode_prediction(r.get_data())
+    assert prediction['z'].tolist() == list(range(5, 10))
+    assert np.allclose(prediction['p_concerning'], [centroid['p_concerning'] for centroid in expected])
+
+    # JSON remains the default response
+    r = client.post(url, data=encode_payload(test_data), content_type=NPZ)
+    data = get_data(r)
+    assert [centroid['z'] for centroid in data['prediction']] == list(range(5, 10))
+
+    r = client.post(url, data=b'not npz', content_type=NPZ, headers={'Accept': NPZ})
+    assert r.status_code == 500
+    assert 'error' in get_data(r)
+
+
 def test_segment(client, dicom_path):
     url = client.url_for('predict', algorithm='segment')
     test_data = dict(dicom_path=dicom_path, centroids=[])
@@ -105,6 +308,41 @@ def test_segment(client, dicom_path):
     assert isinstance(data['prediction']['volumes'], list)
 
 
+def test_batch(client, dicom_path):
+    url = client.url_for('predict_batch', algorithm='identify')
+    test_data = [dict(dicom_path=dicom_path), dict(dicom_path='/'), dict(dicom_path=dicom_path)]
+
+    r = client.post(url,
+                    data=json.dumps(test_data),
+                    content_type='application/json')
+
+    data = get_data(r)
+
+    assert r.status_code == 200
+    assert len(data) == 3
+    assert data[0]['prediction'][0]['x'] == 0
+    assert data[1]['status'] == 500
+    assert "does not contain dcm-files" in data[1]['error']
+    assert data[2]['status'] == 200
+
+    url = client.url_for('predict_batch', algorithm='classify')
+    test_data = [dict(dicom_path=dicom_path, centroids=[]), dict(dicom_path=dicom_path)]
+
+    r = client.post(url,
+                    data=json.dumps(test_data),
+                    content_type='application/json')
+
+    data = get_data(r)
+
+    assert data[0]['prediction'] == []
+    assert "'centroids'" in data[1]['error']
+
+    r = client.post(url,
+                    data=json.dumps(dict(dicom_path=dicom_path)),
+                    content_type='application/json')
+    assert r.status_code == 500
+
+
 def test_bad_algorithm(client):
     url = client.url_for('predict', algorithm='blahblah')
     r = client.get(url)
@@ -156,3 +394,45 @@ def test_other_error(client):
     data = get_data(r)
     assert r.status_code == 500
     assert "does not contain dcm-files" in data['error']
+
+
+def wait_for_job(client, job_id):
+    url = client.url_for('job_status', job_id=job_id)
+    for _ in range(100):
+        data = get_data(client.get(url))
+        if data['job']['status'] in ('done', 'failed'):
+            return data['job']
+        time.sleep(0.1)
+    raise AssertionError('job {} did not finish'.format(job_id))
+
+
+def test_jobs(client, dicom_path):
+    url = client.url_for('submit_job', algorithm='identify')
+    r = client.post(url,
+                    data=json.dumps(dict(dicom_path=dicom_path)),
+                    content_type='application/json')
+    data = get_data(r)
+    assert r.status_code == 202
+
+    job = wait_for_job(client, data['job_id'])
+    assert job['status'] == 'done'
+    assert job['progress'] == 1
+    assert job['result'][0]['x'] == 0
+
+    r = client.post(url,
+                    data=json.dumps(dict(dicom_path='/')),
+                    content_type='application/json')
+    job = wait_for_job(client, get_data(r)['job_id'])
+    assert job['status'] == 'failed'
+    assert "does not contain dcm-files" in job['error']
+
+    r = client.post(url,
+                    data=json.dumps([dict(dicom_path=dicom_path), dict(dicom_path='/')]),
+                    content_type='application/json')
+    job = wait_for_job(client, get_data(r)['job_id'])
+    assert job['status'] == 'done'
+    assert job['result'][0]['status'] == 200
+    assert job['result'][1]['status'] == 500
+
+    r = client.get(client.url_for('job_status', job_id='unknown'))
+    assert r.status_code == 404
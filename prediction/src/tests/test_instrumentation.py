@@ -0,0 +1,56 @@
+import pytest
+
+from .. import instrumentation
+from ..instrumentation import Histogram, Metrics, collect, span
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1., float('inf')))
+    for value in [0.05, 0.1, 0.5, 2.]:
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.cumulative_counts() == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_span_and_collect(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'metrics', Metrics())
+
+    @span('decorated')
+    def decorated():
+        """docstring"""
+        with span('inner'):
+            pass
+
+    assert decorated.__doc__ == 'docstring'
+
+    with collect() as timings:
+        decorated()
+        decorated()
+        with collect() as nested:
+            with span('nested'):
+                pass
+    assert list(timings) == ['inner', 'decorated']
+    assert list(nested) == ['nested']
+
+    # spans outside of collect are only aggregated
+    with span('inner'):
+        pass
+
+    rendered = instrumentation.metrics.render([('cache_hits_total', 'counter', 'Cache hits.', 3)])
+    assert 'prediction_stage_seconds_count{stage="inner"} 3' in rendered
+    assert 'prediction_stage_seconds_count{stage="decorated"} 2' in rendered
+    assert 'prediction_stage_seconds_bucket{stage="nested",le="+Inf"} 1' in rendered
+    assert '# TYPE cache_hits_total counter\ncache_hits_total 3\n' in rendered
+
+
+def test_span_records_failures(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'metrics', Metrics())
+
+    with collect() as timings:
+        with pytest.raises(ValueError):
+            with span('failing'):
+                raise ValueError
+    assert 'failing' in timings
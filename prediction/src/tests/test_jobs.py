@@ -0,0 +1,68 @@
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from ..jobs import JobQueue
+
+
+def wait(queue, job_id):
+    for _ in range(100):
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('The job did not finish')
+
+
+def test_orphaned_jobs(tmpdir):
+    database = str(tmpdir.join('jobs.sqlite3'))
+    queue = JobQueue(database=database)
+    job_id = queue.submit('classify', lambda progress: [])
+    assert wait(queue, job_id)['status'] == 'done'
+
+    # jobs left behind by a worker that exited, and by an older database without the pid column
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    exited = process.pid
+    connection = sqlite3.connect(database)
+    connection.execute("INSERT INTO jobs (id, algorithm, status, progress, created, updated, pid) "
+                       "VALUES ('exited', 'classify', 'running', 0.5, 0, 0, ?)", (exited, ))
+    connection.execute("INSERT INTO jobs (id, algorithm, status, progress, created, updated) "
+                       "VALUES ('unknown', 'classify', 'queued', 0, 0, 0)")
+    connection.commit()
+
+    queue = JobQueue(database=database)
+    for orphan in ('exited', 'unknown'):
+        job = queue.get(orphan)
+        assert job['status'] == 'failed'
+        assert 'exited' in job['error']
+    assert queue.get(job_id)['status'] == 'done'
+
+
+def test_gevent_jobs_run_on_os_threads():
+    pytest.importorskip('gevent')
+    script = '''
+from gevent import monkey
+monkey.patch_all()
+import gevent, threading, time
+from src.jobs import JobQueue
+
+def task(progress):
+    start = time.time()
+    while time.time() - start < 0.5:
+        sum(range(1000))
+    return threading.get_ident()
+
+queue = JobQueue()
+job_id = queue.submit('classify', task)
+ticks = 0
+while queue.get(job_id)['status'] != 'done':
+    gevent.sleep(0.01)
+    ticks += 1
+assert queue.get(job_id)['result'] != threading.get_ident()
+assert ticks > 5, ticks
+'''
+    subprocess.check_call([sys.executable, '-c', script])
@@ -1,4 +1,6 @@
 import os
+import subprocess
+import sys
 
 import dicom
 import dicom_numpy
@@ -6,7 +8,8 @@ import numpy as np
 import pytest
 
 from ..preprocess import load_dicom as ld
-from ..preprocess import errors
+from ..preprocess import errors, volume_format
+from ..preprocess.preprocess_dicom import Params, PreprocessDicom
 
 
 @pytest.fixture
@@ -31,6 +34,47 @@ def test_read_files(dicom_path):
         ld.read_dicom_files(os.path.join('.', '*.dcm'))
 
 
+def test_read_files_parallel(dicom_path):
+    serial = ld.read_dicom_files(os.path.join(dicom_path, '*.dcm'), workers=1)
+    parallel = ld.read_dicom_files(os.path.join(dicom_path, '*.dcm'), workers=4)
+
+    assert [f.SliceLocation for f in parallel] == [f.SliceLocation for f in serial]
+
+    with pytest.raises(dicom.errors.InvalidDicomError):
+        ld.read_dicom_files('./not_a_*.xml', workers=4)
+
+    with pytest.raises(errors.EmptyDicomSeriesException):
+        ld.read_dicom_files(os.path.join('.', '*.dcm'), workers=4)
+
+
+def test_gevent_files_read_on_os_threads(dicom_path):
+    pytest.importorskip('gevent')
+    script = '''
+import sys
+from gevent import monkey
+monkey.patch_all()
+from src.preprocess import load_dicom as ld
+
+get_ident = monkey.get_original('_thread', 'get_ident')
+sleep = monkey.get_original('time', 'sleep')
+read_file = ld.dicom.read_file
+threads = set()
+
+def record(*args, **kwargs):
+    threads.add(get_ident())
+    # keeps the thread busy, so that the other files need other threads
+    sleep(0.05)
+    return read_file(*args, **kwargs)
+
+ld.dicom.read_file = record
+files = ld.read_dicom_files(sys.argv[1] + '/*.dcm', workers=4, stop_before_pixels=True)
+# only the first file is read by the calling thread
+assert len(threads - {get_ident()}) > 1, threads
+assert len(files) > 1
+'''
+    subprocess.check_call([sys.executable, '-c', script, dicom_path])
+
+
 def test_extract_voxel_data(dicom_path):
     files = ld.read_dicom_files(os.path.join(dicom_path, '*.dcm'))
     dicom_array = ld._extract_voxel_data(files)
@@ -55,3 +99,34 @@ def test_load_meta(dicom_path):
     dicom_series = ld.load_meta(dicom_path)
 
     assert isinstance(dicom_series, list)
+    assert 'PixelData' not in dicom_series[0]
+    assert 'SliceLocation' in dicom_series[0]
+
+
+def test_load_geometry(dicom_path):
+    dicom_series = ld.read_dicom_files(os.path.join(dicom_path, '*.dcm'))
+    geometry = ld.load_geometry(dicom_path)
+
+    assert ld.load_geometry(dicom_path) is geometry
+    assert geometry.dims == (dicom_series[0].Rows, dicom_series[0].Columns, len(dicom_series))
+    assert geometry.slice_locations == tuple(float(f.SliceLocation) for f in dicom_series)
+    assert geometry.voxel_shape[0] == float(dicom_series[0].PixelSpacing[1])
+    assert geometry.slice_thickness > 0
+
+
+def test_export_volume(dicom_path, tmpdir):
+    volume_path = str(tmpdir.join('volume'))
+    geometry = ld.export_volume(dicom_path, volume_path)
+    assert geometry == ld.load_geometry(volume_path)
+
+    sidecar = volume_format.load_sidecar(volume_path)
+    assert np.asarray(sidecar['ijk_to_xyz']).shape == (4, 4)
+
+    voxel_data = ld.load_dicom(volume_path)
+    assert isinstance(voxel_data, np.memmap)
+    assert not voxel_data.flags.writeable
+    assert np.array_equal(voxel_data, ld.load_dicom(dicom_path, use_cache=False))
+
+    # the preprocessing gets the geometry of the exported volume instead of the dcm-files
+    preprocess = PreprocessDicom(Params(clip_lower=-1000, clip_upper=400, voxel_shape=1., dtype=np.float32))
+    assert np.array_equal(ld.load_dicom(volume_path, preprocess), ld.load_dicom(dicom_path, preprocess))
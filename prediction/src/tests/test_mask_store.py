@@ -0,0 +1,50 @@
+import numpy as np
+import scipy.ndimage
+
+from ..algorithms.segment import trained_model
+from ..algorithms.segment.src import mask_store
+from .test_calculate_volume import generate_mask
+
+
+def test_save_and_load_mask(tmpdir):
+    centroids = [{'x': 5, 'y': 5, 'z': 5}, {'x': 32, 'y': 32, 'z': 20}, {'x': 45, 'y': 45, 'z': 12}]
+    mask = generate_mask(shape=[50, 50, 29], centroids=centroids, volumes=[100, 20, 30])
+
+    path = str(tmpdir.join('mask.npz'))
+    mask_store.save_mask(path, mask)
+    assert mask_store.is_sparse_mask(path)
+
+    sparse = mask_store.load_mask(path)
+    assert len(sparse) == 3
+    assert sparse.shape == mask.shape
+    assert np.array_equal(sparse.to_dense(), mask)
+
+    box, component = sparse.component(sparse.find(centroids[1]))
+    assert component.sum() == 20
+    assert np.array_equal(component, mask[box] & component)
+
+    labels, _ = scipy.ndimage.label(mask)
+    expected = np.argwhere(labels == labels[45, 45, 12]).mean(axis=0)
+    assert np.allclose(sparse.centers[sparse.find(centroids[2])], expected)
+
+    assert sparse.find({'x': 0, 'y': 49, 'z': 0}) is None
+    assert sparse.volumes(centroids + [{'x': 0, 'y': 49, 'z': 0}]) == [100, 20, 30, 0]
+
+
+def test_save_empty_mask(tmpdir):
+    path = str(tmpdir.join('mask.npz'))
+    mask_store.save_mask(path, np.zeros((10, 10, 10), dtype=np.bool_))
+
+    sparse = mask_store.load_mask(path)
+    assert len(sparse) == 0
+    assert not sparse.to_dense().any()
+    assert sparse.volumes([{'x': 1, 'y': 2, 'z': 3}]) == [0]
+
+
+def test_calculate_volume_sparse_mask(tmpdir):
+    centroids = [{'x': 0, 'y': 0, 'z': 0}, {'x': 0, 'y': 0, 'z': 0}, {'x': 45, 'y': 45, 'z': 12}]
+    mask = generate_mask(shape=[50, 50, 29], centroids=centroids, volumes=[100, 20, 30])
+
+    path = str(tmpdir.join('mask.npz'))
+    mask_store.save_mask(path, mask)
+    assert trained_model.calculate_volume(path, centroids) == [100, 100, 30]
@@ -0,0 +1,81 @@
+import os
+import threading
+
+import pytest
+
+from ..algorithms.model_registry import ModelRegistry
+
+
+def test_registry_loads_once(model_paths, loader):
+    registry = ModelRegistry(loader=loader)
+
+    model = registry.get(model_paths[0])
+    assert registry.get(model_paths[0]) is model
+    assert len(loader.calls) == 1
+
+    stats = registry.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['models'] == [model_paths[0]]
+
+
+def test_registry_reloads_modified_file(model_paths, loader):
+    registry = ModelRegistry(loader=loader)
+
+    model = registry.get(model_paths[0])
+    stat = os.stat(model_paths[0])
+    os.utime(model_paths[0], (stat.st_atime, stat.st_mtime + 10))
+
+    assert registry.get(model_paths[0]) is not model
+    assert len(loader.calls) == 2
+    assert registry.stats()['models'] == [model_paths[0]]
+
+
+def test_registry_evicts_least_recently_used(model_paths, loader):
+    registry = ModelRegistry(max_models=2, loader=loader)
+
+    registry.warm_up(model_paths[:2])
+    registry.get(model_paths[0])
+    registry.get(model_paths[2])
+
+    stats = registry.stats()
+    assert stats['evictions'] == 1
+    assert stats['models'] == [model_paths[0], model_paths[2]]
+
+    with pytest.raises(ValueError):
+        ModelRegistry(max_models=0)
+
+    with pytest.raises(OSError):
+        registry.get(model_paths[0] + '.missing')
+
+
+def test_registry_loads_outside_of_lock(model_paths, loader):
+    registry = ModelRegistry(loader=loader)
+    cached = registry.get(model_paths[0])
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_loader(model_path):
+        loading.set()
+        release.wait(5)
+        return loader(model_path)
+
+    registry.loader = slow_loader
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get(model_paths[1]))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert loading.wait(5)
+
+    # the cached model is returned while the other one loads
+    lookup = []
+    thread = threading.Thread(target=lambda: lookup.append(registry.get(model_paths[0])))
+    thread.start()
+    thread.join(1)
+    release.set()
+    assert lookup == [cached]
+    for thread in threads:
+        thread.join()
+
+    assert models[0] is models[1]
+    assert loader.calls == model_paths[:2]
+    assert registry.stats()['misses'] == 2
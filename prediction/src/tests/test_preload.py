@@ -0,0 +1,39 @@
+import os
+
+from ..algorithms.model_registry import ModelRegistry
+from ..preload import WarmUp, memory_usage
+
+
+def test_warm_up(model_paths, loader):
+    warm_up = WarmUp(model_paths, registry=ModelRegistry(loader=loader))
+    assert not warm_up.status()['ready']
+
+    warm_up.start()
+    warm_up.start()
+    status = warm_up.status()
+    assert status['ready']
+    assert status['models'] == model_paths
+    assert status['error'] is None
+    assert loader.calls == model_paths
+
+    # a forked worker is not ready until it loaded the models itself
+    pid = os.fork()
+    if pid == 0:
+        ready = warm_up.status()['ready']
+        warm_up.start()
+        os._exit(0 if not ready and warm_up.status()['ready'] else 1)
+    assert os.waitpid(pid, 0)[1] == 0
+
+
+def test_warm_up_error(model_paths, loader):
+    warm_up = WarmUp([model_paths[0] + '.missing'], registry=ModelRegistry(loader=loader))
+    warm_up.start()
+    status = warm_up.status()
+    assert not status['ready']
+    assert 'Could not load the models' in status['error']
+
+
+def test_memory_usage():
+    usage = memory_usage()
+    if usage['rss'] is not None:
+        assert 0 < usage['private'] <= usage['rss']
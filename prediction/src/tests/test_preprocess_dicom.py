@@ -58,3 +58,51 @@ def test_preprocess_dicom_min_max_scale(dicom_path):
     assert isinstance(dicom_array, np.ndarray)
     assert dicom_array.max() <= 1
     assert dicom_array.min() >= 0
+
+
+def test_preprocess_dicom_dtype(dicom_path):
+    with pytest.raises(ValueError):
+        preprocess_dicom.Params(dtype=np.int16)
+
+    params = preprocess_dicom.Params(clip_lower=-1000, clip_upper=400, min_max_normalize=True, dtype='float32')
+    preprocess = preprocess_dicom.PreprocessDicom(params)
+
+    expected = load_dicom.load_dicom(dicom_path, preprocess_dicom.PreprocessDicom(
+        preprocess_dicom.Params(clip_lower=-1000, clip_upper=400, min_max_normalize=True)))
+    assert expected.dtype == np.float64
+
+    dicom_array = load_dicom.load_dicom(dicom_path, preprocess)
+    assert dicom_array.dtype == np.float32
+    assert np.allclose(dicom_array, expected, atol=1e-6)
+
+    params = preprocess_dicom.Params(voxel_shape=1., dtype=np.float16)
+    dicom_array = load_dicom.load_dicom(dicom_path, preprocess_dicom.PreprocessDicom(params))
+    assert dicom_array.dtype == np.float16
+
+
+def test_preprocess_dicom_in_place():
+    params = preprocess_dicom.Params(clip_lower=0, clip_upper=10, min_max_normalize=True)
+    preprocess = preprocess_dicom.PreprocessDicom(params)
+
+    voxel_data = np.arange(-5, 15, dtype=np.float64).reshape(5, 4)
+    preprocessed = preprocess([None], voxel_data)
+    assert preprocessed is voxel_data
+    assert preprocessed.min() == 0 and preprocessed.max() == 1
+
+    # read-only input, e.g. a cached series, is left untouched
+    voxel_data = np.arange(-5, 15, dtype=np.int16).reshape(5, 4)
+    voxel_data.flags.writeable = False
+    preprocessed = preprocess([None], voxel_data)
+    assert preprocessed is not voxel_data
+    assert voxel_data.min() == -5
+
+
+def test_preprocess_dicom_trace_memory():
+    params = preprocess_dicom.Params(clip_lower=0, clip_upper=10, min_max_normalize=True, dtype=np.float32)
+    preprocess = preprocess_dicom.PreprocessDicom(params, trace_memory=True)
+    assert preprocess.peak_memory is None
+
+    voxel_data = np.zeros((64, 64, 64), dtype=np.int16)
+    preprocess([None], voxel_data)
+    # int16 -> float32 needs a single float32 copy
+    assert voxel_data.size * 4 <= preprocess.peak_memory < voxel_data.size * 4 * 1.5
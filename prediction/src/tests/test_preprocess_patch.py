@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from ..algorithms.classify.src import preprocess_patch
+
+
+@pytest.fixture
+def dicom_array():
+    yield np.arange(64 * 60 * 50, dtype=np.float32).reshape(64, 60, 50)
+
+
+def test_preprocess_LR3DCNN_shapes(dicom_array):
+    centroids = [{'x': 30, 'y': 30, 'z': 25}, {'x': 0, 'y': 59, 'z': 49}]
+    patches = preprocess_patch.preprocess_LR3DCNN(dicom_array, centroids)
+
+    assert len(patches) == 3
+    for patch, half_shape in zip(patches, preprocess_patch.LR3DCNN_HALF_SHAPES):
+        assert patch.shape[0] == 2
+        assert patch.ndim == 5
+        assert patch.size == 2 * np.prod(2 * np.asarray(half_shape))
+
+
+def test_preprocess_patch_matches_slicing(dicom_array):
+    centroid = {'x': 30, 'y': 30, 'z': 25}
+    patches = preprocess_patch.preprocess_patch_LR3DCNN(dicom_array, centroid)
+
+    for patch, (sx, sy, sz) in zip(patches, preprocess_patch.LR3DCNN_HALF_SHAPES):
+        expected = dicom_array[30 - sx:30 + sx, 30 - sy:30 + sy, 25 - sz:25 + sz]
+        assert np.array_equal(patch, expected)
+
+
+def test_preprocess_patch_pads_border(dicom_array):
+    centroid = {'x': 0, 'y': 59, 'z': 49}
+    patch = preprocess_patch.preprocess_patch_LR3DCNN(dicom_array, centroid, pad_value=-1)[0]
+
+    assert patch.shape == (24, 42, 42)
+    # the corner voxel of the volume sits at the patch's center
+    assert patch[12, 21, 21] == dicom_array[0, 59, 49]
+    assert patch[11, 21, 21] == -1
+    assert patch[12, 22, 21] == -1
+    assert np.array_equal(patch[12:, :22, :22], dicom_array[:12, 38:, 28:])
+
+    with pytest.raises(ValueError):
+        preprocess_patch.preprocess_LR3DCNN(dicom_array, [{'x': 64, 'y': 0, 'z': 0}])
+
+
+def test_preprocess_LR3DCNN_matches_padded_volume(dicom_array):
+    dicom_array = dicom_array + 7
+    coords = np.array([[30, 30, 25], [3, 59, 0], [63, 1, 20], [40, 30, 48]])
+    patches = preprocess_patch.preprocess_LR3DCNN(dicom_array, [dict(zip('xyz', xyz)) for xyz in coords])
+
+    # the same patches sliced out of the volume padded with its minimum
+    pad = np.max(preprocess_patch.LR3DCNN_HALF_SHAPES, axis=0)
+    padded = np.pad(dicom_array, [(p, p) for p in pad], mode='constant', constant_values=7)
+    for batch, half_shape in zip(patches, preprocess_patch.LR3DCNN_HALF_SHAPES):
+        for patch, (x, y, z) in zip(batch[..., 0], coords + pad):
+            sx, sy, sz = half_shape
+            assert np.array_equal(patch, padded[x - sx:x + sx, y - sy:y + sy, z - sz:z + sz])
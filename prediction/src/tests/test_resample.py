@@ -0,0 +1,71 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import scipy.ndimage
+
+from ..preprocess import resample
+
+
+@pytest.fixture
+def volume():
+    random = np.random.RandomState(0)
+    yield scipy.ndimage.gaussian_filter(random.randint(-1000, 400, size=(61, 40, 23)).astype(np.float32), 2)
+
+
+@pytest.mark.parametrize('order', [0, 1, 3, 5])
+@pytest.mark.parametrize('zoom_factors', [2., (0.7, 1.3, 2.5), (1.6, 0.5, 1.)])
+def test_zoom_matches_scipy(volume, order, zoom_factors):
+    expected = scipy.ndimage.interpolation.zoom(volume, zoom_factors, order=order)
+    resampled = resample.zoom(volume, zoom_factors, order=order, workers=4)
+
+    assert resampled.shape == expected.shape
+    assert resampled.dtype == volume.dtype
+    assert np.allclose(resampled, expected, rtol=0, atol=1e-3)
+
+
+def test_zoom_nearest_keeps_labels():
+    mask = np.random.RandomState(0).randint(0, 4, size=(30, 30, 30)).astype(np.int16)
+
+    resampled = resample.zoom(mask, 1.7, order=0, workers=3)
+    assert np.array_equal(resampled, scipy.ndimage.interpolation.zoom(mask, 1.7, order=0))
+    assert set(np.unique(resampled)) <= {0, 1, 2, 3}
+
+
+def test_zoom_single_worker(volume):
+    resampled = resample.zoom(volume, 1.5, order=1, workers=1)
+    assert np.array_equal(resampled, scipy.ndimage.interpolation.zoom(volume, 1.5, order=1))
+
+    with pytest.raises(ValueError):
+        resample.zoom(volume, 1.5, order=6)
+
+
+def test_gevent_slabs_run_on_os_threads():
+    pytest.importorskip('gevent')
+    script = '''
+from gevent import monkey
+monkey.patch_all()
+import subprocess
+import sys
+
+import numpy as np
+from src.preprocess import resample
+
+get_ident = monkey.get_original('_thread', 'get_ident')
+sleep = monkey.get_original('time', 'sleep')
+zoom_slab = resample._zoom_slab
+threads = set()
+
+def record(*args):
+    threads.add(get_ident())
+    # keeps the thread busy, so that the other slabs need other threads
+    sleep(0.2)
+    zoom_slab(*args)
+
+resample._zoom_slab = record
+resample.zoom(np.zeros((8, 8, 8)), 2., order=1, workers=4)
+assert get_ident() not in threads
+assert len(threads) > 1, threads
+'''
+    subprocess.check_call([sys.executable, '-c', script])
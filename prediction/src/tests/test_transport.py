@@ -0,0 +1,35 @@
+import numpy as np
+
+from ..transport import (decode_payload, decode_prediction, encode_payload, encode_prediction, structured,
+                         to_builtin)
+
+
+def test_payload_round_trip():
+    centroids = [{'x': 1, 'y': 2, 'z': 3}, {'x': 511, 'y': 0, 'z': 120}]
+    payload = decode_payload(encode_payload({'dicom_path': '/images/series', 'centroids': centroids}))
+
+    assert payload['dicom_path'] == '/images/series'
+    assert payload['centroids'].dtype == [('x', np.int16), ('y', np.int16), ('z', np.int16)]
+    assert to_builtin(payload['centroids']) == centroids
+
+    # an empty list of centroids has no columns
+    assert decode_payload(encode_payload({'dicom_path': '', 'centroids': []})) == {'dicom_path': '', 'centroids': []}
+
+
+def test_prediction_round_trip():
+    prediction = [{'x': 1, 'y': 2, 'z': 3, 'p_concerning': 0.25}, {'x': 4, 'y': 5, 'z': 6, 'p_concerning': 0.5}]
+    decoded = decode_prediction(encode_prediction(prediction))
+    assert decoded.dtype['p_concerning'] == np.float32
+    assert to_builtin(decoded) == prediction
+    assert to_builtin(decoded[0]) == prediction[0]
+
+    array = structured([('x', np.arange(3)), ('p_nodule', np.ones(3))])
+    assert np.array_equal(decode_prediction(encode_prediction(array))['x'], np.arange(3))
+
+    # the numeric lists of a dict are columns, its other values stay JSON
+    decoded = decode_prediction(encode_prediction({'binary_mask_path': 'mask.npz', 'volumes': [40000, 2]}))
+    assert decoded['binary_mask_path'] == 'mask.npz'
+    assert decoded['volumes'].dtype == np.int32
+    assert decoded['volumes'].tolist() == [40000, 2]
+
+    assert len(decode_prediction(encode_prediction([]))) == 0
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+from ..preprocess import load_dicom, preprocess_dicom
+from ..preprocess.volume_cache import VolumeCache, series_fingerprint
+
+
+@pytest.fixture
+def dicom_path():
+    yield '../images/LIDC-IDRI-0001/1.3.6.1.4.1.14519.5.2.1.6279.6001.298806137288633453246975630178/' \
+          '1.3.6.1.4.1.14519.5.2.1.6279.6001.179049373636438705059720603192'
+
+
+def test_volume_cache_evicts_over_budget():
+    cache = VolumeCache(max_bytes=200)
+    first = cache.put('first', np.zeros(10))
+    cache.put('second', np.zeros(10))
+
+    assert not first.flags.writeable
+    assert cache.get('first') is first
+    cache.put('third', np.zeros(10))
+
+    assert cache.get('second') is None
+    assert cache.get('first') is not None
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['nbytes'] == 160
+
+
+def test_volume_cache_hold():
+    cache = VolumeCache(max_bytes=0)
+    with cache.hold():
+        array = cache.put('series', np.zeros(10))
+        assert cache.get('series') is array
+    assert cache.get('series') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_volume_cache_disk_tier(tmpdir):
+    cache_dir = str(tmpdir.mkdir('volumes'))
+    array = np.arange(24, dtype=np.int16).reshape(2, 3, 4)
+    VolumeCache(cache_dir=cache_dir).put('series', array)
+
+    cache = VolumeCache(cache_dir=cache_dir)
+    cached = cache.get('series')
+    assert isinstance(cached, np.memmap)
+    assert np.array_equal(cached, array)
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.get('other') is None
+
+
+def test_volume_cache_disk_budget(tmpdir):
+    cache_dir = str(tmpdir.mkdir('volumes'))
+    cache = VolumeCache(max_bytes=0, cache_dir=cache_dir)
+    cache.put('first', np.zeros(10))
+    # room for two of the files
+    cache.max_disk_bytes = 2 * os.path.getsize(cache._disk_path('first'))
+    cache.put('second', np.zeros(10))
+    for age, key in enumerate(['first', 'second']):
+        os.utime(cache._disk_path(key), (age, age))
+
+    # Using the first series makes the second one the least recently used
+    assert VolumeCache(cache_dir=cache_dir).get('first') is not None
+    cache.put('third', np.zeros(10))
+
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(cache._disk_path(key))
+                                                   for key in ['first', 'third'])
+    assert cache.get('second') is None
+
+    # An array beyond the budget is not written at all
+    cache.put('large', np.zeros(100))
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_series_fingerprint(tmpdir):
+    series = tmpdir.mkdir('series')
+    series.join('0.dcm').write('0')
+    fingerprint = series_fingerprint(str(series))
+    assert series_fingerprint(str(series)) == fingerprint
+
+    series.join('1.dcm').write('1')
+    assert series_fingerprint(str(series)) != fingerprint
+
+
+def test_load_dicom_decodes_once(dicom_path):
+    load_dicom.volume_cache.clear()
+    params = preprocess_dicom.Params(clip_lower=-1, clip_upper=40)
+    preprocess = preprocess_dicom.PreprocessDicom(params)
+
+    dicom_array = load_dicom.load_dicom(dicom_path)
+    assert load_dicom.load_dicom(dicom_path) is dicom_array
+    assert not dicom_array.flags.writeable
+
+    preprocessed = load_dicom.load_dicom(dicom_path, preprocess)
+    assert load_dicom.load_dicom(dicom_path, preprocess) is preprocessed
+    assert preprocessed.max() <= 40
+    # The preprocessing must not leak into the cached raw series
+    assert dicom_array.max() > 40
+
+    stats = load_dicom.volume_cache.stats()
+    assert stats['misses'] == 2
+    assert stats['entries'] == 2
+
+    assert load_dicom.load_dicom(dicom_path, use_cache=False) is not dicom_array
@@ -0,0 +1,169 @@
+"""
+    prediction.src.transport
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    A compact binary alternative to JSON for the payloads and predictions,
+    negotiated with the Content-Type and Accept headers.
+
+    A body of the type `application/x-npz` is a NumPy .npz-file holding one
+    array per column of the centroids, e.g. `x`, `y`, `z` and
+    `p_concerning`, and the remaining values as a JSON document in the 0-d
+    string array `json`. The coordinates are sent as int16 and the
+    probabilities as float32.
+"""
+import io
+import json
+
+import numpy as np
+
+NPZ = 'application/x-npz'
+
+# The key of the JSON document holding the values that are not columns
+JSON_KEY = 'json'
+
+COORDINATE_DTYPE = np.int16
+PROBABILITY_DTYPE = np.float32
+
+
+def structured(columns):
+    """Combine columns of equal length into a structured array.
+
+    Args:
+        columns (list[tuple[str, ndarray]]): the name and values of each column.
+
+    Returns:
+        ndarray: a structured array with a field per column.
+    """
+    array = np.empty(len(columns[0][1]), dtype=[(name, values.dtype) for name, values in columns])
+    for name, values in columns:
+        array[name] = values
+    return array
+
+
+def to_builtin(prediction):
+    """Convert the structured arrays, and their rows, of a prediction to lists of dicts and dicts, so that it can be
+    serialized as JSON.
+
+    Args:
+        prediction: the prediction.
+
+    Returns:
+        the prediction without structured arrays
+    """
+    if isinstance(prediction, np.ndarray) and prediction.dtype.names:
+        return [dict(zip(prediction.dtype.names, row)) for row in prediction.tolist()]
+    if isinstance(prediction, np.void) and prediction.dtype.names:
+        return dict(zip(prediction.dtype.names, prediction.tolist()))
+    return prediction
+
+
+def _column(values):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        limits = np.iinfo(COORDINATE_DTYPE)
+        if values.size and (values.min() < limits.min or values.max() > limits.max):
+            return values.astype(np.int32)
+        return values.astype(COORDINATE_DTYPE)
+    if values.dtype.kind == 'f':
+        return values.astype(PROBABILITY_DTYPE)
+    return values
+
+
+def _columns(items):
+    """Split a structured array, or a list of dicts with the same keys, into columns."""
+    if isinstance(items, np.ndarray):
+        return [(name, _column(items[name])) for name in items.dtype.names]
+    if not items:
+        return []
+    return [(name, _column([item[name] for item in items])) for name in items[0]]
+
+
+def decode_payload(data):
+    """Decode the payload of a request of the type `application/x-npz`.
+
+    Args:
+        data (bytes): the request body.
+
+    Returns:
+        dict: the parameters of the JSON document, and the other columns
+        as the structured array `centroids`.
+    """
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        payload = json.loads(str(npz[JSON_KEY])) if JSON_KEY in npz.files else {}
+        columns = [(name, npz[name]) for name in npz.files if name != JSON_KEY]
+    if columns:
+        payload['centroids'] = structured(columns)
+    return payload
+
+
+def encode_payload(payload):
+    """Encode a payload as the body of a request of the type `application/x-npz`.
+
+    Args:
+        payload (dict): the parameters, whose `centroids` are sent as columns.
+
+    Returns:
+        bytes: the .npz-file
+    """
+    payload = dict(payload)
+    centroids = payload.pop('centroids', None)
+    columns = _columns(centroids) if centroids is not None else []
+    if centroids is not None and not columns:
+        payload['centroids'] = []
+    return _save(columns, payload)
+
+
+def encode_prediction(prediction):
+    """Encode a prediction as the body of a response of the type `application/x-npz`.
+
+    A list of dicts, or a structured array, is sent as columns. The lists of
+    numbers of a dict, e.g. the volumes of segment, are sent as arrays and
+    its other values in the JSON document.
+
+    Args:
+        prediction (list[dict] | ndarray | dict): the prediction.
+
+    Returns:
+        bytes: the .npz-file
+    """
+    if not isinstance(prediction, dict):
+        columns = _columns(prediction)
+        # An archive without any array can not be loaded, so an empty list is sent as JSON
+        return _save(columns, None if columns else [])
+
+    columns, values = [], {}
+    for name, value in prediction.items():
+        if isinstance(value, list) and value and all(isinstance(item, (int, float)) for item in value):
+            columns.append((name, _column(value)))
+        else:
+            values[name] = value
+    return _save(columns, values)
+
+
+def decode_prediction(data):
+    """Decode the body of a response of the type `application/x-npz`.
+
+    Args:
+        data (bytes): the response body.
+
+    Returns:
+        ndarray | dict | list: the columns as a structured array, or, if there
+        is a JSON document, the document with the columns as arrays.
+    """
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        columns = [(name, npz[name]) for name in npz.files if name != JSON_KEY]
+        if JSON_KEY not in npz.files:
+            return structured(columns)
+        prediction = json.loads(str(npz[JSON_KEY]))
+    if isinstance(prediction, dict):
+        prediction.update(columns)
+    return prediction
+
+
+def _save(columns, values):
+    arrays = dict(columns)
+    if values is not None:
+        arrays[JSON_KEY] = np.array(json.dumps(values))
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
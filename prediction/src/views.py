@@ -4,11 +4,16 @@
 
     Provides main api endpoints
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, json, jsonify, request, stream_with_context
 
 from .algorithms import classify
 from .algorithms import identify
 from .algorithms import segment
+from .algorithms.model_registry import registry
+from .instrumentation import collect, metrics
+from .jobs import QueueFullError
+from .preprocess.load_dicom import volume_cache
+from .transport import NPZ, decode_payload, encode_prediction, to_builtin
 
 
 blueprint = Blueprint('blueprint', __name__)
@@ -21,6 +26,22 @@ PREDICTORS = {
     'segment': segment.trained_model.predict
 }
 
+# The generators evaluating a whole batch of payloads at once, yielding the
+# result of each payload once it is complete. The other algorithms evaluate
+# a batch payload by payload.
+BATCH_PREDICTORS = {
+    'classify': classify.trained_model.iter_predict_batch,
+}
+
+# The generators yielding the items of a prediction as soon as they are
+# computed, for the streamed responses. The predictions of the other
+# algorithms are streamed once they are complete.
+STREAMING_PREDICTORS = {
+    'classify': classify.trained_model.iter_predict,
+}
+
+NDJSON = 'application/x-ndjson'
+
 
 @blueprint.route('/')
 def home():
@@ -29,12 +50,56 @@ def home():
         'description': 'Shows API info',
         'message': 'Welcome to the lung cancer prediction API!',
         'links': {algo: '{}{}/predict/'.format(request.url_root, algo) for
-                  algo in PREDICTORS.keys()}
+                  algo in list(PREDICTORS.keys()) + ['pipeline']}
     }
 
     return jsonify(**rkwargs)
 
 
+@blueprint.route('/models/')
+def models():
+    """Shows the models loaded by this worker and the registry counters"""
+    return jsonify(**registry.stats())
+
+
+@blueprint.route('/ready/')
+def ready():
+    """Tells whether this worker has loaded the models it warms up, with the
+    status 503 until it has"""
+    status = current_app.extensions['warm_up'].status()
+    response = jsonify(**status)
+    response.status_code = 200 if status['ready'] else 503
+    return response
+
+
+@blueprint.route('/metrics')
+def metrics_endpoint():
+    """Exports the stage timings and the cache counters of this worker in the
+    Prometheus text format"""
+    registry_stats = registry.stats()
+    cache_stats = volume_cache.stats()
+    samples = [
+        ('prediction_model_registry_hits_total', 'counter', 'Models taken from the registry.',
+         registry_stats['hits']),
+        ('prediction_model_registry_misses_total', 'counter', 'Models loaded from disk.',
+         registry_stats['misses']),
+        ('prediction_model_registry_evictions_total', 'counter', 'Models dropped from the registry.',
+         registry_stats['evictions']),
+        ('prediction_model_registry_models', 'gauge', 'Models in the registry.',
+         len(registry_stats['models'])),
+        ('prediction_volume_cache_hits_total', 'counter', 'Series taken from the in-memory volume cache.',
+         cache_stats['hits']),
+        ('prediction_volume_cache_disk_hits_total', 'counter', 'Series memory-mapped from the on-disk volume cache.',
+         cache_stats['disk_hits']),
+        ('prediction_volume_cache_misses_total', 'counter', 'Series missing from the volume cache.',
+         cache_stats['misses']),
+        ('prediction_volume_cache_bytes', 'gauge', 'Bytes held by the in-memory volume cache.',
+         cache_stats['nbytes']),
+    ]
+
+    return Response(metrics.render(samples), mimetype='text/plain; version=0.0.4')
+
+
 @blueprint.route('/<algorithm>/predict/', methods=['GET', 'POST'])
 def predict(algorithm):
     """Performs various predictions for a path to a DICOM directory (folder of
@@ -43,7 +108,21 @@ def predict(algorithm):
     A GET request will give the documentation for the endpoint.
 
     A POST request with Content-Type set to "application/json" and the
-    right parameters for the algorithm will call predict.
+    right parameters for the algorithm will call predict. With the query
+    parameter `timings=true`, the response also holds the seconds spent in
+    each stage of the prediction.
+
+    With Accept set to "application/x-ndjson", the prediction is streamed
+    instead as one JSON document per line: each item of a list prediction,
+    e.g. each classified centroid as soon as its mini-batch is evaluated, or
+    the whole prediction otherwise. An error raised once the stream started
+    is sent as a last line of the form::
+        {'error': str, 'status': 500}
+
+    A payload with Content-Type set to "application/x-npz" holds the
+    centroids as int16 columns and the other parameters as a JSON document,
+    see `transport`. With Accept set to "application/x-npz", the prediction
+    is sent back in that format, without the status and the timings.
 
     All of the algorithms take a `dicom_path` parameter with a path to the
     file to perform the prediction on.
@@ -74,25 +153,35 @@ def predict(algorithm):
             'description': PREDICTORS[algorithm].__doc__,
         })
 
+    elif request.method == 'POST' and request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON:
+        try:
+            return _stream_prediction(algorithm, _payload())
+        except Exception as e:
+            error = _format_error(algorithm, e)
+
     # make predictions on POST
     elif request.method == 'POST':
 
-        payload = request.json
-
         try:
-            predict_method = PREDICTORS[algorithm]
-
-            prediction = predict_method(**payload)
-
-            response.update({
-                'prediction': prediction,
-            })
+            response.update(_timed_prediction(PREDICTORS[algorithm], _payload()))
 
         except Exception as e:
             # pass errors from prediction function along with function chosen
-            error = "Error using algorithm '{}': {} ({})."
-            error = error.format(algorithm, str(e), type(e).__name__)
+            error = _format_error(algorithm, e)
+
+    return _respond(response, error)
+
 
+def _payload():
+    """Return the parameters of the request, sent as JSON or as an .npz-file."""
+    if request.mimetype == NPZ:
+        return decode_payload(request.get_data())
+    return request.json
+
+
+def _respond(response, error):
+    """Return the response with its status, and with the prediction as an
+    .npz-file if the client accepts it."""
     # set the status code for the response
     if error:
         response.update({
@@ -104,6 +193,256 @@ def predict(algorithm):
             'status': 200,
         })
 
+    if 'prediction' in response and request.accept_mimetypes.best_match(['application/json', NPZ]) == NPZ:
+        resp = Response(encode_prediction(response['prediction']), mimetype=NPZ)
+    else:
+        if 'prediction' in response:
+            response['prediction'] = to_builtin(response['prediction'])
+        resp = jsonify(**response)
+    resp.status_code = response['status']
+    return resp
+
+
+def _timed_prediction(predict_method, payload):
+    """Return the prediction, and the stage timings if the query parameter
+    `timings` is set."""
+    with collect() as timings:
+        response = {'prediction': predict_method(**payload)}
+    if request.args.get('timings', '').lower() in ('1', 'true', 'yes'):
+        response['timings'] = timings
+    return response
+
+
+def _stream_prediction(algorithm, payload):
+    """Return a response streaming the prediction as NDJSON.
+
+    The first item is computed before the response is returned, so that
+    invalid payloads still fail with the usual error response.
+    """
+    if algorithm in STREAMING_PREDICTORS:
+        items = STREAMING_PREDICTORS[algorithm](**payload)
+    else:
+        prediction = PREDICTORS[algorithm](**payload)
+        items = iter(prediction if isinstance(prediction, list) else [prediction])
+
+    first = next(items, None)
+
+    def generate():
+        if first is None:
+            return
+        yield json.dumps(to_builtin(first)) + '\n'
+        try:
+            for item in items:
+                yield json.dumps(to_builtin(item)) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': _format_error(algorithm, e), 'status': 500}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+@blueprint.route('/pipeline/predict/', methods=['GET', 'POST'])
+def predict_pipeline():
+    """Runs identify, classify and segment on a DICOM directory in one
+    request, decoding the series only once.
+
+    A GET request will give the documentation for the endpoint.
+
+    A POST request with Content-Type set to "application/json" and the
+    parameters:
+        dicom_path (str): A path to the DICOM directory.
+        nodule_threshold (float): The candidates of identify with a lower
+            `p_nodule` are not classified. Default: the
+            PIPELINE_NODULE_THRESHOLD setting.
+        concerning_threshold (float): The classified candidates with a lower
+            `p_concerning` are not segmented. Default: the
+            PIPELINE_CONCERNING_THRESHOLD setting.
+        classify (dict): Further parameters of classify, e.g. `model_path`.
+            Default model_path: the CLASSIFY_MODEL_PATH setting.
+
+    responds with a prediction of the form::
+        {'candidates': list[dict],  # the centroids found by identify
+         'classified': list[dict],  # those above nodule_threshold, with their p_concerning
+         'segmentation': dict | None}  # the segment prediction of those above concerning_threshold
+
+    As for the single algorithms, the query parameter `timings=true` adds the
+    seconds spent in each stage.
+    """
+    if request.method == 'GET':
+        return jsonify(description=predict_pipeline.__doc__, status=200)
+
+    response = dict()
+    try:
+        response.update(_timed_prediction(_run_pipeline, request.json))
+        response['status'] = 200
+    except Exception as e:
+        response.update(error=_format_error('pipeline', e), status=500)
+
     resp = jsonify(**response)
     resp.status_code = response['status']
     return resp
+
+
+def _run_pipeline(dicom_path, nodule_threshold=None, concerning_threshold=None, classify=None):
+    if nodule_threshold is None:
+        nodule_threshold = current_app.config.get('PIPELINE_NODULE_THRESHOLD', 0.5)
+    if concerning_threshold is None:
+        concerning_threshold = current_app.config.get('PIPELINE_CONCERNING_THRESHOLD', 0.5)
+    classify = dict(classify or {})
+    classify.setdefault('model_path', current_app.config.get('CLASSIFY_MODEL_PATH'))
+
+    # The stages share the decoded series, even if it exceeds the budget of the volume cache
+    with volume_cache.hold():
+        candidates = PREDICTORS['identify'](dicom_path=dicom_path)
+
+        centroids = [{axis: candidate[axis] for axis in 'xyz'} for candidate in candidates
+                     if candidate['p_nodule'] >= nodule_threshold]
+        classified = PREDICTORS['classify'](dicom_path=dicom_path, centroids=centroids, **classify)
+
+        concerning = [{axis: candidate[axis] for axis in 'xyz'} for candidate in classified
+                      if candidate['p_concerning'] >= concerning_threshold]
+        segmentation = PREDICTORS['segment'](dicom_path=dicom_path, centroids=concerning) if concerning else None
+
+    return {'candidates': candidates, 'classified': classified, 'segmentation': segmentation}
+
+
+@blueprint.route('/<algorithm>/predict/batch/', methods=['POST'])
+def predict_batch(algorithm):
+    """Performs predictions for a list of DICOM directories in one request.
+
+    A POST request with Content-Type set to "application/json" and a list of
+    payloads, each holding the parameters `predict` takes for the algorithm.
+
+    The response is a list streamed item by item, holding for each payload
+    either::
+        {'prediction': ..., 'status': 200}
+    or::
+        {'error': str, 'status': 500}
+
+    Args:
+        algorithm (str): The prediction algorithm to use. One of 'segment',
+            'classify', or 'identify'.
+    """
+    payloads = request.json
+
+    error = ""
+    if algorithm not in PREDICTORS:
+        errormsg = "Error! '{}' is not a valid algorithm. Please choose from {}."
+        error = errormsg.format(algorithm, set(PREDICTORS))
+    elif not isinstance(payloads, list):
+        error = "Error! The batch must be a list of payloads."
+
+    if error:
+        resp = jsonify(error=error, status=500)
+        resp.status_code = 500
+        return resp
+
+    def generate():
+        yield '['
+        for i, result in enumerate(_iter_batch(algorithm, payloads)):
+            yield (',' if i else '') + json.dumps(_batch_item(algorithm, result))
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def _iter_batch(algorithm, payloads):
+    """Yield the prediction, or the raised exception, for each payload."""
+    if algorithm in BATCH_PREDICTORS:
+        for result in BATCH_PREDICTORS[algorithm](payloads):
+            yield result
+        return
+
+    for payload in payloads:
+        try:
+            yield PREDICTORS[algorithm](**payload)
+        except Exception as e:
+            yield e
+
+
+def _batch_item(algorithm, result):
+    if isinstance(result, Exception):
+        return {'error': _format_error(algorithm, result), 'status': 500}
+    return {'prediction': result, 'status': 200}
+
+
+@blueprint.route('/<algorithm>/jobs/', methods=['POST'])
+def submit_job(algorithm):
+    """Queues a prediction to run in the background.
+
+    A POST request with Content-Type set to "application/json" and either the
+    parameters `predict` takes for the algorithm, or a list of such payloads
+    to run as a batch.
+
+    Responds with status 202 and the id of the job, which is then polled at
+    `/jobs/<job_id>/`.
+
+    Args:
+        algorithm (str): The prediction algorithm to use. One of 'segment',
+            'classify', or 'identify'.
+    """
+    payload = request.json
+
+    def task(progress):
+        if not isinstance(payload, list):
+            return PREDICTORS[algorithm](**payload)
+
+        results = []
+        for i, result in enumerate(_iter_batch(algorithm, payload)):
+            results.append(_batch_item(algorithm, result))
+            progress((i + 1) / len(payload))
+        return results
+
+    response = dict()
+    if algorithm not in PREDICTORS:
+        errormsg = "Error! '{}' is not a valid algorithm. Please choose from {}."
+        response.update(error=errormsg.format(algorithm, set(PREDICTORS)), status=500)
+    else:
+        try:
+            job_id = current_app.extensions['jobs'].submit(algorithm, task)
+            response.update({
+                'job_id': job_id,
+                'links': {'job': '{}jobs/{}/'.format(request.url_root, job_id)},
+                'status': 202,
+            })
+        except QueueFullError as e:
+            response.update(error=str(e), status=503)
+
+    resp = jsonify(**response)
+    resp.status_code = response['status']
+    return resp
+
+
+@blueprint.route('/jobs/<job_id>/')
+def job_status(job_id):
+    """Shows the status, progress and, once it is done, the result of a job.
+
+    The job is of the form::
+        {'id': str,
+         'algorithm': str,
+         'status': str,  # one of 'queued', 'running', 'done' or 'failed'
+         'progress': float,
+         'result': object,
+         'error': str | None,
+         'created': float,
+         'updated': float}
+
+    Args:
+        job_id (str): The id returned when the job was submitted.
+    """
+    job = current_app.extensions['jobs'].get(job_id)
+
+    if job is None:
+        response = {'error': "Error! There is no job '{}'.".format(job_id), 'status': 404}
+    else:
+        if job['error']:
+            job['error'] = "Error using algorithm '{}': {}.".format(job['algorithm'], job['error'])
+        response = {'job': job, 'status': 200}
+
+    resp = jsonify(**response)
+    resp.status_code = response['status']
+    return resp
+
+
+def _format_error(algorithm, e):
+    error = "Error using algorithm '{}': {} ({})."
+    return error.format(algorithm, str(e), type(e).__name__)